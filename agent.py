@@ -1,15 +1,30 @@
 # agent.py - VERSIÓN FINAL CORREGIDA
-from langchain_google_vertexai import ChatVertexAI
-from langchain.agents import AgentExecutor, create_react_agent
+from langchain.agents.output_parsers import ReActSingleInputOutputParser
 from langchain.prompts import PromptTemplate
-from langchain.memory import ConversationBufferMemory
+from langchain_core.runnables import RunnablePassthrough
+from langchain_core.tools import render_text_description
 from config import config
+from llm_router import model_router
 from storage import storage
 from tools import create_agent_tools
+from scratchpad import ScratchpadManager
+from deadline import Deadline, active_deadline
+from executor import ControlledAgentExecutor
+from checkpoint import AnalysisCheckpoint, CheckpointRun, checkpoint_store, active_checkpoint
+from errors import classify_error, backoff_delay
+from plan_execute import PlanExecuteEngine
+from decision_eval import normalize_probabilities
+from history import analysis_history
+from session_memory import SessionMemory
+from rate_limit import rate_limiter, active_session, RateLimitTimeout
+from circuit_breaker import circuit_breakers
+from fact_store import facts_from_steps
+from search_profiles import SearchBudget, active_search_budget
 from models import UserProfile, DecisionNode, Cost, ResourceType
 from typing import List, Dict, Any, Optional
 import json
 import uuid
+import copy
 import streamlit as st
 from custom_callback import StreamlitAgentCallback
 import re
@@ -22,35 +37,41 @@ class ImprovedDecisionAgent:
     def __init__(self):
         
         # LLM para el agente - temperatura muy baja para máximo control
-        self.llm = ChatVertexAI(
-            model_name=config.VERTEX_AI_MODEL,
-            project=config.GOOGLE_CLOUD_PROJECT,
-            location=config.GOOGLE_CLOUD_REGION,
-            temperature=0.1,
-            max_output_tokens=config.MAX_OUTPUT_TOKENS,            
-            verbose=True,
-            max_retries=2
-        )
+        # (modelo grande; el resto de tareas usan rutas con el modelo rápido)
+        self.llm = model_router.get("agent")
+        self.llm_synthesis = model_router.get("synthesis")
         
         # LLM para árbol
-        self.llm_tree = ChatVertexAI(
-            model_name=config.VERTEX_AI_MODEL,
-            project=config.GOOGLE_CLOUD_PROJECT,
-            location=config.GOOGLE_CLOUD_REGION,
-            temperature=0.2,
-            max_output_tokens=config.MAX_OUTPUT_TOKENS
-        )
+        self.llm_tree = model_router.get("tree")
+        
+        # LLM para clasificar el tipo de decisión cuando no hay palabras clave
+        self.llm_classifier = model_router.get("classification")
         
         self.tools = create_agent_tools()
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True
-        )
+        self.scratchpad = ScratchpadManager()
+        # Memoria acotada; cada sesión recibe la suya en for_session()
+        self.memory = SessionMemory()
+        self.session_id = "default"
         
-        self.agent = self._create_robust_agent()
+        # Prompt compilado + LLM + parser: inmutable, compartido entre sesiones
+        self.agent_runnable = self._create_agent_runnable()
+        self.agent = self._create_robust_agent(self.agent_runnable)
+        self.plan_engine = PlanExecuteEngine(model_router.get("planning"), self.tools)
     
-    def _create_robust_agent(self):
-        """Crea un agente ReAct robusto con manejo mejorado de errores"""
+    def for_session(self, session_id: str = "default") -> "ImprovedDecisionAgent":
+        """
+        Instancia liviana para una sesión: comparte LLMs, herramientas, prompt y
+        motor de plan; tiene su propio ejecutor (estado de errores) y memoria.
+        session_id identifica a la sesión en la cola justa del rate limiting.
+        """
+        session_agent = copy.copy(self)
+        session_agent.session_id = session_id
+        session_agent.memory = SessionMemory()
+        session_agent.agent = self._create_robust_agent(self.agent_runnable)
+        return session_agent
+    
+    def _create_agent_runnable(self):
+        """Runnable ReAct (prompt + LLM + parser), sin estado por sesión"""
         
         # PROMPT ESTRICTO Y CLARO
         template = """Eres un agente que analiza decisiones usando herramientas específicas.
@@ -70,6 +91,7 @@ REQUISITOS DE ANÁLISIS PROFUNDO:
 - Riesgos específicos
 - Beneficios cuantificados
 ✅ DEBES hacer cálculos cuando tengas números
+✅ Para buscar usa primero local_search (fuentes ya descargadas, instantánea; si no alcanza busca sola en internet)
 ✅ NO des Final Answer hasta tener toda la información relevante necesaria para dar un analisis completo
 
 FORMATO OBLIGATORIO - SÍGUELO EXACTAMENTE:
@@ -112,7 +134,7 @@ EJEMPLOS REALES:
 
 Ejemplo de búsqueda:
 Thought: Necesito buscar información sobre salarios actuales
-Action: web_search
+Action: local_search
 Action Input: salario promedio jefe datos Perú 2024
 
 Ejemplo de cálculo:
@@ -120,6 +142,11 @@ Thought: Necesito calcular el porcentaje de aumento
 Action: calculator
 Action Input: ((15000 - 13000) / 13000) * 100
 
+Ejemplo de varios cálculos en una sola llamada:
+Thought: Necesito calcular el ingreso anual de ambas opciones
+Action: calculator
+Action Input: 15000 * 14; 13000 * 14
+
 Ejemplo de terminar (SOLO cuando tengas datos de al menos 4 búsquedas):
 Thought: Ya recopilé información de salarios, costos, riesgos y beneficios
 Final Answer: Basándome en el análisis realizado, considerando que tu salario actual de 13,000 PEN...
@@ -150,14 +177,30 @@ Empieza AHORA con UNA acción directa:"""
             template=template
         )
         
-        # Crear el agente estándar
-        agent = create_react_agent(
-            llm=self.llm,
-            tools=self.tools,
-            prompt=prompt
+        # Agente ReAct equivalente a create_react_agent, pero con el
+        # scratchpad acotado por presupuesto de tokens
+        prompt = prompt.partial(
+            tools=render_text_description(list(self.tools)),
+            tool_names=", ".join([tool.name for tool in self.tools])
         )
+        agent = (
+            RunnablePassthrough.assign(
+                agent_scratchpad=lambda x: self.scratchpad.format(
+                    list(x.get("prior_steps", [])) + x["intermediate_steps"]
+                )
+            )
+            | prompt
+            | self.llm.bind(stop=["\nObservation"])
+            | ReActSingleInputOutputParser()
+        )
+        return agent
+    
+    def _create_robust_agent(self, agent=None):
+        """Crea un agente ReAct robusto con manejo mejorado de errores"""
+        if agent is None:
+            agent = self._create_agent_runnable()
         
-        # Estado para tracking
+        # Estado para tracking (propio de cada ejecutor)
         loop_state = {
             'action_history': [],
             'error_count': 0,
@@ -293,6 +336,8 @@ Empieza AHORA con UNA acción directa:"""
         - web_search - Para buscar información en internet
         - calculator - Para hacer cálculos matemáticos
         - probability_calculator - Para calcular probabilidades
+        - financial_calculator - Para VAN, TIR, payback, préstamos y proyecciones (input JSON)
+        - decision_evaluator - Para valor esperado, riesgo y mejor opción entre escenarios (input JSON)
 
         Ejemplo correcto:
         Thought: Necesito buscar costos de maestrías
@@ -348,7 +393,7 @@ Empieza AHORA con UNA acción directa:"""
         Sigue el formato EXACTAMENTE."""
         
         # Crear ejecutor con configuración optimizada
-        agent_executor = AgentExecutor(
+        agent_executor = ControlledAgentExecutor(
             agent=agent,
             tools=self.tools,
             verbose=True,
@@ -362,9 +407,26 @@ Empieza AHORA con UNA acción directa:"""
         return agent_executor
         
     def analyze_decision_with_retry(self, user_question: str, max_depth: int = None,
-                               thinking_container=None) -> Dict[str, Any]:
+                               thinking_container=None,
+                               latency_budget: Optional[float] = None,
+                               engine: Optional[str] = None,
+                               callbacks: Optional[List] = None) -> Dict[str, Any]:
         """
         Analiza una decisión con reintentos inteligentes y visualización mejorada
+
+        engine elige el motor: "react" (iterativo, por defecto) o "plan"
+        (planificar → ejecutar en paralelo → sintetizar, 2-3 llamadas al LLM).
+        Ambos devuelven el mismo diccionario de resultado.
+
+        Si se indica latency_budget (segundos), el análisis completo respeta ese
+        presupuesto: la investigación se corta a tiempo para reservar la
+        respuesta final y el árbol, y no se reintenta sin tiempo suficiente.
+
+        Cada paso del agente queda en un checkpoint: un reintento continúa desde
+        los pasos ya ejecutados (o pasa directo a la síntesis) en lugar de
+        repetir todas las búsquedas.
+
+        callbacks: handlers de LangChain para el modo sin UI (ej. progreso de un job).
         """
         if max_depth is None:
             max_depth = config.MAX_TREE_DEPTH
@@ -376,16 +438,69 @@ Empieza AHORA con UNA acción directa:"""
         decision_type = self._identify_decision_type(user_question)
         enhanced_question = self._enhance_question(user_question, decision_type)
         
+        engine = engine or config.ANALYSIS_ENGINE
+        
+        if latency_budget is None and config.ANALYSIS_LATENCY_BUDGET > 0:
+            latency_budget = config.ANALYSIS_LATENCY_BUDGET
+        
+        deadline = Deadline(latency_budget) if latency_budget else None
+        # Decisiones anteriores de la sesión: el agente y la síntesis las ven junto al perfil
+        memory_context = self.memory.context()
+        prompt_context = f"{user_context}\n\n{memory_context}" if memory_context else user_context
+        checkpoint_key = checkpoint_store.key_for(user_question, prompt_context, decision_type,
+                                                   self.session_id)
+        
+        deadline_token = active_deadline.set(deadline)
+        checkpoint_token = active_checkpoint.set(CheckpointRun(checkpoint_store, checkpoint_key))
+        session_token = active_session.set(self.session_id)
+        # Un solo presupuesto de búsquedas para todos los intentos del análisis
+        search_budget = SearchBudget()
+        budget_token = active_search_budget.set(search_budget)
+        try:
+            result = self._analyze_decision(
+                user_question, enhanced_question, prompt_context, decision_type,
+                max_depth, thinking_container, deadline, checkpoint_key, engine, callbacks
+            )
+            if result:
+                result["search_budget"] = search_budget.snapshot()
+                self.memory.add(user_question, result["analysis"], decision_type)
+                try:
+                    result["history_id"] = analysis_history.save(result, user_context)
+                except Exception as e:
+                    print(f"Error guardando historial: {e}")
+            return result
+        finally:
+            active_search_budget.reset(budget_token)
+            active_session.reset(session_token)
+            active_checkpoint.reset(checkpoint_token)
+            active_deadline.reset(deadline_token)
+    
+    def _analyze_decision(self, user_question: str, enhanced_question: str,
+                          user_context: str, decision_type: str, max_depth: int,
+                          thinking_container, deadline: Optional[Deadline],
+                          checkpoint_key: str, engine: str = "react",
+                          callbacks: Optional[List] = None) -> Dict[str, Any]:
+        """Bucle de reintentos del análisis (ver analyze_decision_with_retry)"""
         max_retries = 3
         last_error = None
         
         for attempt in range(max_retries):
+            # Sin tiempo para otro intento completo: no reintentar
+            if deadline is not None:
+                if attempt > 0 and deadline.research_remaining() <= 0:
+                    break
+                deadline.start_attempt()
+            
+            checkpoint = checkpoint_store.load(checkpoint_key)
+            
             try:
                 # Mostrar progreso
                 if thinking_container:
                     with thinking_container:
                         if attempt > 0:
                             st.warning(f"🔄 Reintento {attempt + 1}/{max_retries}")
+                            if checkpoint.steps:
+                                st.info(f"♻️ Reanudando desde {len(checkpoint.steps)} pasos ya ejecutados")
                         
                         # Título dinámico según el tipo de decisión
                         st.markdown(f"### 🧠 Analizando tu decisión {decision_type}")
@@ -405,15 +520,14 @@ Empieza AHORA con UNA acción directa:"""
                         progress_bar.progress(10)
                         
                         # IMPORTANTE: Ejecutar el agente AQUÍ, dentro del with thinking_container
-                        result = self.agent.invoke(
-                            {
-                                "user_context": user_context,
-                                "input": enhanced_question,
-                                "tool_names": ", ".join([tool.name for tool in self.tools]),
-                                "tools": "\n".join([f"- {tool.name}: {tool.description}" 
-                                                for tool in self.tools])
-                            },
-                            config={
+                        result = self._run_agent(
+                            user_question,
+                            enhanced_question,
+                            user_context,
+                            decision_type,
+                            checkpoint,
+                            engine=engine,
+                            run_config={
                                 "callbacks": [custom_callback],
                                 "verbose": True  # Agregar verbose
                             }
@@ -433,21 +547,18 @@ Empieza AHORA con UNA acción directa:"""
                         progress_bar.progress(70)
                         status_text.text("📊 Procesando resultados...")
                         
-                        # Continuar con el procesamiento dentro del container
-                        analysis = result.get("output", "")
+                        if deadline is not None and deadline.stop_reason:
+                            st.info(f"⏱️ Investigación detenida: {deadline.stop_reason}")
                         
-                        # Si el análisis es muy corto, intentar construir desde pasos
-                        if len(analysis) < 200 and "intermediate_steps" in result:
-                            analysis = self._build_comprehensive_analysis(
-                                user_question,
-                                result["intermediate_steps"],
-                                user_context,
-                                decision_type
-                            )
+                        # Continuar con el procesamiento dentro del container
+                        analysis = self._resolve_analysis(
+                            user_question, result, user_context, decision_type
+                        )
                         
                         # Validación final
                         if len(analysis) < 100:
                             raise ValueError(f"Análisis insuficiente ({len(analysis)} caracteres)")
+                        checkpoint_store.record_analysis(checkpoint_key, analysis)
                         
                         # Generar árbol de decisión
                         progress_bar.progress(90)
@@ -461,6 +572,8 @@ Empieza AHORA con UNA acción directa:"""
                         progress_bar.empty()
                         status_text.empty()
                         
+                        checkpoint_store.clear(checkpoint_key)
+                        
                         # Retornar resultado
                         return {
                             "question": user_question,
@@ -472,30 +585,25 @@ Empieza AHORA con UNA acción directa:"""
                         
                 else:
                     # Sin visualización
-                    result = self.agent.invoke({
-                        "user_context": user_context,
-                        "input": enhanced_question,
-                        "tool_names": ", ".join([tool.name for tool in self.tools]),
-                        "tools": "\n".join([f"- {tool.name}: {tool.description}" 
-                                        for tool in self.tools])
-                    })
+                    result = self._run_agent(
+                        user_question, enhanced_question, user_context,
+                        decision_type, checkpoint, engine=engine,
+                        run_config={"callbacks": callbacks} if callbacks else None
+                    )
                     
                     # Procesar resultado
-                    analysis = result.get("output", "")
-                    
-                    if len(analysis) < 200 and "intermediate_steps" in result:
-                        analysis = self._build_comprehensive_analysis(
-                            user_question,
-                            result["intermediate_steps"],
-                            user_context,
-                            decision_type
-                        )
+                    analysis = self._resolve_analysis(
+                        user_question, result, user_context, decision_type
+                    )
                     
                     if len(analysis) < 100:
                         raise ValueError(f"Análisis insuficiente ({len(analysis)} caracteres)")
+                    checkpoint_store.record_analysis(checkpoint_key, analysis)
                     
                     tree = self._generate_decision_tree(user_question, analysis, max_depth, decision_type)
                     
+                    checkpoint_store.clear(checkpoint_key)
+                    
                     return {
                         "question": user_question,
                         "analysis": analysis,
@@ -506,14 +614,29 @@ Empieza AHORA con UNA acción directa:"""
                     
             except Exception as e:
                 last_error = e
+                error_kind = classify_error(e)
                 if thinking_container:
                     with thinking_container:
                         st.error(f"⚠️ Error en intento {attempt + 1}: {str(e)[:200]}")
                 
-                # Esperar antes de reintentar
+                # Ya se esperó la cuota todo lo permitido: reintentar solo suma carga
+                if isinstance(e, RateLimitTimeout):
+                    break
+                
+                # Esperar según el tipo de error (sin pasarse del deadline);
+                # ante cuota, al menos hasta que termine el enfriamiento del backend
                 if attempt < max_retries - 1:
-                    time.sleep(2)
-        
+                    delay = backoff_delay(error_kind, attempt)
+                    if error_kind == "quota":
+                        delay = max(delay, rate_limiter.retry_after())
+                    if deadline is not None:
+                        delay = min(delay, deadline.remaining())
+                    if delay > 0:
+                        time.sleep(delay)
+
+        # Sin más intentos el checkpoint ya no se va a reanudar
+        checkpoint_store.clear(checkpoint_key)
+
         # Si todos los reintentos fallan, retornar None con mensaje de error
         if thinking_container:
             with thinking_container:
@@ -530,6 +653,51 @@ Empieza AHORA con UNA acción directa:"""
                 st.error(error_message)
         
         return None
+    
+    def _run_agent(self, question: str, enhanced_question: str, user_context: str,
+                   decision_type: str, checkpoint: AnalysisCheckpoint,
+                   engine: str = "react",
+                   run_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Ejecuta el motor elegido continuando desde el checkpoint.
+
+        - Si ya hay un análisis guardado, se reutiliza tal cual.
+        - Si ya hay suficientes pasos, se pasa directo a la síntesis.
+        - Motor "plan": plan + ejecución paralela, la síntesis la hace _resolve_analysis.
+        - Motor "react": el agente continúa con los pasos previos en su scratchpad.
+        """
+        prior_steps = list(checkpoint.steps)
+        
+        if checkpoint.analysis:
+            return {"output": checkpoint.analysis, "intermediate_steps": prior_steps}
+        
+        if len(prior_steps) >= config.CHECKPOINT_SYNTHESIS_MIN_STEPS:
+            return {"output": "", "intermediate_steps": prior_steps, "needs_synthesis": True}
+        
+        if engine == "plan":
+            return self.plan_engine.run(
+                question, enhanced_question, user_context, decision_type, prior_steps
+            )
+        
+        # Las herramientas con el circuit breaker abierto no se ofrecen al agente
+        tools = [tool for tool in self.tools if circuit_breakers.available(tool.name)] or self.tools
+        # Tiempo máximo de esta corrida según lo que queda del deadline (el ejecutor es de la sesión)
+        deadline = active_deadline.get()
+        self.agent.max_execution_time = max(1.0, deadline.research_remaining()) if deadline else 600
+        result = self.agent.invoke(
+            {
+                "user_context": user_context,
+                "input": enhanced_question,
+                "prior_steps": prior_steps,
+                "tool_names": ", ".join([tool.name for tool in tools]),
+                "tools": "\n".join([f"- {tool.name}: {tool.description}" 
+                                for tool in tools])
+            },
+            config=run_config
+        )
+        
+        result["intermediate_steps"] = prior_steps + list(result.get("intermediate_steps", []))
+        return result
 
     def analyze_decision_with_retry_ant(self, user_question: str, max_depth: int = None,
                                    thinking_container=None) -> Dict[str, Any]:
@@ -689,6 +857,22 @@ Empieza AHORA con UNA acción directa:"""
             if any(keyword in question_lower for keyword in keywords):
                 return tipo
         
+        # Sin palabras clave: clasificar con el modelo rápido (opcional)
+        if config.USE_LLM_CLASSIFIER:
+            try:
+                response = self.llm_classifier.invoke(
+                    f"""Clasifica esta decisión en UNA categoría: {", ".join(categories)}, general.
+Responde SOLO con la categoría.
+
+Decisión: {question}"""
+                )
+                answer = response.content.strip().lower()
+                for tipo in list(categories) + ["general"]:
+                    if tipo in answer:
+                        return tipo
+            except Exception as e:
+                print(f"Error clasificando decisión: {e}")
+        
         return "general"
     
     def _enhance_question(self, question: str, decision_type: str) -> str:
@@ -697,7 +881,7 @@ Empieza AHORA con UNA acción directa:"""
         enhancements = {
             "financiera": """
 Analiza esta decisión financiera considerando:
-- ROI esperado y tiempo de recuperación
+- ROI esperado y tiempo de recuperación (usa financial_calculator para VAN, TIR y payback en una sola llamada)
 - Costos iniciales y recurrentes en PEN
 - Comparación con alternativas de inversión
 - Riesgos financieros específicos
@@ -767,7 +951,7 @@ IMPORTANTE:
                 all_observations.append(obs_str)
                 
                 if hasattr(action, 'tool'):
-                    if action.tool == 'web_search':
+                    if action.tool in ('web_search', 'local_search'):
                         # Extraer información relevante de búsquedas
                         if len(obs_str) > 50:
                             search_results.append(obs_str[:500])
@@ -791,11 +975,17 @@ IMPORTANTE:
                 analysis_parts.append(f"{i}. {clean_result}")
             analysis_parts.append("")
         
-        # Agregar cálculos si existen
+        # Agregar cálculos si existen (cada expresión con su resultado)
+        facts = facts_from_steps(steps)
+        calculated = [f for f in facts if f.metric == "cálculo"]
         if calculations:
             analysis_parts.append("**Análisis Cuantitativo:**")
-            for calc in calculations[:3]:
-                analysis_parts.append(f"- {calc}")
+            if calculated:
+                for fact in calculated[:5]:
+                    analysis_parts.append(f"- {fact.entity} = {fact.value:g}")
+            else:
+                for calc in calculations[:3]:
+                    analysis_parts.append(f"- {calc}")
             analysis_parts.append("")
         
         # Agregar evaluación basada en tipo
@@ -813,11 +1003,12 @@ IMPORTANTE:
             if any(word in combined_obs for word in ["riesgo", "costo", "pérdida", "problema"]):
                 analysis_parts.append("- Se detectaron factores de riesgo que requieren consideración")
             
-            # Buscar números significativos
-            import re
-            numbers = re.findall(r'\b\d+(?:\.\d+)?(?:%|k|K|mil|millones)?\b', combined_obs)
-            if numbers:
-                analysis_parts.append(f"- Valores numéricos relevantes encontrados: {', '.join(numbers[:5])}")
+            # Datos concretos (métrica, entidad, valor y fuente) de búsquedas y cálculos
+            found = [f for f in facts if f.metric != "cálculo"]
+            if found:
+                analysis_parts.append("- Datos concretos encontrados:")
+                for fact in found[:5]:
+                    analysis_parts.append(f"  - {fact.describe()}")
         
         # Recomendación basada en datos reales
         analysis_parts.append("\n**Recomendación:**")
@@ -835,6 +1026,68 @@ IMPORTANTE:
         
         return "\n".join(analysis_parts)
     
+    def _resolve_analysis(self, question: str, result: Dict[str, Any],
+                          context: str, decision_type: str) -> str:
+        """Obtiene el texto del análisis a partir del resultado del ejecutor"""
+        analysis = result.get("output", "")
+        steps = result.get("intermediate_steps") or []
+        
+        # Si el deadline cortó la investigación (la salida es el mensaje de
+        # parada forzada) o se reanuda desde un checkpoint completo,
+        # sintetizar la respuesta con lo ya investigado
+        deadline = active_deadline.get()
+        stopped_early = deadline is not None and deadline.stop_reason
+        if (stopped_early or result.get("needs_synthesis")) and steps:
+            analysis = self._synthesize_analysis(question, steps, context, decision_type) or analysis
+        
+        # Si el análisis es muy corto, intentar construir desde pasos
+        if len(analysis) < 200 and "intermediate_steps" in result:
+            analysis = self._build_comprehensive_analysis(
+                question,
+                result["intermediate_steps"],
+                context,
+                decision_type
+            )
+        
+        return analysis
+    
+    def _synthesize_analysis(self, question: str, steps: List,
+                             context: str, decision_type: str) -> str:
+        """Redacta el análisis final en una sola llamada al LLM usando las observaciones"""
+        observations = []
+        for step in steps:
+            if isinstance(step, tuple) and len(step) == 2:
+                action, observation = step
+                tool = getattr(action, 'tool', '')
+                if tool == "_Exception":
+                    continue
+                tool_input = getattr(action, 'tool_input', '')
+                observations.append(f"[{tool}] {tool_input}\n{str(observation)[:1500]}")
+        
+        if not observations:
+            return ""
+        
+        prompt = f"""Eres un analista de decisiones. Redacta el análisis final usando SOLO los datos investigados.
+
+CONTEXTO del usuario (Perú):
+{context}
+
+TIPO DE DECISIÓN: {decision_type}
+DECISIÓN: {question}
+
+DATOS INVESTIGADOS:
+{chr(10).join(observations)}
+
+Escribe un análisis completo en español de 3-4 párrafos con datos concretos (montos en PEN,
+porcentajes, plazos), riesgos, beneficios y una recomendación clara y fundamentada."""
+        
+        try:
+            response = self.llm_synthesis.invoke(prompt)
+            return response.content.strip()
+        except Exception as e:
+            print(f"Error sintetizando análisis: {e}")
+            return ""
+    
     def _generate_simple_tree(self, question: str, decision_type: str = "general") -> DecisionNode:
         """Genera un árbol de decisión mínimo cuando falla el LLM"""
         
@@ -882,6 +1135,11 @@ IMPORTANTE:
     def _generate_decision_tree(self, question: str, analysis: str, 
                                max_depth: int, decision_type: str) -> DecisionNode:
         """Genera árbol de decisión mejorado con contexto del tipo de decisión"""
+        # Sin tiempo restante no se espera al LLM
+        deadline = active_deadline.get()
+        if deadline is not None and deadline.expired():
+            return self._generate_simple_tree(question, decision_type)
+        
         profile = storage.load_profile()
         
         # Prompt especializado por tipo
@@ -977,6 +1235,8 @@ IMPORTANTE:
             
         except Exception as e:
             print(f"Error generando árbol: {e}")
+            # No reutilizar desde caché una respuesta que no se pudo parsear
+            self.llm_tree.evict(prompt)
             # Usar árbol simple como fallback
             return self._generate_simple_tree(question, decision_type)
     
@@ -1024,13 +1284,12 @@ IMPORTANTE:
                 print(f"Error parseando hijo: {e}")
                 continue
         
-        # Validar y normalizar probabilidades de los hijos
+        # Validar y normalizar probabilidades de los hijos (tolerancia de 5%)
         if children:
-            total_prob = sum(child.probability for child in children)
-            if total_prob > 0 and abs(total_prob - 100) > 5:  # Tolerancia de 5%
-                # Normalizar probabilidades
-                for child in children:
-                    child.probability = (child.probability / total_prob) * 100
+            probabilities, normalized = normalize_probabilities([child.probability for child in children])
+            if normalized:
+                for child, probability in zip(children, probabilities):
+                    child.probability = float(probability)
         
         return DecisionNode(
             id=data.get("id", str(uuid.uuid4())),
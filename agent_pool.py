@@ -0,0 +1,57 @@
+# agent_pool.py
+from agent import ImprovedDecisionAgent, decision_agent
+from config import config
+from typing import Dict, Any
+from collections import OrderedDict
+import threading
+import time
+
+
+class AgentPool:
+    """
+    Un agente liviano por sesión (ver ImprovedDecisionAgent.for_session).
+
+    Las sesiones inactivas más de AGENT_SESSION_IDLE_SECONDS se descartan y
+    el total se limita a AGENT_POOL_MAX_SESSIONS (LRU), así la memoria se
+    mantiene plana aunque el servidor lleve días arriba.
+    """
+
+    def __init__(self, base: ImprovedDecisionAgent = None, max_sessions: int = None,
+                 idle_seconds: float = None):
+        self.base = base or decision_agent
+        self.max_sessions = max_sessions or config.AGENT_POOL_MAX_SESSIONS
+        self.idle_seconds = idle_seconds or config.AGENT_SESSION_IDLE_SECONDS
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> ImprovedDecisionAgent:
+        """Agente de la sesión (se crea al primer uso)"""
+        now = time.time()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                entry = {"agent": self.base.for_session(session_id), "last_used": now}
+                self._sessions[session_id] = entry
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            entry["last_used"] = now
+            self._sessions.move_to_end(session_id)
+            return entry["agent"]
+
+    def release(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _evict_idle(self, now: float):
+        limit = now - self.idle_seconds
+        idle = [sid for sid, entry in self._sessions.items() if entry["last_used"] < limit]
+        for sid in idle:
+            del self._sessions[sid]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"sessions": len(self._sessions), "max_sessions": self.max_sessions}
+
+# Instancia global
+agent_pool = AgentPool()
@@ -2,10 +2,25 @@
 import streamlit as st
 from storage import storage
 from questionnaire import questionnaire
-from agent import decision_agent
+from agent_pool import agent_pool
+from rate_limit import rate_limiter, admission, AdmissionRejected
+from circuit_breaker import circuit_breakers
+from search_cache import search_cache, CacheWarmer
+from cache_backend import cache_backend
+from tools import refresh_search
+from search_profiles import search_stats
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from visualizer import visualizer
 from config import config
+from llm_router import model_router
+from llm_requests import request_layer
+from llm_cache import llm_cache
+from jobs import job_store, WorkerPool
+from history import analysis_history
+from result_store import result_store
+from datetime import datetime
 import traceback
+import time
 
 # Configuración de la página
 st.set_page_config(
@@ -43,9 +58,66 @@ def initialize_session_state():
     if 'current_question' not in st.session_state:
         st.session_state.current_question = None
     if 'analysis_result' not in st.session_state:
+        # Solo un ResultHandle: el resultado vive en result_store
         st.session_state.analysis_result = None
     if 'questionnaire_completed' not in st.session_state:
         st.session_state.questionnaire_completed = False
+    if 'analysis_job_id' not in st.session_state:
+        st.session_state.analysis_job_id = None
+    if 'next_question_future' not in st.session_state:
+        # Pregunta siguiente generada en segundo plano: (pregunta en curso, future)
+        st.session_state.next_question_future = None
+
+def session_agent():
+    """Agente propio de esta sesión de Streamlit (memoria y estado aislados)"""
+    ctx = get_script_run_ctx()
+    return agent_pool.get(ctx.session_id if ctx else "default")
+
+@st.cache_resource
+def get_worker_pool() -> WorkerPool:
+    """Procesos worker del servidor (uno por proceso de Streamlit, no por sesión)"""
+    pool = WorkerPool()
+    pool.start()
+    return pool
+
+@st.cache_resource
+def get_cache_warmer() -> CacheWarmer:
+    """Warmer de búsquedas frecuentes (uno por proceso de Streamlit)"""
+    warmer = CacheWarmer(search_cache, refresh_search)
+    warmer.start()
+    return warmer
+
+def job_progress_section():
+    """Progreso del análisis encolado; el ID va en la URL para sobrevivir a recargas"""
+    job_id = st.session_state.analysis_job_id or st.query_params.get("job")
+    if not job_id:
+        return
+    
+    get_worker_pool().ensure_running()
+    job = job_store.get(job_id)
+    
+    if job is None or job["status"] in ("done", "failed"):
+        st.session_state.analysis_job_id = None
+        st.query_params.pop("job", None)
+        if job is None:
+            st.warning("No se encontró el análisis solicitado")
+        elif job["status"] == "done":
+            st.session_state.analysis_result = result_store.put(job["result"])
+            st.success("✅ Análisis completado exitosamente")
+        else:
+            st.error(f"⌛ Error durante el análisis: {job['error']}")
+        return
+    
+    st.session_state.analysis_job_id = job_id
+    st.markdown("## 🤔 Analizando tu decisión...")
+    if job["status"] == "queued":
+        st.info(f"⏳ En cola (posición {job['queue_position'] + 1}), {get_worker_pool().alive()} workers activos")
+    with st.expander("Ver progreso", expanded=True):
+        for event in job_store.events(job_id)[-15:]:
+            st.write(event["message"])
+    
+    time.sleep(config.JOB_POLL_INTERVAL)
+    st.rerun()
 
 def questionnaire_page():
     """Página del cuestionario inicial"""
@@ -89,6 +161,15 @@ def questionnaire_page():
     # Usar st.markdown sin HTML, solo texto plano
     st.markdown(st.session_state.current_question)
     
+    # Mientras el usuario escribe, generar la siguiente pregunta candidata
+    prefetched = st.session_state.next_question_future
+    if prefetched is None or prefetched[0] != st.session_state.current_question:
+        future = questionnaire.prefetch_next_question(
+            st.session_state.questionnaire_answers,
+            st.session_state.current_question
+        )
+        st.session_state.next_question_future = (st.session_state.current_question, future)
+    
     st.markdown("---")
     
     # Input para respuesta
@@ -107,18 +188,23 @@ def questionnaire_page():
         
         if submit and answer.strip():
             with st.spinner("Procesando..."):
-                st.session_state.questionnaire_answers = questionnaire.process_answer(
+                prefetched = st.session_state.next_question_future
+                speculative = prefetched[1] if prefetched and prefetched[0] == st.session_state.current_question else None
+                
+                # Extracción y siguiente pregunta (especulativa si sigue siendo válida)
+                answers, next_question = questionnaire.answer_and_advance(
                     st.session_state.current_question,
                     answer,
-                    st.session_state.questionnaire_answers
+                    st.session_state.questionnaire_answers,
+                    speculative
                 )
+                st.session_state.questionnaire_answers = answers
                 
                 # RESTAURAR: Guardar después de cada respuesta
                 questionnaire.save_to_profile(st.session_state.questionnaire_answers)
                 
-                st.session_state.current_question = questionnaire.generate_next_question(
-                    st.session_state.questionnaire_answers
-                )
+                st.session_state.current_question = next_question
+                st.session_state.next_question_future = None
             
             st.rerun()
 
@@ -159,6 +245,7 @@ def decision_analysis_page():
                 st.session_state.questionnaire_completed = False  # NUEVO
                 st.session_state.questionnaire_answers = {}
                 st.session_state.current_question = None
+                st.session_state.next_question_future = None
                 st.session_state.confirm_reset = False
                 st.rerun()
             else:
@@ -174,6 +261,68 @@ def decision_analysis_page():
             value=config.MAX_TREE_DEPTH,
             help="Niveles de profundidad del árbol de decisión"
         )
+        latency_budget = st.number_input(
+            "Tiempo máximo de análisis (s)",
+            min_value=0,
+            max_value=600,
+            value=int(config.ANALYSIS_LATENCY_BUDGET),
+            step=30,
+            help="0 = sin límite. Con límite, la investigación se detiene a tiempo para entregar la respuesta y el árbol"
+        )
+        reuse_history = st.checkbox(
+            "Reutilizar análisis previos",
+            value=True,
+            help="Si ya analizaste la misma pregunta con el mismo perfil, se muestra ese resultado sin recalcular"
+        )
+        
+        st.divider()
+        st.markdown("### 🕘 Historial")
+        history_query = st.text_input("Buscar en tus análisis", placeholder="Ej: maestría, mudarme...")
+        past_analyses = (analysis_history.search(history_query, limit=10) if history_query.strip()
+                         else analysis_history.recent(limit=5))
+        if not past_analyses:
+            st.caption("Sin análisis guardados" if not history_query.strip() else "Sin resultados")
+        for item in past_analyses:
+            date = datetime.fromtimestamp(item["created_at"]).strftime("%d/%m/%Y")
+            label = f"{item['question'][:60]}{'...' if len(item['question']) > 60 else ''}"
+            if st.button(f"{label} ({date})", key=f"history_{item['id']}"):
+                st.session_state.analysis_result = result_store.put(analysis_history.get(item["id"]))
+        
+        st.divider()
+        
+        with st.expander("📈 Métricas de modelos"):
+            metrics = model_router.metrics.snapshot()
+            if metrics:
+                st.json(metrics)
+                st.markdown("**Hedging / single-flight**")
+                st.json(request_layer.snapshot())
+                st.markdown("**Caché de prompts**")
+                st.json(llm_cache.stats())
+                st.markdown("**Admisión de análisis**")
+                st.json(admission.snapshot())
+                st.markdown("**Rate limiting por backend**")
+                st.json(rate_limiter.snapshot())
+                st.markdown("**Circuit breakers de herramientas**")
+                st.json(circuit_breakers.snapshot())
+                st.markdown("**Caché de búsquedas**")
+                st.json({**search_cache.stats(),
+                         "warmer": get_cache_warmer().stats() if config.WARMER_ENABLED else None})
+                if st.button("Invalidar búsquedas en caché"):
+                    search_cache.invalidate()
+                if cache_backend is not None:
+                    st.markdown("**Caché compartida**")
+                    st.json(cache_backend.stats())
+                st.markdown("**Perfiles de búsqueda (latencia / créditos)**")
+                st.json(search_stats.snapshot())
+                st.markdown("**Agentes por sesión**")
+                st.json(agent_pool.stats())
+                st.markdown("**Resultados en memoria / disco**")
+                st.json(result_store.stats())
+                if config.USE_JOB_QUEUE:
+                    st.markdown("**Cola de análisis**")
+                    st.json(job_store.stats())
+            else:
+                st.caption("Sin llamadas registradas todavía")
     
     # Área principal
     st.markdown("""
@@ -196,8 +345,30 @@ def decision_analysis_page():
         st.write("")  # Espaciado
         analyze_button = st.button("🔍 Analizar", type="primary")
     
-    # Analizar decisión
-    if analyze_button and decision_question.strip():
+    # Analizar decisión (o reutilizar uno ya hecho con el mismo perfil)
+    reused = None
+    if analyze_button and decision_question.strip() and reuse_history:
+        reused = analysis_history.find_reusable(
+            decision_question, storage.load_profile().to_context_string()
+        )
+    
+    if reused:
+        st.session_state.analysis_result = result_store.put(reused)
+        date = datetime.fromisoformat(reused["timestamp"]).strftime("%d/%m/%Y %H:%M")
+        st.info(f"♻️ Ya analizaste esta decisión el {date}. Desmarca \"Reutilizar análisis previos\" para recalcular.")
+    
+    elif analyze_button and decision_question.strip() and config.USE_JOB_QUEUE:
+        # Encolar: el análisis corre en un worker, la UI solo consulta el progreso
+        job_id = job_store.submit(
+            decision_question,
+            max_depth=max_depth,
+            latency_budget=latency_budget or None
+        )
+        st.session_state.analysis_job_id = job_id
+        st.session_state.analysis_result = None
+        st.query_params["job"] = job_id
+    
+    elif analyze_button and decision_question.strip():
         try:
             # Crear container para mostrar el proceso de pensamiento
             thinking_container = st.container()
@@ -207,40 +378,53 @@ def decision_analysis_page():
                 st.markdown("---")
             
             # CAMBIO: Usar el método mejorado con reintentos
-            result = decision_agent.analyze_decision_with_retry(
-                decision_question,
-                max_depth=max_depth,
-                thinking_container=thinking_container
-            )
+            # (espera en cola si hay muchos análisis en curso; se rechaza si la espera es excesiva)
+            with admission.admit():
+                result = session_agent().analyze_decision_with_retry(
+                    decision_question,
+                    max_depth=max_depth,
+                    thinking_container=thinking_container,
+                    latency_budget=latency_budget or None
+                )
             
-            st.session_state.analysis_result = result
+            st.session_state.analysis_result = result_store.put(result)
             
             # Mostrar mensaje de éxito
             if result and 'analysis' in result:
                 st.success("✅ Análisis completado exitosamente")
             
+        except AdmissionRejected as e:
+            st.warning(f"⏳ {e}. Hay demasiados análisis en curso; intenta de nuevo en unos minutos.")
+        
         except Exception as e:
             st.error(f"⌛ Error durante el análisis: {str(e)}")
             
             # Ofrecer análisis alternativo
             if st.button("🔄 Intentar análisis simplificado"):
                 try:
-                    result = decision_agent._fallback_analysis(
+                    result = session_agent()._fallback_analysis(
                         decision_question, 
                         storage.load_profile().to_context_string(),
                         max_depth,
                         thinking_container
                     )
-                    st.session_state.analysis_result = result
+                    st.session_state.analysis_result = result_store.put(result)
                 except:
                     st.error("No se pudo completar el análisis. Por favor, intenta reformular tu pregunta.")
             
             with st.expander("Ver detalles del error"):
                 st.code(traceback.format_exc())
     
+    if config.USE_JOB_QUEUE:
+        job_progress_section()
+    
     # Mostrar resultados
-    if st.session_state.analysis_result:
-        result = st.session_state.analysis_result
+    result = result_store.get(st.session_state.analysis_result)
+    if st.session_state.analysis_result and result is None:
+        st.session_state.analysis_result = None
+        st.warning("El resultado anterior ya no está disponible; vuelve a analizar la decisión")
+    
+    if result:
         
         st.divider()
         
@@ -312,6 +496,13 @@ def main():
         st.info("Por favor, configura tu archivo .env con GOOGLE_CLOUD_PROJECT correspondiente")
         st.stop()
     
+    # Workers de la cola de análisis (se inician una vez por servidor)
+    if config.USE_JOB_QUEUE:
+        get_worker_pool()
+    
+    if config.WARMER_ENABLED:
+        get_cache_warmer()
+    
     # Determinar qué página mostrar usando la bandera
     if not st.session_state.questionnaire_completed or st.session_state.questionnaire_active:
         questionnaire_page()
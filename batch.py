@@ -0,0 +1,233 @@
+# batch.py
+# Análisis por lotes sin UI: lee preguntas de un JSONL, las analiza en paralelo
+# y escribe cada resultado apenas termina (reanudable con el archivo de progreso).
+#
+#   python batch.py preguntas.jsonl -o resultados.jsonl --workers 4
+from config import config
+from models import result_to_dict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, Iterator, Optional, Set
+from pathlib import Path
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+import traceback
+
+# Campos aceptados para la pregunta (en orden de preferencia)
+QUESTION_FIELDS = ("question", "pregunta")
+
+# Agente del proceso (en modo process cada worker crea el suyo)
+_agent = None
+
+
+def read_requests(path: Path, skip: Set[str]) -> Iterator[Dict[str, Any]]:
+    """Preguntas del JSONL, en streaming, sin las ya resueltas ni las repetidas"""
+    seen = set(skip)
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Línea {line_number} ignorada (JSON inválido): {e}")
+                continue
+            if not isinstance(data, dict):
+                print(f"Línea {line_number} ignorada: se esperaba un objeto JSON, no {type(data).__name__}")
+                continue
+            question = next((data[field] for field in QUESTION_FIELDS if data.get(field)), None)
+            request_id = str(data.get("id") or data.get("request_id") or f"line-{line_number}")
+            if not question:
+                print(f"Línea {line_number} ignorada: sin pregunta ({', '.join(QUESTION_FIELDS)})")
+                continue
+            if request_id in seen:
+                continue
+            seen.add(request_id)
+            yield {
+                "id": request_id,
+                "question": str(question),
+                "max_depth": data.get("max_depth"),
+                "latency_budget": data.get("latency_budget"),
+                "engine": data.get("engine"),
+            }
+
+
+def load_progress(path: Path) -> Set[str]:
+    """IDs ya resueltos según el archivo de progreso (los fallidos se reintentan)"""
+    done = set()
+    if not path.exists():
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Última línea cortada por una interrupción
+            if entry.get("status") == "done":
+                done.add(entry["id"])
+    return done
+
+
+def analyze_request(request: Dict[str, Any]) -> Dict[str, Any]:
+    """Analiza una pregunta y devuelve el registro de salida (serializable)"""
+    global _agent
+    if _agent is None:
+        # Se importa aquí: en modo process cada worker tiene sus propios clientes
+        from agent import decision_agent
+        _agent = decision_agent
+
+    started = time.time()
+    record = {"id": request["id"], "question": request["question"]}
+    try:
+        result = _agent.for_session(f"batch-{request['id']}").analyze_decision_with_retry(
+            request["question"],
+            max_depth=request.get("max_depth"),
+            latency_budget=request.get("latency_budget"),
+            engine=request.get("engine"),
+        )
+        if result:
+            record.update(status="done", result=json.loads(json.dumps(result_to_dict(result), default=str)))
+        else:
+            record.update(status="failed", error="No se pudo completar el análisis")
+    except Exception as e:
+        print(f"Error analizando {request['id']}: {traceback.format_exc()}")
+        record.update(status="failed", error=str(e))
+    record["seconds"] = round(time.time() - started, 2)
+    return record
+
+
+class ThroughputStats:
+    """Análisis completados, fallidos, por minuto y latencia (p50 / p95)"""
+
+    def __init__(self, skipped: int = 0):
+        self.started = time.time()
+        self.skipped = skipped
+        self.done = 0
+        self.failed = 0
+        self.latencies = []
+
+    def add(self, record: Dict[str, Any]):
+        if record["status"] == "done":
+            self.done += 1
+        else:
+            self.failed += 1
+        self.latencies.append(record["seconds"])
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = time.time() - self.started
+        finished = self.done + self.failed
+        samples = sorted(self.latencies)
+        return {
+            "done": self.done,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "elapsed_s": round(elapsed, 1),
+            "per_minute": round(finished / elapsed * 60, 2) if elapsed > 0 else None,
+            "p50_s": samples[len(samples) // 2] if samples else None,
+            "p95_s": samples[int(round(0.95 * (len(samples) - 1)))] if samples else None,
+        }
+
+
+def run_batch(input_path: Path, output_path: Path, progress_path: Optional[Path] = None,
+              workers: int = None, mode: str = None, report_every: int = 10,
+              defaults: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Procesa el lote y devuelve las estadísticas finales.
+
+    Como máximo workers * 2 preguntas quedan en vuelo: el archivo de entrada
+    se lee a medida que se liberan lugares. Solo el hilo principal escribe
+    la salida y el progreso (una línea por pregunta, con flush).
+    """
+    workers = workers or config.BATCH_WORKERS
+    mode = mode or config.BATCH_MODE
+    progress_path = progress_path or output_path.with_name(output_path.name + ".progress")
+    defaults = {k: v for k, v in (defaults or {}).items() if v is not None}
+
+    done_ids = load_progress(progress_path)
+    stats = ThroughputStats(skipped=len(done_ids))
+    if done_ids:
+        print(f"Reanudando: {len(done_ids)} preguntas ya resueltas en {progress_path}")
+
+    if mode == "process":
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    requests = read_requests(input_path, done_ids)
+    in_flight = {}
+    try:
+        with open(output_path, "a", encoding="utf-8") as output, \
+                open(progress_path, "a", encoding="utf-8") as progress:
+            exhausted = False
+            while True:
+                while not exhausted and len(in_flight) < workers * 2:
+                    request = next(requests, None)
+                    if request is None:
+                        exhausted = True
+                        break
+                    request = {**request, **{k: v for k, v in defaults.items() if not request.get(k)}}
+                    in_flight[executor.submit(analyze_request, request)] = request
+                if not in_flight:
+                    break
+
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    request = in_flight.pop(future)
+                    try:
+                        record = future.result()
+                    except Exception as e:
+                        # Ej. un proceso worker que murió
+                        record = {"id": request["id"], "question": request["question"],
+                                  "status": "failed", "error": str(e), "seconds": 0.0}
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    output.flush()
+                    progress.write(json.dumps({"id": record["id"], "status": record["status"],
+                                               "at": time.time()}) + "\n")
+                    progress.flush()
+                    stats.add(record)
+
+                    if report_every and (stats.done + stats.failed) % report_every == 0:
+                        print(f"Progreso: {json.dumps(stats.snapshot())}")
+    except KeyboardInterrupt:
+        print("Interrumpido: lo terminado ya está guardado, vuelve a correr para continuar")
+        for future in in_flight:
+            future.cancel()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return stats.snapshot()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Análisis de decisiones por lotes desde un JSONL")
+    parser.add_argument("input", type=Path, help="JSONL de entrada: {\"id\": ..., \"question\": ...} por línea")
+    parser.add_argument("-o", "--output", type=Path, help="JSONL de resultados (por defecto <input>.results.jsonl)")
+    parser.add_argument("--progress", type=Path, help="Archivo de progreso (por defecto <output>.progress)")
+    parser.add_argument("--workers", type=int, default=config.BATCH_WORKERS, help="Análisis en paralelo")
+    parser.add_argument("--mode", choices=("thread", "process"), default=config.BATCH_MODE,
+                        help="Pool de hilos o de procesos")
+    parser.add_argument("--max-depth", type=int, help="Profundidad del árbol por defecto")
+    parser.add_argument("--latency-budget", type=float, help="Deadline por análisis en segundos")
+    parser.add_argument("--engine", choices=("react", "plan"), help="Motor de análisis por defecto")
+    parser.add_argument("--report-every", type=int, default=10, help="Reportar cada N análisis (0 = solo al final)")
+    args = parser.parse_args(argv)
+
+    if not args.input.exists():
+        print(f"No existe el archivo de entrada: {args.input}")
+        return 1
+    output = args.output or args.input.with_name(args.input.stem + ".results.jsonl")
+
+    stats = run_batch(
+        args.input, output, args.progress, args.workers, args.mode, args.report_every,
+        defaults={"max_depth": args.max_depth, "latency_budget": args.latency_budget, "engine": args.engine},
+    )
+    print(f"Lote terminado: {json.dumps(stats)}")
+    print(f"Resultados en {output}")
+    return 0 if stats["failed"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+# cache_backend.py
+from config import config
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+from collections import OrderedDict
+import json
+import threading
+import time
+import zlib
+
+# Primer byte del valor guardado: JSON tal cual o comprimido con zlib
+RAW = b"r"
+COMPRESSED = b"z"
+
+
+class CacheUnavailable(ConnectionError):
+    """El backend falló hace poco y se está saltando hasta el próximo reintento"""
+
+
+class CacheBackend:
+    """
+    Interfaz de caché compartida por las cachés de la app (búsquedas, LLM,
+    resultados, perfiles).
+
+    Los valores son JSON; los mayores de CACHE_COMPRESS_MIN_BYTES se guardan
+    comprimidos. Cada namespace tiene una versión que forma parte de la clave:
+    invalidate(namespace) la incrementa y las entradas anteriores dejan de
+    leerse (vencen solas por su TTL).
+    """
+
+    # True si la caché es visible para otras instancias (Redis)
+    shared = False
+
+    def __init__(self):
+        self.counters = {"hits": 0, "misses": 0, "sets": 0, "errors": 0}
+        self._versions: Dict[str, Tuple[int, float]] = {}
+        self._counter_lock = threading.Lock()
+
+    # --- Implementación de cada backend (claves completas, valores en bytes) ---
+
+    def _get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        raise NotImplementedError
+
+    def _set_many(self, items: List[Tuple[str, bytes]], ttl: Optional[float]):
+        raise NotImplementedError
+
+    def _delete(self, key: str):
+        raise NotImplementedError
+
+    def _read_version(self, namespace: str) -> int:
+        raise NotImplementedError
+
+    def _bump_version(self, namespace: str) -> int:
+        raise NotImplementedError
+
+    # --- API común ---
+
+    def version(self, namespace: str) -> int:
+        """Versión del namespace (se relee cada CACHE_VERSION_REFRESH_SECONDS)"""
+        cached = self._versions.get(namespace)
+        now = time.monotonic()
+        if cached and now - cached[1] < config.CACHE_VERSION_REFRESH_SECONDS:
+            return cached[0]
+        try:
+            version = self._read_version(namespace)
+        except Exception as e:
+            self._error("leyendo versión", e)
+            return cached[0] if cached else 0
+        self._versions[namespace] = (version, now)
+        return version
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{config.CACHE_KEY_PREFIX}:{namespace}:v{self.version(namespace)}:{key}"
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        return self.mget(namespace, [key]).get(key)
+
+    def mget(self, namespace: str, keys: Iterable[str]) -> Dict[str, Any]:
+        """Varias claves en una sola ida y vuelta; solo devuelve las encontradas"""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        try:
+            raw_values = self._get_many([self._key(namespace, key) for key in keys])
+        except Exception as e:
+            self._error("leyendo", e)
+            raw_values = [None] * len(keys)
+
+        found = {}
+        for key, raw in zip(keys, raw_values):
+            value = self._decode(raw) if raw is not None else None
+            if value is not None:
+                found[key] = value
+        with self._counter_lock:
+            self.counters["hits"] += len(found)
+            self.counters["misses"] += len(keys) - len(found)
+        return found
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        self.mset(namespace, {key: value}, ttl)
+
+    def mset(self, namespace: str, values: Dict[str, Any], ttl: Optional[float] = None):
+        """Guarda varias claves (TTL en segundos; None = CACHE_DEFAULT_TTL_SECONDS)"""
+        if not values:
+            return
+        ttl = config.CACHE_DEFAULT_TTL_SECONDS if ttl is None else ttl
+        try:
+            self._set_many(
+                [(self._key(namespace, key), self._encode(value)) for key, value in values.items()],
+                ttl if ttl > 0 else None
+            )
+        except Exception as e:
+            self._error("escribiendo", e)
+            return
+        with self._counter_lock:
+            self.counters["sets"] += len(values)
+
+    def delete(self, namespace: str, key: str):
+        try:
+            self._delete(self._key(namespace, key))
+        except Exception as e:
+            self._error("borrando", e)
+
+    def invalidate(self, namespace: str) -> int:
+        """Invalida todo el namespace (en todas las instancias) subiendo su versión"""
+        try:
+            version = self._bump_version(namespace)
+        except Exception as e:
+            self._error("invalidando", e)
+            return self.version(namespace)
+        self._versions[namespace] = (version, time.monotonic())
+        return version
+
+    @staticmethod
+    def _encode(value: Any) -> bytes:
+        raw = json.dumps(value, ensure_ascii=False, default=str).encode("utf-8")
+        if len(raw) >= config.CACHE_COMPRESS_MIN_BYTES:
+            return COMPRESSED + zlib.compress(raw, config.CACHE_COMPRESSION_LEVEL)
+        return RAW + raw
+
+    @staticmethod
+    def _decode(data: bytes) -> Optional[Any]:
+        try:
+            if data[:1] == COMPRESSED:
+                return json.loads(zlib.decompress(data[1:]))
+            if data[:1] == RAW:
+                return json.loads(data[1:])
+        except (zlib.error, ValueError):
+            pass
+        return None
+
+    def _error(self, action: str, error: Exception):
+        with self._counter_lock:
+            self.counters["errors"] += 1
+        if not isinstance(error, CacheUnavailable):
+            print(f"Error {action} en la caché {type(self).__name__}: {error}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counter_lock:
+            counters = dict(self.counters)
+        total = counters["hits"] + counters["misses"]
+        return {"backend": type(self).__name__, "shared": self.shared, **counters,
+                "hit_rate": round(counters["hits"] / total, 3) if total else None,
+                "versions": {ns: version for ns, (version, _) in sorted(self._versions.items())}}
+
+
+class MemoryBackend(CacheBackend):
+    """LRU en memoria del proceso (una instancia; para desarrollo o como capa caliente)"""
+
+    def __init__(self, max_entries: int = None):
+        super().__init__()
+        self.max_entries = max_entries or config.CACHE_MEMORY_MAX_ENTRIES
+        self._data: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+        self._namespace_versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        now = time.time()
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry and entry[1] is not None and entry[1] <= now:
+                    del self._data[key]
+                    entry = None
+                if entry:
+                    self._data.move_to_end(key)
+                values.append(entry[0] if entry else None)
+        return values
+
+    def _set_many(self, items: List[Tuple[str, bytes]], ttl: Optional[float]):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            for key, value in items:
+                self._data[key] = (value, expires_at)
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def _delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def _read_version(self, namespace: str) -> int:
+        with self._lock:
+            return self._namespace_versions.get(namespace, 0)
+
+    def _bump_version(self, namespace: str) -> int:
+        with self._lock:
+            self._namespace_versions[namespace] = self._namespace_versions.get(namespace, 0) + 1
+            return self._namespace_versions[namespace]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = len(self._data)
+        return {**super().stats(), "entries": entries}
+
+
+class RedisBackend(CacheBackend):
+    """
+    Caché compartida por todas las instancias vía protocolo Redis (Redis,
+    Memorystore o fakeredis con CACHE_REDIS_URL=fakeredis://).
+
+    mget y mset van en un pipeline (una ida y vuelta). Si Redis falla, las
+    operaciones se saltan durante CACHE_REDIS_RETRY_SECONDS y cuentan como
+    miss: la app sigue con sus cachés locales.
+    """
+
+    shared = True
+
+    def __init__(self, url: str = None, client=None):
+        super().__init__()
+        self.url = url or config.CACHE_REDIS_URL
+        self.client = client or self._connect(self.url)
+        self._down_until = 0.0
+
+    @staticmethod
+    def _connect(url: str):
+        if url.startswith("fakeredis://"):
+            import fakeredis
+            return fakeredis.FakeRedis()
+        import redis
+        return redis.Redis.from_url(url, socket_timeout=config.CACHE_REDIS_TIMEOUT,
+                                    socket_connect_timeout=config.CACHE_REDIS_TIMEOUT)
+
+    def _call(self, operation):
+        if time.monotonic() < self._down_until:
+            raise CacheUnavailable("Redis no disponible (en espera de reintento)")
+        try:
+            return operation()
+        except Exception:
+            self._down_until = time.monotonic() + config.CACHE_REDIS_RETRY_SECONDS
+            raise
+
+    def _get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return self._call(lambda: self.client.mget(keys))
+
+    def _set_many(self, items: List[Tuple[str, bytes]], ttl: Optional[float]):
+        def write():
+            pipe = self.client.pipeline(transaction=False)
+            for key, value in items:
+                # En milisegundos: ex=int(ttl) sería 0 (inválido) para TTLs menores a un segundo
+                pipe.set(key, value, px=max(1, int(ttl * 1000)) if ttl else None)
+            pipe.execute()
+        self._call(write)
+
+    def _delete(self, key: str):
+        self._call(lambda: self.client.delete(key))
+
+    def _version_key(self, namespace: str) -> str:
+        return f"{config.CACHE_KEY_PREFIX}:version:{namespace}"
+
+    def _read_version(self, namespace: str) -> int:
+        return int(self._call(lambda: self.client.get(self._version_key(namespace))) or 0)
+
+    def _bump_version(self, namespace: str) -> int:
+        return int(self._call(lambda: self.client.incr(self._version_key(namespace))))
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "available": time.monotonic() >= self._down_until}
+
+
+def create_backend(kind: str = None) -> Optional[CacheBackend]:
+    """
+    Backend según CACHE_BACKEND: "memory", "redis" o "none".
+    Si Redis no se puede usar se cae a memoria.
+    """
+    kind = (kind or config.CACHE_BACKEND).lower()
+    if kind == "redis":
+        try:
+            backend = RedisBackend()
+            backend.client.ping()
+            return backend
+        except Exception as e:
+            print(f"Caché Redis no disponible, usando memoria: {e}")
+            return MemoryBackend()
+    if kind == "memory":
+        return MemoryBackend()
+    return None
+
+# Instancia global (None = sin caché compartida)
+cache_backend = create_backend()
@@ -0,0 +1,186 @@
+# checkpoint.py
+from contextvars import ContextVar
+from langchain_core.agents import AgentAction
+from config import config
+from tools import FAILED_OBSERVATION_MARKERS
+from typing import List, Tuple, Dict, Any, Optional
+import hashlib
+import json
+import threading
+import time
+
+
+class AnalysisCheckpoint:
+    """Pasos ya ejecutados (y análisis, si existe) de un análisis en curso"""
+
+    def __init__(self, key: str, steps: List[Tuple[AgentAction, str]] = None,
+                 analysis: Optional[str] = None, updated_at: float = None):
+        self.key = key
+        self.steps = steps or []
+        self.analysis = analysis
+        self.updated_at = updated_at or time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "steps": [
+                {
+                    "tool": action.tool,
+                    "tool_input": action.tool_input,
+                    "log": action.log,
+                    "observation": observation
+                }
+                for action, observation in self.steps
+            ],
+            "analysis": self.analysis,
+            "updated_at": self.updated_at
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AnalysisCheckpoint":
+        steps = [
+            (AgentAction(tool=s["tool"], tool_input=s["tool_input"], log=s["log"]),
+             s["observation"])
+            for s in data.get("steps", [])
+        ]
+        return cls(data["key"], steps, data.get("analysis"), data.get("updated_at"))
+
+
+class CheckpointStore:
+    """
+    Guarda los intermediate_steps de cada análisis paso a paso.
+
+    Siempre en memoria; opcionalmente también en disco bajo
+    DATA_DIR/checkpoints para sobrevivir a un reinicio del proceso. Los
+    vencidos (CHECKPOINT_TTL_SECONDS) se barren de ambos lados.
+    """
+
+    def __init__(self, persist: bool = None, ttl_seconds: int = None):
+        self.persist = config.CHECKPOINT_PERSIST if persist is None else persist
+        self.ttl = ttl_seconds or config.CHECKPOINT_TTL_SECONDS
+        self.dir = config.DATA_DIR / "checkpoints"
+        self._checkpoints: Dict[str, AnalysisCheckpoint] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+        if self.persist:
+            self.dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key_for(question: str, user_context: str, decision_type: str, run_id: str = "default") -> str:
+        """
+        Clave del checkpoint. Incluye run_id (sesión de la UI, job o registro
+        del lote): dos ejecuciones de la misma pregunta no comparten pasos.
+        """
+        raw = json.dumps([question.strip(), user_context, decision_type, run_id], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def load(self, key: str) -> AnalysisCheckpoint:
+        """Devuelve el checkpoint vigente o uno vacío"""
+        self._sweep()
+        with self._lock:
+            checkpoint = self._checkpoints.get(key)
+
+        if checkpoint is None and self.persist:
+            checkpoint = self._load_disk(key)
+            if checkpoint is not None:
+                with self._lock:
+                    self._checkpoints[key] = checkpoint
+
+        if checkpoint is None or time.time() - checkpoint.updated_at > self.ttl:
+            checkpoint = AnalysisCheckpoint(key)
+            with self._lock:
+                self._checkpoints[key] = checkpoint
+
+        return checkpoint
+
+    def record_steps(self, key: str, steps: List[Tuple[AgentAction, str]]):
+        """Agrega pasos exitosos al checkpoint"""
+        checkpoint = self.load(key)
+        with self._lock:
+            checkpoint.steps.extend(steps)
+            checkpoint.updated_at = time.time()
+        self._save_disk(checkpoint)
+
+    def record_analysis(self, key: str, analysis: str):
+        """Guarda el análisis ya redactado para no regenerarlo en el reintento"""
+        checkpoint = self.load(key)
+        with self._lock:
+            checkpoint.analysis = analysis
+            checkpoint.updated_at = time.time()
+        self._save_disk(checkpoint)
+
+    def clear(self, key: str):
+        with self._lock:
+            self._checkpoints.pop(key, None)
+        if self.persist:
+            try:
+                (self.dir / f"{key}.json").unlink(missing_ok=True)
+            except OSError as e:
+                print(f"Error borrando checkpoint: {e}")
+
+    def _sweep(self):
+        """Descarta checkpoints vencidos (análisis que fallaron o se abandonaron), como mucho una vez por minuto"""
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < min(60, self.ttl):
+                return
+            self._last_sweep = now
+            expired = [key for key, cp in self._checkpoints.items() if now - cp.updated_at > self.ttl]
+            for key in expired:
+                del self._checkpoints[key]
+        if not self.persist:
+            return
+        try:
+            for path in self.dir.glob("*.json"):
+                if now - path.stat().st_mtime > self.ttl:
+                    path.unlink(missing_ok=True)
+        except OSError as e:
+            print(f"Error barriendo checkpoints: {e}")
+
+    def _load_disk(self, key: str) -> Optional[AnalysisCheckpoint]:
+        path = self.dir / f"{key}.json"
+        try:
+            if not path.exists():
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                return AnalysisCheckpoint.from_dict(json.load(f))
+        except (OSError, json.JSONDecodeError, KeyError) as e:
+            print(f"Error cargando checkpoint: {e}")
+            return None
+
+    def _save_disk(self, checkpoint: AnalysisCheckpoint):
+        if not self.persist:
+            return
+        path = self.dir / f"{checkpoint.key}.json"
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(checkpoint.to_dict(), f, ensure_ascii=False, default=str)
+            tmp_path.replace(path)
+        except (OSError, TypeError) as e:
+            print(f"Error guardando checkpoint: {e}")
+
+
+class CheckpointRun:
+    """Vincula el ejecutor con el checkpoint del análisis en curso"""
+
+    def __init__(self, store: CheckpointStore, key: str):
+        self.store = store
+        self.key = key
+
+    def record(self, steps: List[Tuple[AgentAction, str]]):
+        # Los errores de parseo y las llamadas fallidas no son pasos reutilizables
+        good_steps = [
+            (a, str(o)) for a, o in steps
+            if a.tool != "_Exception" and not str(o).startswith(FAILED_OBSERVATION_MARKERS)
+        ]
+        if good_steps:
+            self.store.record_steps(self.key, good_steps)
+
+
+# Checkpoint del análisis en curso (None = sin checkpointing)
+active_checkpoint: ContextVar[Optional[CheckpointRun]] = ContextVar("active_checkpoint", default=None)
+
+# Instancia global
+checkpoint_store = CheckpointStore()
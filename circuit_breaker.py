@@ -0,0 +1,162 @@
+# circuit_breaker.py
+from langchain_core.tools import BaseTool, StructuredTool
+from config import config
+from typing import Dict, Any, Sequence
+import threading
+import time
+
+# Estados del breaker
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Prefijo de la observación que devuelve una herramienta con el breaker abierto
+BREAKER_OPEN_MARKER = "La herramienta no está disponible temporalmente"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de una herramienta.
+
+    Tras BREAKER_FAILURE_THRESHOLD fallos seguidos se abre: las llamadas
+    fallan al instante durante BREAKER_RESET_SECONDS. Luego deja pasar una
+    sola llamada de prueba (half-open); si funciona se cierra, si no se
+    vuelve a abrir.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = None, reset_seconds: float = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or config.BREAKER_FAILURE_THRESHOLD
+        self.reset_seconds = reset_seconds or config.BREAKER_RESET_SECONDS
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error = ""
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def _current_state(self, now: float) -> str:
+        if self.state == OPEN and now - self.opened_at >= self.reset_seconds:
+            return HALF_OPEN
+        return self.state
+
+    def available(self) -> bool:
+        """True si una llamada nueva podría pasar (cerrado o listo para probar)"""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            return state == CLOSED or (state == HALF_OPEN and not self._probe_in_flight)
+
+    def allow(self) -> bool:
+        """Reserva el paso de una llamada; en half-open solo una prueba a la vez"""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == CLOSED:
+                self.counters["calls"] += 1
+                return True
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self.state = HALF_OPEN
+                self._probe_in_flight = True
+                self.counters["calls"] += 1
+                return True
+            self.counters["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, error: str):
+        with self._lock:
+            self.failures += 1
+            self.counters["failures"] += 1
+            self.last_error = error[:200]
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.counters["opened"] += 1
+                    print(f"Circuit breaker {self.name}: abierto ({self.last_error})")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def retry_in(self) -> float:
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._current_state(time.monotonic()),
+                "consecutive_failures": self.failures,
+                **self.counters,
+                "last_error": self.last_error,
+            }
+
+
+class BreakerRegistry:
+    """Un breaker por herramienta, compartido por todas las sesiones del proceso"""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker(name)
+            return self._breakers[name]
+
+    def available(self, name: str) -> bool:
+        return self.get(name).available()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {name: breaker.snapshot() for name, breaker in sorted(breakers.items())}
+
+
+def unavailable_message(breaker: CircuitBreaker) -> str:
+    """Observación para el agente cuando la herramienta está fuera de servicio"""
+    return (f"{BREAKER_OPEN_MARKER}: {breaker.name} "
+            f"({breaker.last_error or 'fallos repetidos'}). No la vuelvas a usar en este análisis: "
+            f"continúa con las otras herramientas o con la información que ya tienes.")
+
+
+def guard_tool(tool: BaseTool, failure_markers: Sequence[str] = (),
+               registry: BreakerRegistry = None) -> BaseTool:
+    """
+    Envuelve una herramienta con su circuit breaker (mismo nombre, descripción
+    y argumentos). Cuenta como fallo una excepción o una salida que empiece
+    con alguno de failure_markers (las herramientas devuelven sus errores como texto).
+    """
+    breaker = (registry or circuit_breakers).get(tool.name)
+    fields = list(tool.args)
+
+    def guarded(*args, **kwargs):
+        if not breaker.allow():
+            return unavailable_message(breaker)
+        kwargs.update(zip(fields, args))
+        try:
+            output = tool.invoke(kwargs)
+        except Exception as e:
+            breaker.record_failure(str(e))
+            return f"Error en {tool.name}: {str(e)}"
+
+        text = str(output)
+        if any(text.startswith(marker) for marker in failure_markers):
+            breaker.record_failure(text)
+        else:
+            breaker.record_success()
+        return output
+
+    return StructuredTool.from_function(
+        func=guarded, name=tool.name, description=tool.description,
+        args_schema=tool.args_schema
+    )
+
+# Instancia global
+circuit_breakers = BreakerRegistry()
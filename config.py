@@ -10,6 +10,27 @@ class Config:
     GOOGLE_CLOUD_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT")
     GOOGLE_CLOUD_REGION = os.getenv("GOOGLE_CLOUD_REGION")
     VERTEX_AI_MODEL = os.getenv("VERTEX_AI_MODEL")
+    
+    # Ruteo de modelos: modelo rápido para extracción/clasificación/árbol
+    # y modelo de respaldo ante timeouts o errores de cuota
+    VERTEX_AI_FAST_MODEL = os.getenv("VERTEX_AI_FAST_MODEL") or VERTEX_AI_MODEL
+    VERTEX_AI_FALLBACK_MODEL = os.getenv("VERTEX_AI_FALLBACK_MODEL")
+    # MODEL_ROUTE_<RUTA>=modelo fuerza el modelo de una ruta (ej. MODEL_ROUTE_TREE)
+    MODEL_ROUTE_OVERRIDES = {
+        key[len("MODEL_ROUTE_"):].lower(): value
+        for key, value in os.environ.items()
+        if key.startswith("MODEL_ROUTE_") and value
+    }
+    USE_LLM_CLASSIFIER = os.getenv("USE_LLM_CLASSIFIER", "false").lower() == "true"
+    
+    # Hedging de requests al LLM (latencia de cola)
+    HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+    HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+    HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+    HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "30"))
+    HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "2"))
+    HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))
+    HEDGE_POOL_SIZE = int(os.getenv("HEDGE_POOL_SIZE", "32"))
 
     # Tavily API
     TAVILY_API_KEY = os.getenv("TAVILY_API_KEY") 
@@ -38,6 +59,155 @@ class Config:
     AGENT_TEMPERATURE = float(os.getenv("AGENT_TEMPERATURE", "0.1"))
     AGENT_MAX_RETRIES = int(os.getenv("AGENT_MAX_RETRIES", "3"))
     AGENT_TIMEOUT = int(os.getenv("AGENT_TIMEOUT", "300"))
+
+    # Presupuesto de tokens del scratchpad (observaciones del agente)
+    SCRATCHPAD_MAX_TOKENS = int(os.getenv("SCRATCHPAD_MAX_TOKENS", "6000"))
+    SCRATCHPAD_KEEP_RECENT = int(os.getenv("SCRATCHPAD_KEEP_RECENT", "2"))
+    SCRATCHPAD_COMPACT_CHARS = int(os.getenv("SCRATCHPAD_COMPACT_CHARS", "300"))
+
+    # Deadline del análisis (0 = sin límite)
+    ANALYSIS_LATENCY_BUDGET = float(os.getenv("ANALYSIS_LATENCY_BUDGET", "0"))
+    DEADLINE_RESERVE_SECONDS = float(os.getenv("DEADLINE_RESERVE_SECONDS", "45"))
+    DEADLINE_STALE_STEPS = int(os.getenv("DEADLINE_STALE_STEPS", "2"))
+    DEADLINE_MIN_NEW_FACTS = int(os.getenv("DEADLINE_MIN_NEW_FACTS", "1"))
+    # Timeout máximo por llamada (con deadline se acota además a lo que le queda)
+    LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+    SEARCH_REQUEST_TIMEOUT = float(os.getenv("SEARCH_REQUEST_TIMEOUT", "30"))
+
+    # Caché de prompts del LLM (SQLite)
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", str(DATA_DIR / "llm_cache.sqlite")))
+    LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "50"))
+    LLM_CACHE_DISABLED_ROUTES = [r.strip() for r in os.getenv("LLM_CACHE_DISABLED_ROUTES", "").split(",") if r.strip()]
+
+    # Calculadora del agente (límites de evaluación)
+    CALC_MAX_LENGTH = int(os.getenv("CALC_MAX_LENGTH", "500"))
+    CALC_MAX_EXPONENT = int(os.getenv("CALC_MAX_EXPONENT", "1000"))
+    CALC_MAX_MAGNITUDE = float(os.getenv("CALC_MAX_MAGNITUDE", "1e100"))
+    CALC_MAX_STEPS = int(os.getenv("CALC_MAX_STEPS", "2000"))
+    CALC_MAX_BATCH = int(os.getenv("CALC_MAX_BATCH", "20"))
+    CALC_CACHE_SIZE = int(os.getenv("CALC_CACHE_SIZE", "256"))
+
+    # Cuestionario: extracción y siguiente pregunta en paralelo, con prefetch especulativo
+    QUESTIONNAIRE_PREFETCH = os.getenv("QUESTIONNAIRE_PREFETCH", "true").lower() == "true"
+    QUESTIONNAIRE_WORKERS = int(os.getenv("QUESTIONNAIRE_WORKERS", "4"))
+    # Extractor rápido de respuestas (sin LLM si la confianza alcanza el mínimo)
+    EXTRACTOR_FAST_PATH = os.getenv("EXTRACTOR_FAST_PATH", "true").lower() == "true"
+    EXTRACTOR_MIN_CONFIDENCE = float(os.getenv("EXTRACTOR_MIN_CONFIDENCE", "0.8"))
+    EXTRACTOR_MAX_RESIDUAL_WORDS = int(os.getenv("EXTRACTOR_MAX_RESIDUAL_WORDS", "1"))
+
+    # Cola de análisis en segundo plano (SQLite + procesos worker)
+    USE_JOB_QUEUE = os.getenv("USE_JOB_QUEUE", "false").lower() == "true"
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_DB_PATH = Path(os.getenv("JOB_DB_PATH", str(DATA_DIR / "jobs.sqlite")))
+    JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+    JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "120"))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+
+    # Historial de análisis (SQLite local; export a GCS en Cloud Run)
+    HISTORY_DB_PATH = Path(os.getenv("HISTORY_DB_PATH", str(DATA_DIR / "history.sqlite")))
+    HISTORY_USER_ID = os.getenv("HISTORY_USER_ID", "default")
+    HISTORY_REUSE_MAX_AGE_HOURS = float(os.getenv("HISTORY_REUSE_MAX_AGE_HOURS", "168"))
+    HISTORY_EXPORT_GCS = os.getenv("HISTORY_EXPORT_GCS", "true").lower() == "true"
+    HISTORY_GCS_PREFIX = os.getenv("HISTORY_GCS_PREFIX", "history")
+    HISTORY_IMPORT_PAGE_SIZE = int(os.getenv("HISTORY_IMPORT_PAGE_SIZE", "200"))
+
+    # Resultados fuera de session_state (store comprimido + LRU)
+    RESULT_STORE_DIR = Path(os.getenv("RESULT_STORE_DIR", str(DATA_DIR / "results")))
+    RESULT_LRU_SIZE = int(os.getenv("RESULT_LRU_SIZE", "32"))
+    RESULT_COMPRESSION_LEVEL = int(os.getenv("RESULT_COMPRESSION_LEVEL", "6"))
+    RESULT_TTL_HOURS = float(os.getenv("RESULT_TTL_HOURS", "72"))
+
+    # Agentes por sesión (memoria acotada y expulsión de sesiones inactivas)
+    AGENT_POOL_MAX_SESSIONS = int(os.getenv("AGENT_POOL_MAX_SESSIONS", "200"))
+    AGENT_SESSION_IDLE_SECONDS = float(os.getenv("AGENT_SESSION_IDLE_SECONDS", "3600"))
+    SESSION_MEMORY_RECENT = int(os.getenv("SESSION_MEMORY_RECENT", "3"))
+    SESSION_MEMORY_ENTRY_CHARS = int(os.getenv("SESSION_MEMORY_ENTRY_CHARS", "600"))
+    SESSION_MEMORY_SUMMARY_CHARS = int(os.getenv("SESSION_MEMORY_SUMMARY_CHARS", "2000"))
+
+    # Rate limiting por backend (requests/min, tokens/min; 0 = sin límite).
+    # Los límites son por proceso: con workers, repartir la cuota entre ellos
+    RATE_LIMITS = {
+        "vertex": (float(os.getenv("RATE_LIMIT_VERTEX_RPM", "60")),
+                   float(os.getenv("RATE_LIMIT_VERTEX_TPM", "250000"))),
+        "tavily": (float(os.getenv("RATE_LIMIT_TAVILY_RPM", "60")), 0),
+    }
+    RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "60"))
+    RATE_LIMIT_QUOTA_COOLDOWN = float(os.getenv("RATE_LIMIT_QUOTA_COOLDOWN", "15"))
+    RATE_LIMIT_OUTPUT_TOKENS = int(os.getenv("RATE_LIMIT_OUTPUT_TOKENS", "1000"))
+    # Control de admisión de análisis (en curso / espera máxima estimada)
+    ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "4"))
+    ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "180"))
+    ADMISSION_DEFAULT_SECONDS = float(os.getenv("ADMISSION_DEFAULT_SECONDS", "90"))
+
+    # Circuit breaker de herramientas (fallos seguidos para abrir / segundos hasta la prueba)
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+    BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+    # Índice local (BM25 en SQLite) de las fuentes ya descargadas
+    LOCAL_INDEX_PATH = Path(os.getenv("LOCAL_INDEX_PATH", str(DATA_DIR / "local_index.sqlite")))
+    LOCAL_INDEX_MAX_DOCS = int(os.getenv("LOCAL_INDEX_MAX_DOCS", "20000"))
+    LOCAL_INDEX_MAX_AGE_HOURS = float(os.getenv("LOCAL_INDEX_MAX_AGE_HOURS", "720"))
+    LOCAL_INDEX_EMBEDDINGS = os.getenv("LOCAL_INDEX_EMBEDDINGS", "false").lower() == "true"
+    LOCAL_INDEX_EMBEDDING_MODEL = os.getenv("LOCAL_INDEX_EMBEDDING_MODEL", "text-multilingual-embedding-002")
+    # local_search usa el índice si hay suficientes fuentes y cubren la consulta
+    LOCAL_SEARCH_RESULTS = int(os.getenv("LOCAL_SEARCH_RESULTS", "5"))
+    LOCAL_SEARCH_MIN_RESULTS = int(os.getenv("LOCAL_SEARCH_MIN_RESULTS", "2"))
+    LOCAL_SEARCH_MIN_COVERAGE = float(os.getenv("LOCAL_SEARCH_MIN_COVERAGE", "0.8"))
+
+    # Datos tipados extraídos de las búsquedas (consultados antes de buscar)
+    FACT_DB_PATH = Path(os.getenv("FACT_DB_PATH", str(DATA_DIR / "facts.sqlite")))
+    FACT_MAX_AGE_HOURS = float(os.getenv("FACT_MAX_AGE_HOURS", "168"))
+    FACT_MIN_MATCHES = int(os.getenv("FACT_MIN_MATCHES", "2"))
+
+    # Caché de web_search con TTL y warmer de las consultas frecuentes
+    SEARCH_CACHE_PATH = Path(os.getenv("SEARCH_CACHE_PATH", str(DATA_DIR / "search_cache.sqlite")))
+    SEARCH_CACHE_TTL_HOURS = float(os.getenv("SEARCH_CACHE_TTL_HOURS", "24"))
+    WARMER_ENABLED = os.getenv("WARMER_ENABLED", "true").lower() == "true"
+    WARMER_INTERVAL_SECONDS = float(os.getenv("WARMER_INTERVAL_SECONDS", "600"))
+    WARMER_TOP_N = int(os.getenv("WARMER_TOP_N", "30"))
+    WARMER_MIN_SCORE = float(os.getenv("WARMER_MIN_SCORE", "2"))
+    WARMER_REFRESH_AHEAD_HOURS = float(os.getenv("WARMER_REFRESH_AHEAD_HOURS", "3"))
+    WARMER_MAX_PER_CYCLE = int(os.getenv("WARMER_MAX_PER_CYCLE", "10"))
+    WARMER_MAX_RPM = float(os.getenv("WARMER_MAX_RPM", "6"))
+    WARMER_HALF_LIFE_HOURS = float(os.getenv("WARMER_HALF_LIFE_HOURS", "48"))
+
+    # Perfiles de búsqueda (basic para datos puntuales) y presupuesto por análisis
+    SEARCH_ADAPTIVE = os.getenv("SEARCH_ADAPTIVE", "true").lower() == "true"
+    SEARCH_FACT_MAX_TERMS = int(os.getenv("SEARCH_FACT_MAX_TERMS", "6"))
+    SEARCH_BUDGET_MAX_SEARCHES = int(os.getenv("SEARCH_BUDGET_MAX_SEARCHES", "8"))
+    SEARCH_BUDGET_MAX_CREDITS = int(os.getenv("SEARCH_BUDGET_MAX_CREDITS", "12"))
+
+    # Fragmentos de cada fuente en las observaciones (oraciones más relevantes)
+    SNIPPET_MAX_TOKENS = int(os.getenv("SNIPPET_MAX_TOKENS", "60"))
+    SNIPPET_NUMBER_WEIGHT = float(os.getenv("SNIPPET_NUMBER_WEIGHT", "1.0"))
+
+    # Caché compartida entre instancias: "memory", "redis" o "none"
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_REDIS_TIMEOUT = float(os.getenv("CACHE_REDIS_TIMEOUT", "0.5"))
+    CACHE_REDIS_RETRY_SECONDS = float(os.getenv("CACHE_REDIS_RETRY_SECONDS", "30"))
+    CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "agente")
+    CACHE_DEFAULT_TTL_SECONDS = float(os.getenv("CACHE_DEFAULT_TTL_SECONDS", "86400"))
+    CACHE_MEMORY_MAX_ENTRIES = int(os.getenv("CACHE_MEMORY_MAX_ENTRIES", "2000"))
+    CACHE_COMPRESS_MIN_BYTES = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "1024"))
+    CACHE_COMPRESSION_LEVEL = int(os.getenv("CACHE_COMPRESSION_LEVEL", "6"))
+    CACHE_VERSION_REFRESH_SECONDS = float(os.getenv("CACHE_VERSION_REFRESH_SECONDS", "10"))
+
+    # Análisis por lotes (batch.py): concurrencia y pool "thread" o "process"
+    BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+    BATCH_MODE = os.getenv("BATCH_MODE", "thread")
+
+    # Motor de análisis: "react" (iterativo) o "plan" (planificar y ejecutar)
+    ANALYSIS_ENGINE = os.getenv("ANALYSIS_ENGINE", "react")
+    PLAN_MAX_SEARCHES = int(os.getenv("PLAN_MAX_SEARCHES", "5"))
+    PLAN_MAX_CALCULATIONS = int(os.getenv("PLAN_MAX_CALCULATIONS", "3"))
+    PLAN_MAX_WORKERS = int(os.getenv("PLAN_MAX_WORKERS", "6"))
+
+    # Checkpoints de pasos del agente (reintentos que reanudan)
+    CHECKPOINT_PERSIST = os.getenv("CHECKPOINT_PERSIST", "false").lower() == "true"
+    CHECKPOINT_TTL_SECONDS = int(os.getenv("CHECKPOINT_TTL_SECONDS", "3600"))
+    CHECKPOINT_SYNTHESIS_MIN_STEPS = int(os.getenv("CHECKPOINT_SYNTHESIS_MIN_STEPS", "4"))
     
     # Google Search Grounding
     USE_GROUNDING = True
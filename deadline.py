@@ -0,0 +1,109 @@
+# deadline.py
+from contextvars import ContextVar
+from config import config
+from typing import Optional, Set, List
+import re
+import time
+
+# Hechos "nuevos" en una observación: cifras (con unidad si existe) y URLs
+FACT_RE = re.compile(
+    r'https?://\S+|\b\d+(?:[.,]\d+)*\s*(?:%|k|mil|millones|pen|soles|usd|dólares|años|meses)?',
+    re.IGNORECASE
+)
+
+
+class Deadline:
+    """
+    Presupuesto de latencia de un análisis completo.
+
+    Lleva el tiempo restante, reserva una parte para la respuesta final y el
+    árbol, y detecta cuando las observaciones nuevas dejan de aportar hechos.
+    """
+
+    def __init__(self, budget_seconds: float, reserve_seconds: float = None,
+                 stale_steps: int = None, min_new_facts: int = None):
+        self.budget = float(budget_seconds)
+        self.reserve = reserve_seconds if reserve_seconds is not None else config.DEADLINE_RESERVE_SECONDS
+        # La reserva nunca puede comerse todo el presupuesto
+        self.reserve = min(self.reserve, self.budget * 0.5)
+        self.stale_steps = stale_steps or config.DEADLINE_STALE_STEPS
+        self.min_new_facts = min_new_facts if min_new_facts is not None else config.DEADLINE_MIN_NEW_FACTS
+
+        self.start = time.monotonic()
+        self.stop_reason: Optional[str] = None
+
+        self._seen_facts: Set[str] = set()
+        self._new_facts_per_step: List[int] = []
+        self._last_step_at = self.start
+        self._step_durations: List[float] = []
+
+    def start_attempt(self):
+        """Reinicia el seguimiento de novedad para un nuevo intento"""
+        self.stop_reason = None
+        self._seen_facts = set()
+        self._new_facts_per_step = []
+        self._last_step_at = time.monotonic()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    def remaining(self) -> float:
+        return max(0.0, self.budget - self.elapsed())
+
+    def research_remaining(self) -> float:
+        """Tiempo disponible para investigar antes de tocar la reserva"""
+        return self.remaining() - self.reserve
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def note_observation(self, observation: str) -> int:
+        """Registra una observación y devuelve cuántos hechos nuevos aportó"""
+        now = time.monotonic()
+        self._step_durations.append(now - self._last_step_at)
+        self._last_step_at = now
+
+        facts = {f.strip().lower() for f in FACT_RE.findall(observation) if f.strip()}
+        new_facts = facts - self._seen_facts
+        self._seen_facts |= facts
+        self._new_facts_per_step.append(len(new_facts))
+        return len(new_facts)
+
+    def is_stale(self) -> bool:
+        """True si los últimos pasos no aportaron hechos nuevos"""
+        recent = self._new_facts_per_step[-self.stale_steps:]
+        if len(self._new_facts_per_step) <= self.stale_steps:
+            return False
+        return all(count < self.min_new_facts for count in recent)
+
+    def expected_step_seconds(self) -> float:
+        if not self._step_durations:
+            return 0.0
+        return sum(self._step_durations) / len(self._step_durations)
+
+    def should_stop_research(self) -> bool:
+        """Decide si el ejecutor debe dejar de investigar"""
+        if self.research_remaining() <= 0:
+            self.stop_reason = "presupuesto de tiempo agotado"
+        elif self.research_remaining() < self.expected_step_seconds():
+            self.stop_reason = "no queda tiempo para otro paso"
+        elif self.is_stale():
+            self.stop_reason = "las últimas búsquedas no aportaron datos nuevos"
+        return self.stop_reason is not None
+
+
+def call_timeout(default: Optional[float] = None, research: bool = False) -> Optional[float]:
+    """
+    Timeout para una llamada externa (LLM o búsqueda): lo que queda del
+    deadline activo (sin la reserva si research), acotado por default.
+    """
+    deadline = active_deadline.get()
+    if deadline is None:
+        return default
+    remaining = deadline.research_remaining() if research else deadline.remaining()
+    remaining = max(1.0, remaining)
+    return min(default, remaining) if default else remaining
+
+
+# Deadline del análisis en curso (None = sin límite)
+active_deadline: ContextVar[Optional[Deadline]] = ContextVar("active_deadline", default=None)
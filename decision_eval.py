@@ -0,0 +1,168 @@
+# decision_eval.py
+import numpy as np
+from typing import Dict, Any, List, Tuple, Optional
+
+# Tolerancia (en puntos porcentuales) antes de renormalizar probabilidades
+PROBABILITY_TOLERANCE = 5.0
+MAX_OPTIONS = 10
+MAX_SCENARIOS = 50
+
+
+def normalize_probabilities(probabilities: List[float],
+                            tolerance: float = PROBABILITY_TOLERANCE) -> Tuple[np.ndarray, bool]:
+    """
+    Probabilidades en porcentaje (0-100). Si la suma se aleja de 100 más que
+    la tolerancia, se reescalan para sumar 100. Devuelve (array, normalizadas?)
+    """
+    probs = np.clip(np.asarray(probabilities, dtype=float), 0, None)
+    total = probs.sum()
+    if total > 0 and abs(total - 100) > tolerance:
+        return probs / total * 100, True
+    return probs, False
+
+
+def _as_percent(values: List[float]) -> List[float]:
+    """Acepta probabilidades como fracción (0.6) o porcentaje (60)"""
+    values = [float(v) for v in values]
+    if values and sum(values) <= 1.0 + 1e-9 and max(values) <= 1.0:
+        return [v * 100 for v in values]
+    return values
+
+
+def _payoffs_of(node: Dict[str, Any]) -> Dict[str, float]:
+    """Pagos por recurso: payoffs explícitos o benefits - costs (formato del árbol)"""
+    payoffs: Dict[str, float] = {}
+    for resource, amount in (node.get("payoffs") or {}).items():
+        payoffs[str(resource).lower()] = payoffs.get(str(resource).lower(), 0.0) + float(amount)
+    for key, sign in (("benefits", 1.0), ("costs", -1.0)):
+        for item in node.get(key, []) or []:
+            resource = str(item.get("resource_type", "otro")).lower()
+            payoffs[resource] = payoffs.get(resource, 0.0) + sign * float(item.get("amount", 0) or 0)
+    return payoffs
+
+
+def _flatten(node: Dict[str, Any], probability: float = 100.0,
+             inherited: Optional[Dict[str, float]] = None) -> List[Tuple[float, Dict[str, float]]]:
+    """Hojas de un subárbol con su probabilidad de camino y pagos acumulados"""
+    payoffs = dict(inherited or {})
+    for resource, amount in _payoffs_of(node).items():
+        payoffs[resource] = payoffs.get(resource, 0.0) + amount
+
+    children = node.get("children") or []
+    if not children:
+        return [(probability, payoffs)]
+
+    child_probs, _ = normalize_probabilities(_as_percent([c.get("probability", 0) for c in children]))
+    leaves = []
+    for child, child_prob in zip(children, child_probs):
+        leaves.extend(_flatten(child, probability * child_prob / 100, payoffs))
+    return leaves
+
+
+def parse_options(spec: Dict[str, Any]) -> List[Tuple[str, List[Tuple[float, Dict[str, float]]]]]:
+    """
+    Opciones como [(nombre, [(probabilidad, pagos)])] desde cualquiera de los formatos:
+
+    - escenarios: {"options": [{"name", "scenarios": [{"probability", "payoffs"}]}]}
+    - árbol: nodo raíz con "children" (cada hijo es una opción, costs/benefits por nodo)
+    """
+    options = []
+    if "options" in spec:
+        for i, option in enumerate(spec["options"]):
+            name = str(option.get("name") or option.get("description") or f"Opción {i + 1}")
+            scenarios = option.get("scenarios") or []
+            if scenarios:
+                probs = _as_percent([s.get("probability", 0) for s in scenarios])
+                outcomes = [(p, _payoffs_of(s)) for p, s in zip(probs, scenarios)]
+            else:
+                outcomes = [(100.0, _payoffs_of(option))]
+            options.append((name, outcomes))
+    elif spec.get("children"):
+        for i, child in enumerate(spec["children"]):
+            name = str(child.get("description") or child.get("name") or f"Opción {i + 1}")
+            options.append((name, _flatten(child)))
+    else:
+        raise ValueError('se esperaba "options" (escenarios) o "children" (árbol)')
+
+    if not options:
+        raise ValueError("no hay opciones que evaluar")
+    if len(options) > MAX_OPTIONS:
+        raise ValueError(f"máximo {MAX_OPTIONS} opciones")
+    if any(len(outcomes) > MAX_SCENARIOS for _, outcomes in options):
+        raise ValueError(f"máximo {MAX_SCENARIOS} escenarios por opción")
+    return options
+
+
+def evaluate_options(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Valor esperado, varianza y mejor opción por recurso (y ponderada si hay weights)"""
+    options = parse_options(spec)
+    names = [name for name, _ in options]
+    resources = sorted({r for _, outcomes in options for _, payoffs in outcomes for r in payoffs})
+    if not resources:
+        raise ValueError("ningún escenario tiene pagos (payoffs o costs/benefits)")
+
+    n_scenarios = max(len(outcomes) for _, outcomes in options)
+    # Matrices opciones x escenarios (x recursos), con relleno de probabilidad 0
+    probs = np.zeros((len(options), n_scenarios))
+    payoffs = np.zeros((len(options), n_scenarios, len(resources)))
+    warnings = []
+    for i, (name, outcomes) in enumerate(options):
+        normalized, changed = normalize_probabilities([p for p, _ in outcomes])
+        if changed:
+            total = sum(p for p, _ in outcomes)
+            warnings.append(f"Las probabilidades de '{name}' sumaban {total:.1f}%; se normalizaron a 100%")
+        probs[i, :len(outcomes)] = normalized / 100
+        for j, (_, scenario) in enumerate(outcomes):
+            for k, resource in enumerate(resources):
+                payoffs[i, j, k] = scenario.get(resource, 0.0)
+
+    expected = np.einsum("os,osr->or", probs, payoffs)
+    variance = np.einsum("os,osr->or", probs, (payoffs - expected[:, None, :]) ** 2)
+
+    result = {
+        "options": names,
+        "resources": resources,
+        "expected": expected,
+        "variance": variance,
+        "std": np.sqrt(variance),
+        "best_by_resource": {r: names[int(np.argmax(expected[:, k]))] for k, r in enumerate(resources)},
+        "warnings": warnings,
+    }
+
+    weights = spec.get("weights")
+    if weights:
+        w = np.array([float(weights.get(r, 0.0)) for r in resources])
+        # Varianza de la combinación lineal: cada escenario pondera sus recursos
+        weighted_payoffs = payoffs @ w
+        score = np.einsum("os,os->o", probs, weighted_payoffs)
+        score_var = np.einsum("os,os->o", probs, (weighted_payoffs - score[:, None]) ** 2)
+        result["score"] = score
+        result["score_std"] = np.sqrt(score_var)
+        result["best"] = names[int(np.argmax(score))]
+    else:
+        main = "dinero" if "dinero" in resources else resources[0]
+        result["best"] = result["best_by_resource"][main]
+        result["criterion"] = main
+
+    return result
+
+
+def format_evaluation(result: Dict[str, Any]) -> str:
+    """Resumen legible para el agente"""
+    lines = []
+    for i, name in enumerate(result["options"]):
+        parts = [
+            f"{resource}: VE={result['expected'][i, k]:,.2f} σ={result['std'][i, k]:,.2f}"
+            for k, resource in enumerate(result["resources"])
+        ]
+        if "score" in result:
+            parts.append(f"puntaje ponderado: {result['score'][i]:,.2f} σ={result['score_std'][i]:,.2f}")
+        lines.append(f"- {name}: " + "; ".join(parts))
+
+    if len(result["resources"]) > 1:
+        best = ", ".join(f"{r} → {o}" for r, o in result["best_by_resource"].items())
+        lines.append(f"Mejor por recurso: {best}")
+    criterion = "puntaje ponderado" if "score" in result else f"valor esperado en {result['criterion']}"
+    lines.append(f"MEJOR OPCIÓN: {result['best']} (por {criterion})")
+    lines.extend(f"Aviso: {w}" for w in result["warnings"])
+    return "\n".join(lines)
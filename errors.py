@@ -0,0 +1,46 @@
+# errors.py
+import random
+import re
+
+# Patrones (regex sobre el texto en minúsculas) para clasificar errores de LLM, herramientas y análisis.
+# Los códigos HTTP van como palabra completa ("5000 tokens" no es un 500)
+ERROR_PATTERNS = {
+    "quota": [r"\b429\b", r"quota", r"resource exhausted", r"resourceexhausted", r"rate limit",
+              r"too many requests"],
+    "timeout": [r"timeout", r"timed out", r"deadline exceeded", r"deadlineexceeded"],
+    "unavailable": [r"\b50[023]\b", r"unavailable", r"temporarily", r"internal error",
+                    r"connection(?:reset|refused|aborted)?error", r"connection (?:reset|refused|aborted)",
+                    r"remotedisconnected", r"remote end closed"],
+    "insufficient": [r"análisis insuficiente"],
+    "parse": [r"could not parse", r"jsondecodeerror", r"expecting value",
+              r"invalid or incomplete response"],
+}
+ERROR_RES = {kind: re.compile("|".join(patterns)) for kind, patterns in ERROR_PATTERNS.items()}
+
+# Backoff por tipo de error: (espera base, factor, máximo) en segundos
+BACKOFF_POLICY = {
+    "quota": (5.0, 2.0, 30.0),
+    "timeout": (1.0, 2.0, 8.0),
+    "unavailable": (2.0, 2.0, 15.0),
+    "insufficient": (0.0, 1.0, 0.0),   # Reintentar de inmediato (va a síntesis)
+    "parse": (0.0, 1.0, 0.0),
+    "unknown": (2.0, 1.5, 10.0),
+}
+
+
+def classify_error(error: BaseException) -> str:
+    """Clasifica un error en quota, timeout, unavailable, insufficient, parse o unknown"""
+    text = f"{type(error).__name__} {error}".lower()
+    for kind, pattern in ERROR_RES.items():
+        if pattern.search(text):
+            return kind
+    return "unknown"
+
+
+def backoff_delay(kind: str, attempt: int) -> float:
+    """Espera antes del reintento número `attempt` (0 = primer reintento), con jitter"""
+    base, factor, maximum = BACKOFF_POLICY.get(kind, BACKOFF_POLICY["unknown"])
+    if base <= 0:
+        return 0.0
+    delay = min(maximum, base * (factor ** attempt))
+    return delay * random.uniform(0.8, 1.2)
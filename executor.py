@@ -0,0 +1,38 @@
+# executor.py
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentFinish
+from deadline import active_deadline
+from checkpoint import active_checkpoint
+
+
+class ControlledAgentExecutor(AgentExecutor):
+    """AgentExecutor que respeta el deadline activo y guarda cada paso en el checkpoint"""
+
+    def _should_continue(self, iterations: int, time_elapsed: float) -> bool:
+        if not super()._should_continue(iterations, time_elapsed):
+            return False
+
+        deadline = active_deadline.get()
+        if deadline is not None and deadline.should_stop_research():
+            return False
+
+        return True
+
+    def _take_next_step(self, name_to_tool_map, color_mapping, inputs,
+                        intermediate_steps, run_manager=None):
+        output = super()._take_next_step(
+            name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager
+        )
+
+        deadline = active_deadline.get()
+        if deadline is not None and not isinstance(output, AgentFinish):
+            for action, observation in output:
+                # Los errores de parseo no cuentan como investigación
+                if action.tool != "_Exception":
+                    deadline.note_observation(str(observation))
+
+        checkpoint = active_checkpoint.get()
+        if checkpoint is not None and not isinstance(output, AgentFinish):
+            checkpoint.record(output)
+
+        return output
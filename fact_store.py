@@ -0,0 +1,371 @@
+# fact_store.py
+from config import config
+from local_index import tokenize
+from scratchpad import SOURCE_BLOCK_RE, SUMMARY_RE
+from typing import Dict, Any, List, Optional, Tuple
+from pathlib import Path
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# Métrica según la palabra clave más cercana antes de la cifra (texto sin tildes)
+METRIC_TERMS = [
+    ("salario", r"salari\w*|sueldo\w*|remuneraci\w*|gana\w*|ingreso\w*"),
+    ("alquiler", r"alquil\w*|arriend\w*|renta mensual"),
+    ("precio", r"precio\w*|cuesta\w*|cost\w*|valor\w*|tarifa\w*|pension\w*|matricula\w*|cuota\w*|mensualidad\w*"),
+    ("inflacion", r"inflacion"),
+    ("tasa", r"tasa\w*|interes\w*|tea|tcea|rendimiento\w*"),
+    ("crecimiento", r"crec\w*|aument\w*|demanda|variacion\w*|subi\w*|baj\w*"),
+]
+METRIC_RES = [(metric, re.compile(rf"\b(?:{pattern})\b")) for metric, pattern in METRIC_TERMS]
+
+# Cifras con unidad: S/ 8,500 | US$ 1,200 | 3.5 mil soles | 12% | 1.2 millones de dólares
+QUANTITY_RE = re.compile(
+    r"(?P<currency>s/\.?|us\$|\$|usd|pen)?\s*"
+    r"(?P<number>\d{1,3}(?:[.,]\d{3})+(?:[.,]\d+)?|\d+(?:[.,]\d+)?)"
+    r"(?:\s*(?P<multiplier>millones|millon|mil|k)\b)?"
+    r"(?:\s*(?:de\s+)?(?P<unit>%|por ciento|soles|pen|dolares|usd))?"
+)
+PERIOD_RE = [
+    ("mes", re.compile(r"\b(?:mensual\w*|al mes|por mes|/mes)")),
+    ("año", re.compile(r"\b(?:anual\w*|al ano|por ano|/ano)")),
+]
+MULTIPLIERS = {"mil": 1e3, "k": 1e3, "millon": 1e6, "millones": 1e6}
+
+# Términos que no identifican a la entidad de un dato
+GENERIC_TERMS = {
+    "promedio", "aproximadamente", "alrededor", "entre", "hasta", "mas", "menos", "cerca", "mensual",
+    "anual", "actual", "actualmente", "segun", "puede", "pueden", "llega", "alcanza", "oscila",
+    "ronda", "esta", "estan", "fue", "era", "sera", "cada", "total", "nivel", "dato", "cifra",
+    "cerro", "registro", "llego", "alcanzo", "subio", "bajo", "situo", "ubico", "paso", "tiene",
+}
+METRIC_WORDS_RE = re.compile("|".join(rf"(?:{pattern})" for _, pattern in METRIC_TERMS))
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFD", text.lower())
+    return "".join(c for c in text if unicodedata.category(c) != "Mn")
+
+
+def _parse_number(raw: str) -> Optional[float]:
+    """'8,500' / '8.500' / '4,500.50' / '3,5' → float"""
+    if re.fullmatch(r"\d{1,3}([.,]\d{3})+", raw):
+        raw = re.sub(r"[.,]", "", raw)
+    elif "," in raw and "." in raw:
+        decimal = max(raw.rfind(","), raw.rfind("."))
+        raw = re.sub(r"[.,]", "", raw[:decimal]) + "." + raw[decimal + 1:]
+    else:
+        raw = raw.replace(",", ".")
+    try:
+        return float(raw)
+    except ValueError:
+        return None
+
+
+def detect_metric(text: str) -> Optional[str]:
+    """Métrica que pide una consulta (salario, precio, tasa...) o None"""
+    folded = _fold(text)
+    for metric, pattern in METRIC_RES:
+        if pattern.search(folded):
+            return metric
+    return None
+
+
+def entity_terms(text: str, stem: bool = True) -> List[str]:
+    """
+    Términos que identifican la entidad (sin métricas, cifras ni palabras genéricas).
+    Se guardan sin quitar el plural y se buscan por prefijo con el término reducido.
+    """
+    return [
+        term for term in tokenize(text, stem)
+        if not term.isdigit() and term not in GENERIC_TERMS and not METRIC_WORDS_RE.fullmatch(term)
+    ]
+
+
+class Fact:
+    """Dato tipado extraído de una observación"""
+
+    __slots__ = ("entity", "metric", "value", "unit", "period", "source_url", "query",
+                 "snippet", "observed_at")
+
+    def __init__(self, entity: str, metric: str, value: float, unit: Optional[str] = None,
+                 period: Optional[str] = None, source_url: str = "", query: str = "",
+                 snippet: str = "", observed_at: float = None):
+        self.entity = entity
+        self.metric = metric
+        self.value = value
+        self.unit = unit
+        self.period = period
+        self.source_url = source_url
+        self.query = query
+        self.snippet = snippet
+        self.observed_at = observed_at or time.time()
+
+    def formatted_value(self) -> str:
+        if self.unit == "%":
+            return f"{self.value:g}%"
+        amount = f"{self.value:,.2f}".rstrip("0").rstrip(".") if self.value % 1 else f"{self.value:,.0f}"
+        text = f"{amount} {self.unit}" if self.unit else amount
+        return f"{text}/{self.period}" if self.period else text
+
+    def describe(self) -> str:
+        line = f"{self.metric} ({self.entity}): {self.formatted_value()}"
+        return f"{line} [{self.source_url}]" if self.source_url else line
+
+    def __repr__(self) -> str:
+        return f"Fact({self.describe()!r})"
+
+
+def extract_facts(text: str, query: str = "", source_url: str = "",
+                  observed_at: float = None) -> List[Fact]:
+    """Cifras con unidad (moneda o %) de un texto, con su métrica, entidad y periodo"""
+    facts = []
+    for sentence in re.split(r"(?<=[.!?;])\s+|\n+", text):
+        folded = _fold(sentence)
+        if len(folded) < 8:
+            continue
+        for match in QUANTITY_RE.finditer(folded):
+            unit = _unit(match)
+            value = _parse_number(match.group("number"))
+            if unit is None or value is None:
+                continue
+            if match.group("multiplier"):
+                value *= MULTIPLIERS[match.group("multiplier")]
+
+            before = folded[max(0, match.start() - 120):match.start()]
+            metric = _nearest_metric(before) or ("porcentaje" if unit == "%" else "monto")
+            clause = re.split(r"[,:(]", before)[-1] if metric in ("porcentaje", "monto") else before
+            terms = entity_terms(clause, stem=False)[-6:] or entity_terms(query, stem=False)[:6]
+            if not terms:
+                continue
+
+            period = None
+            after = folded[match.end():match.end() + 25]
+            for name, pattern in PERIOD_RE:
+                if pattern.search(after) or pattern.search(before[-40:]):
+                    period = name
+                    break
+
+            facts.append(Fact(
+                entity=" ".join(terms), metric=metric, value=value, unit=unit, period=period,
+                source_url=source_url, query=query, snippet=sentence.strip()[:300],
+                observed_at=observed_at
+            ))
+    return facts
+
+
+def _unit(match: re.Match) -> Optional[str]:
+    currency = (match.group("currency") or "").strip()
+    unit = match.group("unit") or ""
+    if unit in ("%", "por ciento"):
+        return "%"
+    if currency.startswith("s/") or currency == "pen" or unit in ("soles", "pen"):
+        return "PEN"
+    if currency in ("us$", "$", "usd") or unit in ("dolares", "usd"):
+        return "USD"
+    return None
+
+
+def _nearest_metric(text: str) -> Optional[str]:
+    best, position = None, -1
+    for metric, pattern in METRIC_RES:
+        for found in pattern.finditer(text):
+            if found.start() > position:
+                best, position = metric, found.start()
+    return best
+
+
+def facts_from_steps(steps: List) -> List[Fact]:
+    """Datos de los pasos del agente: fuentes de búsqueda y resultados de la calculadora"""
+    facts = []
+    for step in steps:
+        if not (isinstance(step, tuple) and len(step) == 2):
+            continue
+        action, observation = step
+        tool = getattr(action, "tool", "")
+        query = str(getattr(action, "tool_input", ""))
+        text = str(observation)
+        if tool in ("web_search", "local_search"):
+            summary = SUMMARY_RE.search(text)
+            if summary:
+                facts.extend(extract_facts(summary.group(1), query))
+            sources = text.split("FUENTES:", 1)[1] if "FUENTES:" in text else ""
+            for block in SOURCE_BLOCK_RE.finditer(sources):
+                facts.extend(extract_facts(f"{block.group(2)}. {block.group(3)}", query, block.group(4)))
+        elif tool == "calculator":
+            facts.extend(_calculator_facts(query, text))
+    return facts
+
+
+def _calculator_facts(expression: str, observation: str) -> List[Fact]:
+    """'Resultado: X' o la lista numerada 'i. expr = X' de la calculadora"""
+    pairs: List[Tuple[str, str]] = []
+    single = re.match(r"Resultado:\s*(\S+)", observation)
+    if single:
+        pairs.append((expression.strip(), single.group(1)))
+    else:
+        pairs.extend(re.findall(r"^\d+\.\s*(.+?)\s*=\s*(\S+)\s*$", observation, re.MULTILINE))
+    facts = []
+    for expr, raw in pairs:
+        try:
+            facts.append(Fact(entity=expr[:120], metric="cálculo", value=float(raw), source_url="calculator"))
+        except ValueError:
+            continue
+    return facts
+
+
+class FactStore:
+    """
+    Datos tipados (entidad, métrica, valor, unidad, fuente, fecha) en SQLite,
+    indexados por métrica y fecha y con búsqueda full-text sobre la entidad.
+    local_search los consulta antes que el índice de fuentes y que internet.
+    """
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path or config.FACT_DB_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS facts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                entity TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                value REAL NOT NULL,
+                unit TEXT,
+                period TEXT,
+                source_url TEXT NOT NULL DEFAULT '',
+                query TEXT,
+                snippet TEXT,
+                observed_at REAL NOT NULL,
+                UNIQUE (metric, entity, value, unit, source_url)
+            );
+            CREATE INDEX IF NOT EXISTS idx_facts_metric_time ON facts(metric, observed_at DESC);
+        """)
+        self.fts = self._create_fts()
+        self._conn.commit()
+        self._adds = 0
+
+    def _create_fts(self) -> bool:
+        """Índice FTS5 de entidad + consulta; sin FTS5 se usa LIKE"""
+        try:
+            self._conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS facts_fts USING fts5(
+                    entity, query, content='facts', content_rowid='id'
+                );
+                CREATE TRIGGER IF NOT EXISTS facts_ai AFTER INSERT ON facts BEGIN
+                    INSERT INTO facts_fts(rowid, entity, query) VALUES (new.id, new.entity, new.query);
+                END;
+                CREATE TRIGGER IF NOT EXISTS facts_ad AFTER DELETE ON facts BEGIN
+                    INSERT INTO facts_fts(facts_fts, rowid, entity, query) VALUES ('delete', old.id, old.entity, old.query);
+                END;
+                CREATE TRIGGER IF NOT EXISTS facts_au AFTER UPDATE OF query ON facts BEGIN
+                    INSERT INTO facts_fts(facts_fts, rowid, entity, query) VALUES ('delete', old.id, old.entity, old.query);
+                    INSERT INTO facts_fts(rowid, entity, query) VALUES (new.id, new.entity, new.query);
+                END;
+            """)
+            return True
+        except sqlite3.OperationalError as e:
+            print(f"FTS5 no disponible, datos con LIKE: {e}")
+            return False
+
+    def add_search(self, query: str, response: Dict[str, Any]) -> Dict[str, int]:
+        """Extrae y guarda los datos del resumen y de cada fuente de una búsqueda"""
+        facts = []
+        if response.get("answer"):
+            facts.extend(extract_facts(response["answer"], query, "tavily:answer"))
+        for result in response.get("results", []):
+            text = f"{result.get('title', '')}. {result.get('content', '')}"
+            facts.extend(extract_facts(text, query, result.get("url", "")))
+        return self.add(facts)
+
+    def add(self, facts: List[Fact]) -> Dict[str, int]:
+        """
+        Guarda datos nuevos y renueva los ya conocidos (misma métrica, entidad,
+        valor, unidad y fuente): su fecha pasa a la de la nueva observación.
+        Devuelve cuántos se agregaron y cuántos se renovaron.
+        """
+        counts = {"added": 0, "refreshed": 0}
+        if not facts:
+            return counts
+        # La consulta se guarda normalizada para que la búsqueda full-text use los mismos términos
+        rows = [
+            (f.entity, f.metric, f.value, f.unit, f.period, f.source_url,
+             " ".join(entity_terms(f.query, stem=False)), f.snippet, f.observed_at)
+            for f in facts
+        ]
+        with self._lock:
+            for row in rows:
+                exists = self._conn.execute(
+                    "SELECT 1 FROM facts WHERE metric = ? AND entity = ? AND value = ? AND unit IS ? "
+                    "AND source_url = ?", (row[1], row[0], row[2], row[3], row[5])
+                ).fetchone()
+                self._conn.execute(
+                    "INSERT INTO facts (entity, metric, value, unit, period, source_url, query, "
+                    "snippet, observed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(metric, entity, value, unit, source_url) DO UPDATE SET "
+                    "observed_at = MAX(observed_at, excluded.observed_at), snippet = excluded.snippet, "
+                    "period = excluded.period, query = excluded.query", row
+                )
+                counts["refreshed" if exists else "added"] += 1
+            self._conn.commit()
+
+        self._adds += 1
+        if self._adds % 50 == 0:
+            self.prune()
+        return counts
+
+    def lookup(self, query: str, limit: int = 8, max_age_hours: float = None) -> List[Fact]:
+        """Datos recientes de la métrica que pide la consulta cuya entidad contiene sus términos"""
+        metric = detect_metric(query)
+        terms = entity_terms(query)
+        if metric is None or not terms:
+            return []
+        max_age = config.FACT_MAX_AGE_HOURS if max_age_hours is None else max_age_hours
+        min_time = time.time() - max_age * 3600
+
+        with self._lock:
+            if self.fts:
+                match = " AND ".join(f'"{t}"*' for t in terms)
+                rows = self._conn.execute(
+                    "SELECT f.* FROM facts_fts JOIN facts f ON f.id = facts_fts.rowid "
+                    "WHERE facts_fts MATCH ? AND f.metric = ? AND f.observed_at >= ? "
+                    "ORDER BY facts_fts.rank, f.observed_at DESC LIMIT ?",
+                    (match, metric, min_time, limit)
+                ).fetchall()
+            else:
+                sql = "SELECT * FROM facts WHERE metric = ? AND observed_at >= ?"
+                params: List[Any] = [metric, min_time]
+                for term in terms:
+                    sql += " AND (entity || ' ' || query) LIKE ?"
+                    params.append(f"%{term}%")
+                rows = self._conn.execute(sql + " ORDER BY observed_at DESC LIMIT ?",
+                                          params + [limit]).fetchall()
+        return [self._to_fact(row) for row in rows]
+
+    @staticmethod
+    def _to_fact(row: sqlite3.Row) -> Fact:
+        return Fact(
+            entity=row["entity"], metric=row["metric"], value=row["value"], unit=row["unit"],
+            period=row["period"], source_url=row["source_url"], query=row["query"] or "",
+            snippet=row["snippet"] or "", observed_at=row["observed_at"]
+        )
+
+    def prune(self):
+        """Borra los datos más viejos que FACT_MAX_AGE_HOURS"""
+        limit = time.time() - config.FACT_MAX_AGE_HOURS * 3600
+        with self._lock:
+            self._conn.execute("DELETE FROM facts WHERE observed_at < ?", (limit,))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT metric, COUNT(*) FROM facts GROUP BY metric").fetchall()
+        return {metric: count for metric, count in rows}
+
+# Instancia global
+fact_store = FactStore()
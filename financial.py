@@ -0,0 +1,197 @@
+# financial.py
+import numpy as np
+from typing import Dict, Any, List, Optional, Sequence
+
+# Máximo de periodos por cálculo (30 años mensuales)
+MAX_PERIODS = 360
+
+
+def normalize_rate(rate: float) -> float:
+    """Acepta tasas como decimal (0.12) o como porcentaje (12)"""
+    rate = float(rate)
+    return rate / 100 if abs(rate) > 1 else rate
+
+
+def as_cashflows(cashflows: Sequence[float]) -> np.ndarray:
+    flows = np.asarray(cashflows, dtype=float)
+    if flows.ndim != 1 or flows.size < 2:
+        raise ValueError("cashflows debe ser una lista con al menos 2 flujos")
+    if flows.size > MAX_PERIODS + 1:
+        raise ValueError(f"máximo {MAX_PERIODS} periodos")
+    if not np.all(np.isfinite(flows)):
+        raise ValueError("cashflows contiene valores no numéricos")
+    return flows
+
+
+def npv(rate: float, cashflows: Sequence[float]) -> float:
+    """VAN: el flujo 0 es la inversión inicial (negativa), sin descontar"""
+    flows = as_cashflows(cashflows)
+    factors = (1 + normalize_rate(rate)) ** -np.arange(flows.size)
+    return float(np.dot(flows, factors))
+
+
+def irr(cashflows: Sequence[float]) -> Optional[float]:
+    """TIR como raíz del polinomio de flujos; None si no existe una tasa válida"""
+    flows = as_cashflows(cashflows)
+    if not (np.any(flows < 0) and np.any(flows > 0)):
+        return None
+
+    # sum(cf_t * x^t) = 0 con x = 1 / (1 + tir); np.roots espera el grado mayor primero
+    roots = np.roots(flows[::-1])
+    real = roots[np.isreal(roots)].real
+    real = real[real > 0]
+    if real.size == 0:
+        return None
+    rates = 1 / real - 1
+    rates = rates[rates > -1]
+    if rates.size == 0:
+        return None
+    # Con varias raíces, la más cercana a 0 es la interpretable
+    return float(rates[np.argmin(np.abs(rates))])
+
+
+def payback_period(cashflows: Sequence[float], rate: Optional[float] = None) -> Optional[float]:
+    """Periodos hasta recuperar la inversión (interpolado); descontado si se da rate"""
+    flows = as_cashflows(cashflows)
+    if rate is not None:
+        flows = flows * (1 + normalize_rate(rate)) ** -np.arange(flows.size)
+
+    cumulative = np.cumsum(flows)
+    recovered = np.nonzero(cumulative >= 0)[0]
+    if recovered.size == 0:
+        return None
+    period = int(recovered[0])
+    if period == 0:
+        return 0.0
+    # Fracción del periodo en que el acumulado cruza cero
+    return float(period - 1 + (-cumulative[period - 1]) / flows[period])
+
+
+def amortization_schedule(principal: float, annual_rate: float, months: int) -> Dict[str, Any]:
+    """Cronograma de préstamo con cuota fija (sistema francés), mensual"""
+    months = int(months)
+    if not 1 <= months <= MAX_PERIODS:
+        raise ValueError(f"months debe estar entre 1 y {MAX_PERIODS}")
+    principal = float(principal)
+    r = normalize_rate(annual_rate) / 12
+
+    k = np.arange(1, months + 1)
+    if r == 0:
+        payment = principal / months
+        balance = principal - payment * k
+    else:
+        payment = principal * r / (1 - (1 + r) ** -months)
+        growth = (1 + r) ** k
+        balance = principal * growth - payment * (growth - 1) / r
+    previous_balance = np.concatenate(([principal], balance[:-1]))
+    interest = previous_balance * r
+    amortization = payment - interest
+
+    return {
+        "payment": float(payment),
+        "total_paid": float(payment * months),
+        "total_interest": float(interest.sum()),
+        "interest": interest,
+        "amortization": amortization,
+        "balance": np.maximum(balance, 0.0),
+    }
+
+
+def savings_projection(initial: float, monthly_contribution: float, annual_rate: float,
+                       years: int, contribution_growth: float = 0.0) -> np.ndarray:
+    """Saldo al cierre de cada año con aportes mensuales y capitalización mensual"""
+    years = int(years)
+    if not 1 <= years <= MAX_PERIODS // 12:
+        raise ValueError(f"years debe estar entre 1 y {MAX_PERIODS // 12}")
+    r = normalize_rate(annual_rate) / 12
+    growth = normalize_rate(contribution_growth)
+
+    months = np.arange(1, years * 12 + 1)
+    # Aporte de cada mes (crece una vez al año) capitalizado hasta cada cierre anual
+    contributions = monthly_contribution * (1 + growth) ** ((months - 1) // 12)
+    year_ends = np.arange(1, years + 1) * 12
+    # Matriz años x meses: factor de capitalización de cada aporte hasta cada cierre
+    exponents = year_ends[:, None] - months[None, :]
+    factors = np.where(exponents >= 0, (1 + r) ** np.maximum(exponents, 0), 0.0)
+    return initial * (1 + r) ** year_ends + factors @ contributions
+
+
+def _money(value: float) -> str:
+    return f"{value:,.2f}"
+
+
+def _percent(value: Optional[float]) -> str:
+    return f"{value:.2%}" if value is not None else "no existe"
+
+
+def _periods(value: Optional[float]) -> str:
+    return f"{value:.2f} periodos" if value is not None else "no se recupera en el horizonte"
+
+
+def _run_investment(params: Dict[str, Any]) -> List[str]:
+    flows = params["cashflows"]
+    rate = params["rate"]
+    return [
+        f"VAN ({normalize_rate(rate):.2%}): {_money(npv(rate, flows))}",
+        f"TIR: {_percent(irr(flows))}",
+        f"Payback simple: {_periods(payback_period(flows))}",
+        f"Payback descontado: {_periods(payback_period(flows, rate))}",
+    ]
+
+
+def _run_amortization(params: Dict[str, Any]) -> List[str]:
+    schedule = amortization_schedule(params["principal"], params["rate"], params["months"])
+    lines = [
+        f"Cuota mensual: {_money(schedule['payment'])}",
+        f"Total pagado: {_money(schedule['total_paid'])}",
+        f"Intereses totales: {_money(schedule['total_interest'])}",
+        "Resumen anual (intereses / amortización / saldo):",
+    ]
+    months = len(schedule["balance"])
+    for start in range(0, months, 12):
+        end = min(start + 12, months)
+        lines.append(
+            f"  Año {start // 12 + 1}: {_money(schedule['interest'][start:end].sum())} / "
+            f"{_money(schedule['amortization'][start:end].sum())} / "
+            f"{_money(schedule['balance'][end - 1])}"
+        )
+    return lines
+
+
+def _run_projection(params: Dict[str, Any]) -> List[str]:
+    balances = savings_projection(
+        params.get("initial", 0.0), params.get("monthly", 0.0), params["rate"],
+        params["years"], params.get("growth", 0.0)
+    )
+    monthly = float(params.get("monthly", 0.0))
+    growth = normalize_rate(params.get("growth", 0.0))
+    contributed = float(params.get("initial", 0.0)) + np.sum(
+        monthly * 12 * (1 + growth) ** np.arange(len(balances))
+    )
+    lines = [f"  Año {year}: {_money(balance)}" for year, balance in enumerate(balances, 1)]
+    return ["Saldo proyectado al cierre de cada año:"] + lines + [
+        f"Total aportado: {_money(contributed)}",
+        f"Rendimiento: {_money(balances[-1] - contributed)}",
+    ]
+
+
+OPERATIONS = {
+    "npv": lambda p: [f"VAN: {_money(npv(p['rate'], p['cashflows']))}"],
+    "irr": lambda p: [f"TIR: {_percent(irr(p['cashflows']))}"],
+    "payback": lambda p: [f"Payback: {_periods(payback_period(p['cashflows'], p.get('rate')))}"],
+    "investment": _run_investment,
+    "amortization": _run_amortization,
+    "projection": _run_projection,
+}
+
+
+def run_operation(params: Dict[str, Any]) -> str:
+    """Ejecuta una operación financiera descrita como dict ({"operation": ...})"""
+    operation = str(params.get("operation", "")).lower()
+    if operation not in OPERATIONS:
+        raise ValueError(f"operación desconocida '{operation}' (usa: {', '.join(OPERATIONS)})")
+    try:
+        lines = OPERATIONS[operation](params)
+    except KeyError as e:
+        raise ValueError(f"falta el parámetro {e} para '{operation}'")
+    return "\n".join([f"[{operation}]"] + lines)
@@ -0,0 +1,255 @@
+# history.py
+from config import config
+from models import result_to_dict, result_from_dict
+from typing import Dict, Any, List, Optional
+from datetime import datetime
+from pathlib import Path
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import uuid
+
+
+def normalize_question(question: str) -> str:
+    """Minúsculas, sin tildes ni puntuación: misma pregunta → misma clave"""
+    text = unicodedata.normalize("NFD", question.lower())
+    text = "".join(c for c in text if unicodedata.category(c) != "Mn")
+    return " ".join(re.findall(r"\w+", text))
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class AnalysisHistory:
+    """
+    Historial persistente de análisis en SQLite (índices por usuario, tipo y
+    fecha + búsqueda full-text sobre las preguntas).
+
+    En Cloud Run cada análisis se exporta además a GCS (history/<id>.json) y
+    una instancia nueva reconstruye su base desde ahí (en segundo plano).
+    """
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path or config.HISTORY_DB_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                rowid INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT UNIQUE NOT NULL,
+                user_id TEXT NOT NULL,
+                question TEXT NOT NULL,
+                question_hash TEXT NOT NULL,
+                context_hash TEXT NOT NULL,
+                decision_type TEXT,
+                created_at REAL NOT NULL,
+                analysis TEXT NOT NULL,
+                decision_tree TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_analyses_user_time ON analyses(user_id, created_at DESC);
+            CREATE INDEX IF NOT EXISTS idx_analyses_user_type_time ON analyses(user_id, decision_type, created_at DESC);
+            CREATE INDEX IF NOT EXISTS idx_analyses_reuse ON analyses(user_id, question_hash, context_hash, created_at DESC);
+        """)
+        self.fts = self._create_fts()
+        self._conn.commit()
+
+        self.bucket = None
+        if not config.IS_LOCAL and config.HISTORY_EXPORT_GCS:
+            self._init_cloud()
+
+    def _create_fts(self) -> bool:
+        """Índice FTS5 sincronizado por triggers; sin FTS5 se usa LIKE"""
+        try:
+            self._conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS analyses_fts USING fts5(
+                    question, content='analyses', content_rowid='rowid',
+                    tokenize='unicode61 remove_diacritics 2'
+                );
+                CREATE TRIGGER IF NOT EXISTS analyses_ai AFTER INSERT ON analyses BEGIN
+                    INSERT INTO analyses_fts(rowid, question) VALUES (new.rowid, new.question);
+                END;
+                CREATE TRIGGER IF NOT EXISTS analyses_ad AFTER DELETE ON analyses BEGIN
+                    INSERT INTO analyses_fts(analyses_fts, rowid, question) VALUES ('delete', old.rowid, old.question);
+                END;
+            """)
+            return True
+        except sqlite3.OperationalError as e:
+            print(f"FTS5 no disponible, búsqueda con LIKE: {e}")
+            return False
+
+    def save(self, result: Dict[str, Any], user_context: str = "",
+             user_id: str = None) -> str:
+        """Guarda un análisis completado y devuelve su ID"""
+        data = result_to_dict(result)
+        record = {
+            "id": uuid.uuid4().hex,
+            "user_id": user_id or config.HISTORY_USER_ID,
+            "question": data["question"],
+            "question_hash": _hash(normalize_question(data["question"])),
+            "context_hash": _hash(user_context),
+            "decision_type": data.get("decision_type"),
+            "created_at": self._timestamp(data.get("timestamp")),
+            "analysis": data["analysis"],
+            "decision_tree": json.dumps(data.get("decision_tree"), ensure_ascii=False, default=str),
+        }
+        self._insert(record)
+        if self.bucket is not None:
+            threading.Thread(target=self._export, args=(record,), daemon=True).start()
+        return record["id"]
+
+    def _insert(self, record: Dict[str, Any]):
+        self._insert_many([record])
+
+    def _insert_many(self, records: List[Dict[str, Any]]):
+        """Inserta varios registros en una sola transacción (los IDs repetidos se ignoran)"""
+        with self._lock:
+            for record in records:
+                columns = ", ".join(record)
+                placeholders = ", ".join("?" for _ in record)
+                self._conn.execute(
+                    f"INSERT OR IGNORE INTO analyses ({columns}) VALUES ({placeholders})",
+                    tuple(record.values())
+                )
+            self._conn.commit()
+
+    @staticmethod
+    def _timestamp(value: Optional[str]) -> float:
+        try:
+            return datetime.fromisoformat(value).timestamp() if value else time.time()
+        except ValueError:
+            return time.time()
+
+    def get(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        """Resultado completo (con DecisionNode), listo para mostrar"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM analyses WHERE id = ?", (analysis_id,)).fetchone()
+        return self._to_result(row) if row else None
+
+    def find_reusable(self, question: str, user_context: str = "",
+                      user_id: str = None) -> Optional[Dict[str, Any]]:
+        """Análisis previo de la misma pregunta con el mismo perfil, si no caducó"""
+        min_time = time.time() - config.HISTORY_REUSE_MAX_AGE_HOURS * 3600
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM analyses WHERE user_id = ? AND question_hash = ? AND context_hash = ? "
+                "AND created_at >= ? ORDER BY created_at DESC LIMIT 1",
+                (user_id or config.HISTORY_USER_ID, _hash(normalize_question(question)),
+                 _hash(user_context), min_time)
+            ).fetchone()
+        return self._to_result(row) if row else None
+
+    def recent(self, limit: int = 20, decision_type: str = None,
+               user_id: str = None) -> List[Dict[str, Any]]:
+        """Resúmenes (sin análisis ni árbol) de los análisis más recientes"""
+        sql = "SELECT id, question, decision_type, created_at FROM analyses WHERE user_id = ?"
+        params: List[Any] = [user_id or config.HISTORY_USER_ID]
+        if decision_type:
+            sql += " AND decision_type = ?"
+            params.append(decision_type)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def search(self, query: str, limit: int = 20, user_id: str = None) -> List[Dict[str, Any]]:
+        """Búsqueda full-text sobre las preguntas (por relevancia)"""
+        words = re.findall(r"\w+", query.lower())
+        if not words:
+            return []
+        user = user_id or config.HISTORY_USER_ID
+        with self._lock:
+            if self.fts:
+                match = " ".join(f'"{w}"*' for w in words)
+                rows = self._conn.execute(
+                    "SELECT a.id, a.question, a.decision_type, a.created_at "
+                    "FROM analyses_fts JOIN analyses a ON a.rowid = analyses_fts.rowid "
+                    "WHERE analyses_fts MATCH ? AND a.user_id = ? ORDER BY analyses_fts.rank LIMIT ?",
+                    (match, user, limit)
+                ).fetchall()
+            else:
+                sql = "SELECT id, question, decision_type, created_at FROM analyses WHERE user_id = ?"
+                params: List[Any] = [user]
+                for word in words:
+                    sql += " AND question LIKE ?"
+                    params.append(f"%{word}%")
+                sql += " ORDER BY created_at DESC LIMIT ?"
+                rows = self._conn.execute(sql, params + [limit]).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete(self, analysis_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM analyses WHERE id = ?", (analysis_id,))
+            self._conn.commit()
+        if self.bucket is not None:
+            try:
+                self.bucket.blob(f"{config.HISTORY_GCS_PREFIX}/{analysis_id}.json").delete()
+            except Exception as e:
+                print(f"Error borrando historial en Cloud Storage: {e}")
+
+    def _to_result(self, row: sqlite3.Row) -> Dict[str, Any]:
+        tree = json.loads(row["decision_tree"]) if row["decision_tree"] else None
+        return result_from_dict({
+            "history_id": row["id"],
+            "question": row["question"],
+            "analysis": row["analysis"],
+            "decision_tree": tree,
+            "decision_type": row["decision_type"],
+            "timestamp": datetime.fromtimestamp(row["created_at"]).isoformat(),
+        })
+
+    # --- Export a Cloud Storage (modo cloud) ---
+
+    def _init_cloud(self):
+        try:
+            from google.cloud import storage as gcs
+            client = gcs.Client(project=config.GOOGLE_CLOUD_PROJECT)
+            self.bucket = client.bucket(config.STORAGE_BUCKET)
+        except Exception as e:
+            print(f"Historial sin export a Cloud Storage: {e}")
+            self.bucket = None
+            return
+
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        if not count:
+            # En segundo plano: el arranque no espera a descargar todo el historial
+            threading.Thread(target=self._import_from_cloud, name="history-import", daemon=True).start()
+
+    def _import_from_cloud(self):
+        """Instancia nueva (disco efímero): reconstruye la base desde el export, por páginas"""
+        imported = 0
+        try:
+            blobs = self.bucket.list_blobs(prefix=f"{config.HISTORY_GCS_PREFIX}/",
+                                           page_size=config.HISTORY_IMPORT_PAGE_SIZE)
+            for page in blobs.pages:
+                records = []
+                for blob in page:
+                    try:
+                        records.append(json.loads(blob.download_as_text()))
+                    except Exception as e:
+                        print(f"Error importando {blob.name}: {e}")
+                self._insert_many(records)
+                imported += len(records)
+        except Exception as e:
+            print(f"Error importando historial desde Cloud Storage: {e}")
+        print(f"Historial importado desde Cloud Storage: {imported} análisis")
+
+    def _export(self, record: Dict[str, Any]):
+        try:
+            blob = self.bucket.blob(f"{config.HISTORY_GCS_PREFIX}/{record['id']}.json")
+            blob.upload_from_string(json.dumps(record, ensure_ascii=False),
+                                    content_type='application/json')
+        except Exception as e:
+            print(f"Error exportando historial a Cloud Storage: {e}")
+
+# Instancia global
+analysis_history = AnalysisHistory()
@@ -0,0 +1,291 @@
+# jobs.py
+from langchain.callbacks.base import BaseCallbackHandler
+from config import config
+from models import result_to_dict, result_from_dict
+from typing import Dict, Any, List, Optional
+from pathlib import Path
+import multiprocessing
+import threading
+import sqlite3
+import json
+import os
+import time
+import traceback
+import uuid
+
+# Estados de un job
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobStore:
+    """
+    Cola durable de análisis en SQLite, compartida entre la app y los workers.
+
+    Cada proceso abre su propia conexión; el claim de un job es atómico
+    (BEGIN IMMEDIATE), así que varios workers pueden consumir la misma cola.
+    """
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path or config.JOB_DB_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                heartbeat_at REAL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+            CREATE TABLE IF NOT EXISTS job_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                message TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_job_events_job ON job_events(job_id, id);
+        """)
+
+    def submit(self, question: str, max_depth: int = None, latency_budget: float = None,
+               engine: str = None) -> str:
+        """Encola un análisis y devuelve su ID"""
+        job_id = uuid.uuid4().hex
+        payload = {
+            "question": question,
+            "max_depth": max_depth,
+            "latency_budget": latency_budget,
+            "engine": engine,
+        }
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, payload, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(payload, ensure_ascii=False), time.time())
+            )
+        self.add_event(job_id, "📥 En cola")
+        return job_id
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """Toma el job en cola más antiguo (o None)"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, payload FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                    (QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, worker = ?, started_at = ?, heartbeat_at = ?, "
+                        "attempts = attempts + 1 WHERE id = ?",
+                        (RUNNING, worker, now, now, row["id"])
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {"id": row["id"], **json.loads(row["payload"])}
+
+    def heartbeat(self, job_id: str):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def add_event(self, job_id: str, message: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO job_events (job_id, created_at, message) VALUES (?, ?, ?)",
+                (job_id, time.time(), message)
+            )
+
+    def complete(self, job_id: str, result: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, finished_at = ? WHERE id = ?",
+                (DONE, json.dumps(result_to_dict(result), ensure_ascii=False, default=str),
+                 time.time(), job_id)
+            )
+        self.add_event(job_id, "✅ Análisis completado")
+
+    def fail(self, job_id: str, error: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                (FAILED, error, time.time(), job_id)
+            )
+        self.add_event(job_id, f"❌ {error[:200]}")
+
+    def requeue_stale(self) -> int:
+        """Devuelve a la cola los jobs de workers caídos (sin heartbeat reciente)"""
+        limit = time.time() - config.JOB_STALE_SECONDS
+        with self._lock:
+            stale = self._conn.execute(
+                "SELECT id, attempts FROM jobs WHERE status = ? AND heartbeat_at < ?",
+                (RUNNING, limit)
+            ).fetchall()
+            for row in stale:
+                if row["attempts"] >= config.JOB_MAX_ATTEMPTS:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND status = ?",
+                        (FAILED, "El worker dejó de responder", time.time(), row["id"], RUNNING)
+                    )
+                else:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, worker = NULL WHERE id = ? AND status = ?",
+                        (QUEUED, row["id"], RUNNING)
+                    )
+        for row in stale:
+            self.add_event(row["id"], "♻️ Worker sin respuesta, job reencolado")
+        return len(stale)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Estado del job; incluye el resultado (con DecisionNode) si terminó"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            position = None
+            if row is not None and row["status"] == QUEUED:
+                position = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?",
+                    (QUEUED, row["created_at"])
+                ).fetchone()[0]
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = result_from_dict(json.loads(job["result"])) if job["result"] else None
+        job["queue_position"] = position
+        return job
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, created_at, message FROM job_events WHERE job_id = ? AND id > ? ORDER BY id",
+                (job_id, after)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+class JobProgressCallback(BaseCallbackHandler):
+    """Convierte las acciones del agente en eventos de progreso del job"""
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+        self.iteration = 0
+
+    def on_agent_action(self, action, **kwargs):
+        self.iteration += 1
+        self.store.add_event(self.job_id, f"🔄 Iteración {self.iteration}: {action.tool} → {str(action.tool_input)[:150]}")
+        self.store.heartbeat(self.job_id)
+
+    def on_agent_finish(self, finish, **kwargs):
+        self.store.add_event(self.job_id, "📊 Investigación terminada, redactando análisis")
+
+
+def run_job(store: JobStore, job: Dict[str, Any], agent) -> None:
+    """Ejecuta un job con el agente sin UI, con heartbeat mientras corre"""
+    job_id = job["id"]
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(config.JOB_STALE_SECONDS / 4):
+            store.heartbeat(job_id)
+
+    heartbeat = threading.Thread(target=beat, daemon=True)
+    heartbeat.start()
+    store.add_event(job_id, "🧠 Análisis iniciado")
+    try:
+        # Agente propio del job: estado de errores y memoria no se arrastran entre jobs
+        result = agent.for_session(f"job-{job_id}").analyze_decision_with_retry(
+            job["question"],
+            max_depth=job.get("max_depth"),
+            latency_budget=job.get("latency_budget"),
+            engine=job.get("engine"),
+            callbacks=[JobProgressCallback(store, job_id)]
+        )
+        if result:
+            store.complete(job_id, result)
+        else:
+            store.fail(job_id, "No se pudo completar el análisis")
+    except Exception as e:
+        print(f"Error en job {job_id}: {traceback.format_exc()}")
+        store.fail(job_id, str(e))
+    finally:
+        stop.set()
+
+
+def worker_main(db_path: str, worker_name: str):
+    """Bucle de un proceso worker: reclama jobs de la cola y los ejecuta"""
+    # El agente se importa dentro del proceso (spawn): cada worker tiene sus clientes
+    from agent import decision_agent
+
+    store = JobStore(Path(db_path))
+    print(f"Worker {worker_name} iniciado (pid {os.getpid()})")
+    while True:
+        try:
+            store.requeue_stale()
+            job = store.claim(worker_name)
+        except sqlite3.Error as e:
+            print(f"Error leyendo la cola: {e}")
+            job = None
+        if job is None:
+            time.sleep(config.JOB_POLL_INTERVAL)
+            continue
+        run_job(store, job, decision_agent)
+
+
+class WorkerPool:
+    """Procesos worker que consumen la cola (independientes de las sesiones de la UI)"""
+
+    def __init__(self, num_workers: int = None, db_path: Path = None):
+        self.num_workers = num_workers or config.JOB_WORKERS
+        self.db_path = Path(db_path or config.JOB_DB_PATH)
+        self._context = multiprocessing.get_context("spawn")
+        self.processes: List[multiprocessing.Process] = []
+
+    def start(self):
+        for i in range(self.num_workers):
+            process = self._context.Process(
+                target=worker_main, args=(str(self.db_path), f"worker-{i}"),
+                name=f"analysis-worker-{i}", daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+
+    def ensure_running(self):
+        """Reemplaza los workers que hayan terminado"""
+        for i, process in enumerate(self.processes):
+            if not process.is_alive():
+                print(f"Worker {process.name} terminó (exit {process.exitcode}), reiniciando")
+                replacement = self._context.Process(
+                    target=worker_main, args=(str(self.db_path), f"worker-{i}"),
+                    name=process.name, daemon=True
+                )
+                replacement.start()
+                self.processes[i] = replacement
+
+    def alive(self) -> int:
+        return sum(1 for p in self.processes if p.is_alive())
+
+# Instancia global
+job_store = JobStore()
@@ -0,0 +1,167 @@
+# llm_cache.py
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.messages import AIMessage
+from config import config
+from llm_requests import prompt_key
+from cache_backend import cache_backend
+from typing import Optional, Dict, Any
+from pathlib import Path
+import sqlite3
+import threading
+import time
+
+
+class SQLiteLLMCache:
+    """
+    Caché prompt → completion en SQLite con expulsión LRU por tamaño.
+
+    La clave la calcula el llamador (modelo, temperatura y mensajes exactos);
+    aquí solo se guarda el texto de la respuesta.
+    """
+
+    def __init__(self, path: Path = None, max_bytes: int = None):
+        self.path = Path(path or config.LLM_CACHE_PATH)
+        self.max_bytes = max_bytes or int(config.LLM_CACHE_MAX_MB * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                completion TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM llm_cache"
+        ).fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        # Primero la caché compartida (otra instancia pudo haber hecho la llamada)
+        if cache_backend is not None and cache_backend.shared:
+            shared = cache_backend.get("llm", key)
+            if shared is not None:
+                with self._lock:
+                    self.hits += 1
+                return shared
+        completion = self._get_local(key)
+        if completion is not None and cache_backend is not None and cache_backend.shared:
+            cache_backend.set("llm", key, completion)
+        return completion
+
+    def _get_local(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT completion FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, model: str, completion: str):
+        if cache_backend is not None and cache_backend.shared:
+            cache_backend.set("llm", key, completion)
+        size = len(completion.encode("utf-8")) + len(key)
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT size FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, completion, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, completion, size, now, now)
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def delete(self, key: str):
+        if cache_backend is not None and cache_backend.shared:
+            cache_backend.delete("llm", key)
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self._total_bytes -= row[0]
+
+    def _evict(self):
+        """Borra las entradas menos usadas hasta quedar en el 90% del límite"""
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute(
+            "SELECT key, size FROM llm_cache ORDER BY last_access ASC"
+        )
+        to_delete = []
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            to_delete.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", to_delete)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {
+            "entries": entries,
+            "size_mb": round(self._total_bytes / (1024 * 1024), 2),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class CachedLLM(Runnable):
+    """
+    Envoltura con caché de un chat model.
+
+    enabled controla la caché por punto de llamada (ruta); bypass_cache=True
+    en invoke() la salta para una sola llamada.
+    """
+
+    def __init__(self, llm: Runnable, model_id: str, cache: SQLiteLLMCache = None,
+                 enabled: bool = True):
+        self.llm = llm
+        self.model_id = model_id
+        self.cache = cache or llm_cache
+        self.enabled = enabled and config.LLM_CACHE_ENABLED
+
+    def invoke(self, input, config: Optional[RunnableConfig] = None,
+               bypass_cache: bool = False, **kwargs):
+        if not self.enabled or bypass_cache:
+            return self.llm.invoke(input, config, **kwargs)
+
+        key = prompt_key(self.model_id, input, kwargs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return AIMessage(content=cached, response_metadata={"cache_hit": True})
+
+        result = self.llm.invoke(input, config, **kwargs)
+        content = getattr(result, "content", None)
+        if isinstance(content, str) and content.strip():
+            self.cache.set(key, self.model_id, content)
+        return result
+
+    def evict(self, input, **kwargs):
+        """Olvida una respuesta (ej. JSON inválido) para que no se repita desde caché"""
+        if self.enabled:
+            self.cache.delete(prompt_key(self.model_id, input, kwargs))
+
+# Instancia global
+llm_cache = SQLiteLLMCache()
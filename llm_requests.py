@@ -0,0 +1,258 @@
+# llm_requests.py
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.prompt_values import PromptValue
+from langchain_core.messages import BaseMessage
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FuturesTimeout
+from config import config
+from errors import classify_error
+from rate_limit import rate_limiter
+from deadline import call_timeout
+from typing import Dict, Any, Optional, List
+from collections import deque
+import contextvars
+import hashlib
+import json
+import threading
+import time
+
+
+def prompt_messages(input) -> List[Dict[str, str]]:
+    """Normaliza la entrada de un chat model (str, PromptValue o mensajes) a una lista serializable"""
+    if isinstance(input, str):
+        return [{"type": "human", "content": input}]
+    if isinstance(input, PromptValue):
+        input = input.to_messages()
+    messages = []
+    for message in input:
+        if isinstance(message, BaseMessage):
+            messages.append({"type": message.type, "content": str(message.content)})
+        elif isinstance(message, (tuple, list)) and len(message) == 2:
+            messages.append({"type": str(message[0]), "content": str(message[1])})
+        else:
+            messages.append({"type": "human", "content": str(message)})
+    return messages
+
+
+def estimate_tokens(input) -> int:
+    """Tokens aproximados de una llamada (~4 caracteres por token + salida esperada)"""
+    chars = sum(len(m["content"]) for m in prompt_messages(input))
+    return chars // 4 + config.RATE_LIMIT_OUTPUT_TOKENS
+
+
+def prompt_key(model_id: str, input, kwargs: Dict[str, Any]) -> str:
+    """Clave estable de una llamada: modelo + mensajes exactos + parámetros (ej. stop)"""
+    raw = json.dumps(
+        {"model": model_id, "messages": prompt_messages(input), "kwargs": kwargs},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class HedgeStats:
+    """Latencias observadas y contadores de hedging de un modelo"""
+
+    def __init__(self, window: int = 500):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.requests = 0
+        self.coalesced = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_latency(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def hedge_delay(self) -> float:
+        """Espera antes del request de respaldo: p95 observado (o valor por defecto)"""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < config.HEDGE_MIN_SAMPLES:
+            return config.HEDGE_DEFAULT_DELAY
+        index = int(round(config.HEDGE_PERCENTILE / 100 * (len(samples) - 1)))
+        return max(config.HEDGE_MIN_DELAY, samples[index])
+
+    def try_fire_hedge(self) -> bool:
+        """Respeta la proporción máxima de hedges para no agotar la cuota"""
+        with self._lock:
+            if self.hedges_fired + 1 > max(1, self.requests) * config.HEDGE_MAX_RATIO:
+                return False
+            self.hedges_fired += 1
+            return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "coalesced": self.coalesced,
+                "hedges_fired": self.hedges_fired,
+                "hedges_won": self.hedges_won,
+            }
+
+
+class RequestLayer:
+    """Pool compartido, llamadas en vuelo (single-flight) y estadísticas por modelo"""
+
+    def __init__(self):
+        self.pool = ThreadPoolExecutor(max_workers=config.HEDGE_POOL_SIZE,
+                                       thread_name_prefix="llm-request")
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._stats: Dict[str, HedgeStats] = {}
+        self._stats_lock = threading.Lock()
+
+    def stats_for(self, model_id: str) -> HedgeStats:
+        with self._stats_lock:
+            if model_id not in self._stats:
+                self._stats[model_id] = HedgeStats()
+            return self._stats[model_id]
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        # Cada tarea con su propia copia del contexto (ContextVars del llamador)
+        ctx = contextvars.copy_context()
+        return self.pool.submit(ctx.run, fn, *args, **kwargs)
+
+    def join_or_lead(self, key: str):
+        """Devuelve (future, es_líder). Solo el líder ejecuta la llamada real"""
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+
+    def release(self, key: str):
+        with self._inflight_lock:
+            self._inflight.pop(key, None)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._stats_lock:
+            return {model_id: stats.snapshot() for model_id, stats in self._stats.items()}
+
+
+class HedgedLLM(Runnable):
+    """
+    Envoltura de un chat model para controlar la latencia de cola:
+
+    - Single-flight: prompts idénticos concurrentes comparten una sola llamada.
+    - Hedging: si la llamada supera el p95 observado, se lanza una de
+      respaldo y se usa la que termine primero.
+    - Rate limiting: cada llamada real espera turno y cuota en el limitador
+      del backend; un error de cuota lo pone en enfriamiento.
+    """
+
+    def __init__(self, llm: Runnable, model_id: str, layer: "RequestLayer" = None,
+                 backend: str = None):
+        self.llm = llm
+        self.model_id = model_id
+        self.layer = layer or request_layer
+        self.stats = self.layer.stats_for(model_id)
+        self.limiter = rate_limiter.backend(backend) if backend else None
+
+    def invoke(self, input, config: Optional[RunnableConfig] = None, **kwargs):
+        key = prompt_key(self.model_id, input, kwargs)
+        future, is_leader = self.layer.join_or_lead(key)
+
+        if not is_leader:
+            self.stats.count("coalesced")
+            timeout = call_timeout()
+            try:
+                return future.result(timeout=timeout)
+            except FuturesTimeout:
+                raise TimeoutError(f"Deadline del análisis agotado esperando a {self.model_id}")
+
+        self.stats.count("requests")
+        try:
+            result = self._hedged_invoke(input, config, kwargs)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self.layer.release(key)
+
+    def _timed_invoke(self, input, run_config, kwargs):
+        estimate = 0
+        if self.limiter is not None:
+            estimate = estimate_tokens(input)
+            self.limiter.acquire(estimate)
+
+        # Timeout de la llamada según lo que queda del deadline (no forma parte de la clave)
+        timeout = call_timeout(config.LLM_REQUEST_TIMEOUT)
+        if timeout:
+            kwargs = {**kwargs, "timeout": timeout}
+
+        start = time.perf_counter()
+        try:
+            result = self.llm.invoke(input, run_config, **kwargs)
+        except Exception as e:
+            if self.limiter is not None and classify_error(e) == "quota":
+                self.limiter.penalize()
+            raise
+        self.stats.record_latency(time.perf_counter() - start)
+
+        usage = getattr(result, "usage_metadata", None) or {}
+        if self.limiter is not None and usage.get("total_tokens"):
+            self.limiter.adjust_tokens(usage["total_tokens"] - estimate)
+        return result
+
+    def _hedged_invoke(self, input, run_config, kwargs):
+        # Con deadline activo nunca se espera más de lo que le queda al análisis
+        timeout = call_timeout()
+        until = time.monotonic() + timeout if timeout else None
+
+        if not config.HEDGE_ENABLED:
+            if until is None:
+                return self._timed_invoke(input, run_config, kwargs)
+            return self._result(self.layer.submit(self._timed_invoke, input, run_config, kwargs), until)
+
+        primary = self.layer.submit(self._timed_invoke, input, run_config, kwargs)
+        hedge_delay = self.stats.hedge_delay()
+        try:
+            return primary.result(timeout=min(hedge_delay, self._left(until)) if until else hedge_delay)
+        except FuturesTimeout:
+            pass
+
+        # Si la demora es por cuota, un hedge solo agregaría carga
+        congested = self.limiter is not None and self.limiter.projected_wait() > 0
+        if congested or not self.stats.try_fire_hedge():
+            return self._result(primary, until)
+
+        hedge = self.layer.submit(self._timed_invoke, input, run_config, kwargs)
+        pending = {primary, hedge}
+        last_error = None
+        while pending:
+            done, pending = wait(pending, timeout=self._left(until) if until else None,
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError(f"Deadline del análisis agotado esperando a {self.model_id}")
+            for finished in done:
+                if finished.exception() is None:
+                    if finished is hedge:
+                        self.stats.count("hedges_won")
+                    return finished.result()
+                last_error = finished.exception()
+        raise last_error
+
+    @staticmethod
+    def _left(until: float) -> float:
+        return max(0.0, until - time.monotonic())
+
+    def _result(self, future: Future, until: Optional[float]):
+        """Resultado de la llamada o TimeoutError si se agota el deadline (la llamada se abandona)"""
+        if until is None:
+            return future.result()
+        try:
+            return future.result(timeout=self._left(until))
+        except FuturesTimeout:
+            raise TimeoutError(f"Deadline del análisis agotado esperando a {self.model_id}")
+
+# Instancia global
+request_layer = RequestLayer()
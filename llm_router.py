@@ -0,0 +1,175 @@
+# llm_router.py
+from langchain_google_vertexai import ChatVertexAI
+from langchain_core.runnables import Runnable, RunnableConfig
+from config import config
+from errors import classify_error
+from llm_requests import HedgedLLM
+from llm_cache import CachedLLM
+from typing import Dict, Any, Optional, Tuple
+from collections import deque
+import threading
+import time
+
+# Rutas de trabajo del LLM: qué modelo ("large" o "fast") y con qué parámetros.
+# "cache" habilita la caché de prompts para la ruta (por defecto True)
+ROUTES: Dict[str, Dict[str, Any]] = {
+    # Agente de investigación: el único que necesita el modelo grande. Sin caché:
+    # un reintento tras un error de parseo o de herramienta repetiría la misma respuesta
+    "agent": {"tier": "large", "temperature": 0.1, "max_output_tokens": config.MAX_OUTPUT_TOKENS,
+              "max_retries": 2, "verbose": True, "cache": False},
+    "synthesis": {"tier": "large", "temperature": 0.1, "max_output_tokens": config.MAX_OUTPUT_TOKENS},
+    "planning": {"tier": "large", "temperature": 0.1, "max_output_tokens": 2000},
+    # Tareas de extracción / clasificación / JSON: modelo rápido
+    "tree": {"tier": "fast", "temperature": 0.2, "max_output_tokens": config.MAX_OUTPUT_TOKENS},
+    "classification": {"tier": "fast", "temperature": 0.0, "max_output_tokens": 20},
+    "questionnaire_question": {"tier": "fast", "temperature": 0.3, "max_output_tokens": 2000},
+    "questionnaire_extraction": {"tier": "fast", "temperature": 0.3, "max_output_tokens": 2000},
+}
+
+# Tipos de error que justifican cambiar de modelo
+FALLBACK_ERRORS = ("timeout", "quota")
+
+
+class RouteMetrics:
+    """Latencias y contadores por ruta (thread-safe)"""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, deque] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self.window = window
+
+    def record(self, route: str, latency: float, outcome: str):
+        """outcome: ok, error o fallback"""
+        with self._lock:
+            if outcome != "error":
+                self._latencies.setdefault(route, deque(maxlen=self.window)).append(latency)
+            counters = self._counters.setdefault(route, {"ok": 0, "error": 0, "fallback": 0})
+            counters[outcome] = counters.get(outcome, 0) + 1
+
+    def percentile(self, route: str, pct: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies.get(route, []))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            routes = set(self._latencies) | set(self._counters)
+            counters = {r: dict(self._counters.get(r, {})) for r in routes}
+        result = {}
+        for route in sorted(routes):
+            result[route] = {
+                **counters[route],
+                "p50_s": self.percentile(route, 50),
+                "p95_s": self.percentile(route, 95),
+            }
+        return result
+
+
+class RoutedLLM(Runnable):
+    """
+    LLM de una ruta: invoca el modelo primario y, ante timeout o error de
+    cuota, reintenta con el modelo de respaldo. Registra la latencia por ruta.
+    """
+
+    def __init__(self, route: str, primary: Runnable, fallback: Optional[Runnable],
+                 metrics: RouteMetrics):
+        self.route = route
+        self.primary = primary
+        self.fallback = fallback
+        self.metrics = metrics
+
+    def invoke(self, input, config: Optional[RunnableConfig] = None, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = self.primary.invoke(input, config, **kwargs)
+            self.metrics.record(self.route, time.perf_counter() - start, "ok")
+            return result
+        except Exception as e:
+            if self.fallback is None or classify_error(e) not in FALLBACK_ERRORS:
+                self.metrics.record(self.route, time.perf_counter() - start, "error")
+                raise
+            print(f"Ruta {self.route}: cambiando a modelo de respaldo ({str(e)[:100]})")
+
+        result = self.fallback.invoke(input, config, **kwargs)
+        self.metrics.record(self.route, time.perf_counter() - start, "fallback")
+        return result
+
+    def evict(self, input, **kwargs):
+        """Quita de la caché una respuesta inválida de esta ruta"""
+        for llm in (self.primary, self.fallback):
+            if llm is not None:
+                llm.evict(input, **kwargs)
+
+
+class ModelRouter:
+    """Entrega el LLM adecuado para cada tarea, compartiendo clientes entre rutas"""
+
+    def __init__(self):
+        self.metrics = RouteMetrics()
+        self._clients: Dict[Tuple, HedgedLLM] = {}
+        self._routes: Dict[str, RoutedLLM] = {}
+        self._lock = threading.Lock()
+
+    def model_for(self, route: str) -> str:
+        """Modelo configurado para la ruta (MODEL_ROUTE_<RUTA> tiene prioridad)"""
+        override = config.MODEL_ROUTE_OVERRIDES.get(route)
+        if override:
+            return override
+        tier = ROUTES[route]["tier"]
+        return config.VERTEX_AI_FAST_MODEL if tier == "fast" else config.VERTEX_AI_MODEL
+
+    def fallback_model_for(self, route: str) -> Optional[str]:
+        """Un modelo distinto del primario para los reintentos por timeout/cuota"""
+        primary = self.model_for(route)
+        candidates = [config.VERTEX_AI_FALLBACK_MODEL, config.VERTEX_AI_MODEL, config.VERTEX_AI_FAST_MODEL]
+        for candidate in candidates:
+            if candidate and candidate != primary:
+                return candidate
+        return None
+
+    def get(self, route: str) -> RoutedLLM:
+        """LLM (Runnable) de la ruta indicada"""
+        with self._lock:
+            if route not in self._routes:
+                settings = ROUTES[route]
+                use_cache = settings.get("cache", True) and route not in config.LLM_CACHE_DISABLED_ROUTES
+                primary = self._cached_client(self.model_for(route), settings, use_cache)
+                fallback_model = self.fallback_model_for(route)
+                fallback = self._cached_client(fallback_model, settings, use_cache) if fallback_model else None
+                self._routes[route] = RoutedLLM(route, primary, fallback, self.metrics)
+            return self._routes[route]
+
+    def _model_id(self, model_name: str, settings: Dict[str, Any]) -> str:
+        return f"{model_name}@t{settings['temperature']}/{settings['max_output_tokens']}"
+
+    def _cached_client(self, model_name: str, settings: Dict[str, Any], use_cache: bool) -> CachedLLM:
+        """Caché por ruta sobre el cliente compartido"""
+        return CachedLLM(self._client(model_name, settings), self._model_id(model_name, settings),
+                         enabled=use_cache)
+
+    def _client(self, model_name: str, settings: Dict[str, Any]) -> HedgedLLM:
+        """Cliente compartido, envuelto con hedging y single-flight"""
+        key = (model_name, settings["temperature"], settings["max_output_tokens"],
+               settings.get("max_retries"), settings.get("verbose", False))
+        if key not in self._clients:
+            kwargs = {
+                "model_name": model_name,
+                "project": config.GOOGLE_CLOUD_PROJECT,
+                "location": config.GOOGLE_CLOUD_REGION,
+                "temperature": settings["temperature"],
+                "max_output_tokens": settings["max_output_tokens"],
+            }
+            if settings.get("max_retries") is not None:
+                kwargs["max_retries"] = settings["max_retries"]
+            if settings.get("verbose"):
+                kwargs["verbose"] = True
+            self._clients[key] = HedgedLLM(ChatVertexAI(**kwargs), self._model_id(model_name, settings),
+                                           backend=f"vertex:{model_name}")
+        return self._clients[key]
+
+# Instancia global
+model_router = ModelRouter()
@@ -0,0 +1,280 @@
+# local_index.py
+from config import config
+from typing import Dict, Any, List, Optional
+from collections import Counter
+from pathlib import Path
+import math
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# Palabras vacías del español que no aportan a la búsqueda
+STOPWORDS = {
+    "a", "al", "ante", "con", "cual", "cuales", "cuando", "de", "del", "desde", "donde", "e",
+    "el", "ella", "en", "entre", "es", "esta", "este", "esto", "hay", "la", "las", "le", "lo",
+    "los", "mas", "me", "mi", "mis", "muy", "no", "o", "para", "pero", "por", "que", "se",
+    "ser", "si", "sin", "sobre", "son", "su", "sus", "tu", "tus", "u", "un", "una", "uno",
+    "unos", "unas", "y", "ya", "como", "cuanto", "cuanta", "cuantos", "cuantas", "the", "of",
+    "and", "in", "to", "is", "for",
+}
+
+
+def _stem(term: str) -> str:
+    """Plural simple: "salarios" y "salario" cuentan como el mismo término"""
+    return term[:-1] if len(term) > 4 and term.endswith("s") and not term.isdigit() else term
+
+
+def tokenize(text: str, stem: bool = True) -> List[str]:
+    """Términos normalizados: minúsculas, sin tildes, sin palabras vacías, sin plural"""
+    text = unicodedata.normalize("NFD", text.lower())
+    text = "".join(c for c in text if unicodedata.category(c) != "Mn")
+    terms = [t for t in re.findall(r"\w+", text) if t not in STOPWORDS and (len(t) > 1 or t.isdigit())]
+    return [_stem(t) for t in terms] if stem else terms
+
+
+class LocalIndex:
+    """
+    Índice invertido en SQLite de las fuentes ya descargadas por web_search,
+    con ranking BM25. Opcionalmente mantiene embeddings de Vertex AI y combina
+    ambos rankings (reciprocal rank fusion).
+    """
+
+    def __init__(self, path: Path = None, k1: float = 1.2, b: float = 0.75):
+        self.path = Path(path or config.LOCAL_INDEX_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT UNIQUE NOT NULL,
+                title TEXT NOT NULL,
+                content TEXT NOT NULL,
+                query TEXT,
+                length INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                embedding BLOB
+            );
+            CREATE INDEX IF NOT EXISTS idx_docs_fetched ON docs(fetched_at);
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                doc_id INTEGER NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings(doc_id);
+        """)
+        self._conn.commit()
+        self._embeddings = None
+        self._adds = 0
+
+    def add_search(self, query: str, response: Dict[str, Any]):
+        """Indexa la respuesta de Tavily: el resumen y cada fuente"""
+        documents = []
+        if response.get("answer"):
+            documents.append({
+                "url": f"answer:{' '.join(tokenize(query))}",
+                "title": f"Resumen: {query}",
+                "content": response["answer"],
+            })
+        for result in response.get("results", []):
+            if result.get("url") and result.get("content"):
+                documents.append({
+                    "url": result["url"],
+                    "title": result.get("title") or "Sin título",
+                    "content": result["content"],
+                })
+        if documents:
+            self.add(documents, query)
+
+    def add(self, documents: List[Dict[str, str]], query: str = ""):
+        """Agrega o reemplaza (por URL) documentos con title, content y url"""
+        now = time.time()
+        vectors = self._embed([f"{d['title']}\n{d['content']}" for d in documents])
+        with self._lock:
+            for i, doc in enumerate(documents):
+                terms = Counter(tokenize(f"{doc['title']} {doc['content']}"))
+                if not terms:
+                    continue
+                self._conn.execute("DELETE FROM postings WHERE doc_id IN (SELECT id FROM docs WHERE url = ?)",
+                                   (doc["url"],))
+                self._conn.execute("DELETE FROM docs WHERE url = ?", (doc["url"],))
+                cursor = self._conn.execute(
+                    "INSERT INTO docs (url, title, content, query, length, fetched_at, embedding) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (doc["url"], doc["title"], doc["content"], query, sum(terms.values()), now,
+                     vectors[i] if vectors else None)
+                )
+                self._conn.executemany(
+                    "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                    [(term, cursor.lastrowid, tf) for term, tf in terms.items()]
+                )
+            self._conn.commit()
+
+        self._adds += 1
+        if self._adds % 50 == 0:
+            self.prune()
+
+    def search(self, query: str, limit: int = 5, max_age_hours: float = None) -> List[Dict[str, Any]]:
+        """
+        Documentos más relevantes (BM25, o híbrido si hay embeddings).
+        Cada resultado incluye score y matched: términos de la consulta que contiene.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        max_age = config.LOCAL_INDEX_MAX_AGE_HOURS if max_age_hours is None else max_age_hours
+        min_time = time.time() - max_age * 3600 if max_age > 0 else 0
+
+        placeholders = ", ".join("?" for _ in terms)
+        with self._lock:
+            stats = self._conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM docs WHERE fetched_at >= ?", (min_time,)
+            ).fetchone()
+            total_docs, avg_length = stats[0], stats[1] or 1.0
+            if not total_docs:
+                return []
+            rows = self._conn.execute(
+                f"SELECT p.term, p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.doc_id "
+                f"WHERE p.term IN ({placeholders}) AND d.fetched_at >= ?",
+                (*terms, min_time)
+            ).fetchall()
+
+        doc_freq = Counter(row["term"] for row in rows)
+        scores: Dict[int, float] = {}
+        matched: Dict[int, set] = {}
+        for row in rows:
+            idf = math.log(1 + (total_docs - doc_freq[row["term"]] + 0.5) / (doc_freq[row["term"]] + 0.5))
+            tf = row["tf"]
+            norm = tf + self.k1 * (1 - self.b + self.b * row["length"] / avg_length)
+            scores[row["doc_id"]] = scores.get(row["doc_id"], 0.0) + idf * tf * (self.k1 + 1) / norm
+            matched.setdefault(row["doc_id"], set()).add(row["term"])
+
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        if self._embeddings_enabled():
+            ranked = self._fuse(ranked, self._semantic_ranking(query, min_time))
+
+        top = ranked[:limit]
+        if not top:
+            return []
+        with self._lock:
+            docs = {
+                row["id"]: row for row in self._conn.execute(
+                    f"SELECT id, url, title, content, fetched_at FROM docs WHERE id IN ({', '.join('?' for _ in top)})",
+                    top
+                ).fetchall()
+            }
+        return [
+            {
+                "title": docs[doc_id]["title"],
+                "content": docs[doc_id]["content"],
+                "url": docs[doc_id]["url"],
+                "fetched_at": docs[doc_id]["fetched_at"],
+                "score": round(scores.get(doc_id, 0.0), 3),
+                "matched": sorted(matched.get(doc_id, ())),
+            }
+            for doc_id in top if doc_id in docs
+        ]
+
+    def coverage(self, query: str, results: List[Dict[str, Any]]) -> float:
+        """Fracción de los términos de la consulta presentes en los resultados (recall local)"""
+        terms = set(tokenize(query))
+        if not terms:
+            return 0.0
+        found = set()
+        for result in results:
+            found.update(result["matched"])
+        return len(terms & found) / len(terms)
+
+    def prune(self):
+        """Mantiene como máximo LOCAL_INDEX_MAX_DOCS documentos (los más recientes)"""
+        with self._lock:
+            stale = [row[0] for row in self._conn.execute(
+                "SELECT id FROM docs ORDER BY fetched_at DESC LIMIT -1 OFFSET ?",
+                (config.LOCAL_INDEX_MAX_DOCS,)
+            ).fetchall()]
+            for start in range(0, len(stale), 500):
+                chunk = stale[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                self._conn.execute(f"DELETE FROM postings WHERE doc_id IN ({placeholders})", chunk)
+                self._conn.execute(f"DELETE FROM docs WHERE id IN ({placeholders})", chunk)
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            docs = self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+            terms = self._conn.execute("SELECT COUNT(DISTINCT term) FROM postings").fetchone()[0]
+        return {"docs": docs, "terms": terms, "embeddings": self._embeddings_enabled()}
+
+    # --- Embeddings opcionales (Vertex AI) ---
+
+    def _embeddings_enabled(self) -> bool:
+        return config.LOCAL_INDEX_EMBEDDINGS and self._load_embeddings() is not None
+
+    def _load_embeddings(self):
+        if self._embeddings is None and config.LOCAL_INDEX_EMBEDDINGS:
+            try:
+                from langchain_google_vertexai import VertexAIEmbeddings
+                self._embeddings = VertexAIEmbeddings(
+                    model_name=config.LOCAL_INDEX_EMBEDDING_MODEL,
+                    project=config.GOOGLE_CLOUD_PROJECT,
+                    location=config.GOOGLE_CLOUD_REGION,
+                )
+            except Exception as e:
+                print(f"Índice local sin embeddings: {e}")
+                config.LOCAL_INDEX_EMBEDDINGS = False
+        return self._embeddings
+
+    def _embed(self, texts: List[str]) -> Optional[List[bytes]]:
+        if not self._embeddings_enabled():
+            return None
+        import numpy as np
+        try:
+            vectors = self._embeddings.embed_documents(texts)
+        except Exception as e:
+            print(f"Error generando embeddings: {e}")
+            return None
+        return [self._normalize(np.asarray(v, dtype=np.float32)).tobytes() for v in vectors]
+
+    @staticmethod
+    def _normalize(vector):
+        import numpy as np
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _semantic_ranking(self, query: str, min_time: float, limit: int = 20) -> List[int]:
+        import numpy as np
+        try:
+            query_vector = self._normalize(np.asarray(self._embeddings.embed_query(query), dtype=np.float32))
+        except Exception as e:
+            print(f"Error generando embedding de la consulta: {e}")
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, embedding FROM docs WHERE embedding IS NOT NULL AND fetched_at >= ?", (min_time,)
+            ).fetchall()
+        if not rows:
+            return []
+        matrix = np.frombuffer(b"".join(row["embedding"] for row in rows), dtype=np.float32)
+        matrix = matrix.reshape(len(rows), -1)
+        similarity = matrix @ query_vector
+        order = np.argsort(-similarity)[:limit]
+        return [rows[i]["id"] for i in order]
+
+    @staticmethod
+    def _fuse(*rankings: List[int], k: int = 60) -> List[int]:
+        """Reciprocal rank fusion de varios rankings de IDs"""
+        fused: Dict[int, float] = {}
+        for ranking in rankings:
+            for position, doc_id in enumerate(ranking):
+                fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + position + 1)
+        return sorted(fused, key=fused.get, reverse=True)
+
+# Instancia global
+local_index = LocalIndex()
@@ -134,4 +134,18 @@ class UserProfile(BaseModel):
         return "\n".join(context_parts)
 
 # Necesario para referencias circulares en Pydantic
-DecisionNode.model_rebuild()
\ No newline at end of file
+DecisionNode.model_rebuild()
+
+def result_to_dict(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Resultado de un análisis serializable a JSON (el árbol como dict)"""
+    data = dict(result)
+    if isinstance(data.get("decision_tree"), DecisionNode):
+        data["decision_tree"] = data["decision_tree"].model_dump(mode="json")
+    return data
+
+def result_from_dict(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverso de result_to_dict: reconstruye el DecisionNode"""
+    result = dict(data)
+    if isinstance(result.get("decision_tree"), dict):
+        result["decision_tree"] = DecisionNode.model_validate(result["decision_tree"])
+    return result
\ No newline at end of file
@@ -0,0 +1,147 @@
+# plan_execute.py
+from langchain_core.agents import AgentAction
+from concurrent.futures import ThreadPoolExecutor, wait
+from config import config
+from deadline import active_deadline
+from checkpoint import active_checkpoint
+from typing import List, Tuple, Dict, Any
+import contextvars
+import json
+import re
+
+# Búsquedas por defecto si el plan del LLM no se puede interpretar
+DEFAULT_SEARCHES = {
+    "financiera": ["costos y precios actuales en Perú", "rentabilidad y riesgos en Perú"],
+    "laboral": ["salarios promedio en Perú", "demanda laboral y tendencias en Perú"],
+    "educativa": ["costo de estudios en universidades de Perú", "salario y empleabilidad de egresados en Perú"],
+    "personal": ["costos asociados en Perú", "impacto en calidad de vida"],
+    "tecnológica": ["costos de implementación en Perú", "alternativas y riesgos de obsolescencia"],
+    "general": ["costos y beneficios en Perú", "riesgos y alternativas"],
+}
+
+
+class PlanExecuteEngine:
+    """
+    Motor alternativo al ReAct iterativo: planificar → ejecutar → sintetizar.
+
+    Una sola llamada al LLM produce todas las búsquedas y cálculos, las
+    herramientas se ejecutan en paralelo y la síntesis la hace el agente con
+    los pasos resultantes (mismo formato que intermediate_steps).
+    """
+
+    def __init__(self, llm, tools: List):
+        self.llm = llm
+        self.tools = {tool.name: tool for tool in tools}
+
+    def run(self, question: str, enhanced_question: str, user_context: str,
+            decision_type: str,
+            prior_steps: List[Tuple[AgentAction, str]] = None) -> Dict[str, Any]:
+        """Devuelve un resultado compatible con el del AgentExecutor"""
+        prior_steps = list(prior_steps or [])
+
+        actions = self.plan(question, enhanced_question, user_context, decision_type)
+
+        # Al reanudar no se repiten acciones ya ejecutadas
+        done = {(a.tool, str(a.tool_input)) for a, _ in prior_steps}
+        actions = [a for a in actions if (a.tool, str(a.tool_input)) not in done]
+
+        steps = self.execute(actions)
+
+        checkpoint = active_checkpoint.get()
+        if checkpoint is not None and steps:
+            checkpoint.record(steps)
+
+        return {
+            "output": "",
+            "intermediate_steps": prior_steps + steps,
+            "needs_synthesis": True
+        }
+
+    def plan(self, question: str, enhanced_question: str, user_context: str,
+             decision_type: str) -> List[AgentAction]:
+        """Una llamada al LLM que produce todas las búsquedas y cálculos"""
+        prompt = f"""Planifica la investigación para analizar esta decisión. NO la respondas todavía.
+
+CONTEXTO del usuario (Perú):
+{user_context}
+
+TIPO DE DECISIÓN: {decision_type}
+{enhanced_question}
+
+Devuelve SOLO un JSON con esta estructura:
+{{
+  "searches": ["consulta web concreta 1", "consulta web concreta 2"],
+  "calculations": ["expresión matemática con números del contexto"]
+}}
+
+REGLAS:
+- Entre 3 y {config.PLAN_MAX_SEARCHES} búsquedas, específicas del mercado peruano (costos, salarios, tendencias, riesgos, alternativas)
+- Cálculos SOLO si el contexto ya tiene los números (máximo {config.PLAN_MAX_CALCULATIONS}); si no, lista vacía
+- Solo devuelve el JSON, sin texto adicional"""
+
+        try:
+            response = self.llm.invoke(prompt)
+            content = response.content.strip()
+
+            json_match = re.search(r'\{.*\}', content, re.DOTALL)
+            if json_match:
+                content = json_match.group(0)
+            plan = json.loads(content)
+
+            searches = [str(q) for q in plan.get("searches", []) if str(q).strip()]
+            calculations = [str(c) for c in plan.get("calculations", []) if str(c).strip()]
+        except Exception as e:
+            print(f"Error generando plan: {e}")
+            searches, calculations = [], []
+
+        if not searches:
+            searches = [f"{question} {q}"
+                        for q in DEFAULT_SEARCHES.get(decision_type, DEFAULT_SEARCHES["general"])]
+
+        actions = [
+            AgentAction(tool="local_search", tool_input=q, log=f"Thought: Plan de búsqueda\nAction: local_search\nAction Input: {q}")
+            for q in searches[:config.PLAN_MAX_SEARCHES]
+        ]
+        actions += [
+            AgentAction(tool="calculator", tool_input=c, log=f"Thought: Plan de cálculo\nAction: calculator\nAction Input: {c}")
+            for c in calculations[:config.PLAN_MAX_CALCULATIONS]
+        ]
+        return actions
+
+    def execute(self, actions: List[AgentAction]) -> List[Tuple[AgentAction, str]]:
+        """Ejecuta las acciones en paralelo; respeta el deadline activo si existe"""
+        actions = [a for a in actions if a.tool in self.tools]
+        if not actions:
+            return []
+
+        deadline = active_deadline.get()
+        timeout = max(0.0, deadline.research_remaining()) if deadline is not None else None
+
+        pool = ThreadPoolExecutor(max_workers=config.PLAN_MAX_WORKERS)
+        # Cada herramienta con una copia del contexto (sesión activa para el rate limiting)
+        futures = {
+            pool.submit(contextvars.copy_context().run, self._run_tool, action): action
+            for action in actions
+        }
+        done, not_done = wait(futures, timeout=timeout)
+        # No esperar a las herramientas que no alcanzaron el deadline
+        pool.shutdown(wait=False, cancel_futures=True)
+
+        steps = []
+        for future, action in futures.items():
+            if future in done:
+                observation = future.result()
+                steps.append((action, observation))
+                if deadline is not None:
+                    deadline.note_observation(observation)
+
+        if not_done and deadline is not None:
+            deadline.stop_reason = "presupuesto de tiempo agotado"
+
+        return steps
+
+    def _run_tool(self, action: AgentAction) -> str:
+        try:
+            return str(self.tools[action.tool].invoke(action.tool_input))
+        except Exception as e:
+            return f"Error en {action.tool}: {str(e)}"
@@ -0,0 +1,346 @@
+# profile_extractor.py
+from config import config
+from typing import Dict, Any, List, Optional, Tuple
+import re
+import unicodedata
+
+# Palabras con las que una pregunta pide cada campo (texto sin tildes)
+QUESTION_FIELDS = {
+    "edad": ["edad", "anos tienes", "cuantos anos"],
+    "sexo": ["sexo", "genero"],
+    "estado_civil": ["estado civil", "casad", "solter"],
+    "numero_hijos": ["hijos"],
+    "ocupacion": ["ocupacion", "a que te dedicas", "trabajas", "profesion"],
+    "ingreso_mensual": ["ingreso", "salario", "sueldo", "ganas"],
+    "anos_experiencia": ["experiencia"],
+    "peso": ["peso", "pesas"],
+    "altura": ["altura", "estatura", "mides"],
+    "enfermedades": ["enfermedad", "salud", "condicion medica"],
+    "padres_vivos": ["padres"],
+    "preferencias_alimentacion": ["alimentacion", "dieta", "comida", "comes"],
+}
+
+NUMBER_WORDS = {
+    "un": 1, "uno": 1, "una": 1, "dos": 2, "tres": 3, "cuatro": 4,
+    "cinco": 5, "seis": 6, "siete": 7, "ocho": 8, "nueve": 9, "diez": 10,
+}
+
+# Gazetteers: (patrón, valor normalizado)
+SEXO_TERMS = [
+    (r"masculino|hombre|varon|male", "masculino"),
+    (r"femenino|mujer|female", "femenino"),
+]
+ESTADO_CIVIL_TERMS = [
+    (r"casad[oa]", "casado"),
+    (r"solter[oa]", "soltero"),
+    (r"divorciad[oa]", "divorciado"),
+    (r"separad[oa]", "separado"),
+    (r"viud[oa]", "viudo"),
+    (r"conviviente|convivo|union libre", "conviviente"),
+]
+ENFERMEDAD_TERMS = [
+    (r"diabetes|diabetic[oa]", "diabetes"),
+    (r"hipertension|presion alta|hipertens[oa]", "hipertensión"),
+    (r"asma|asmatic[oa]", "asma"),
+    (r"colesterol alto|hipercolesterolemia", "colesterol alto"),
+    (r"gastritis", "gastritis"),
+    (r"hipotiroidismo", "hipotiroidismo"),
+    (r"obesidad", "obesidad"),
+    (r"ansiedad", "ansiedad"),
+    (r"depresion", "depresión"),
+    (r"artritis", "artritis"),
+    (r"migrana", "migraña"),
+]
+ALIMENTACION_TERMS = [
+    (r"vegetarian[oa]", "vegetariano"),
+    (r"vegan[oa]", "vegano"),
+    (r"sin gluten|celiac[oa]", "sin gluten"),
+    (r"sin lactosa|intolerante a la lactosa", "sin lactosa"),
+    (r"keto|cetogenica", "keto"),
+    (r"como de todo|omnivor[oa]", "omnívoro"),
+]
+OCUPACION_TERMS = [
+    (r"ingenier[oa](?: de [a-z]+| en [a-z]+| [a-z]+)?", None),
+    (r"desarrollador(?:a)?|programador(?:a)?", None),
+    (r"docente|profesor(?:a)?|maestr[oa]", None),
+    (r"medic[oa]|doctor(?:a)?|enfermer[oa]", None),
+    (r"abogad[oa]|contador(?:a)?|administrador(?:a)?|arquitect[oa]", None),
+    (r"analista(?: de [a-z]+)?|consultor(?:a)?|disenador(?:a)?", None),
+    (r"estudiante|independiente|emprendedor(?:a)?|comerciante|jubilad[oa]|desemplead[oa]", None),
+]
+
+STOPWORDS = set("""
+a al ambos aprox aproximadamente actualmente como con de del el ella ellos en es
+esta estoy gano ganar hola la las los mas me mensual mensuales mes mi mis mucho o pen
+pero pues s se ser si sin soles soy su sus tengo un una unos y ya yo kg cm m
+metros metro kilos kilo mide mido peso pesa
+""".split())
+
+# Palabras que cambian el sentido de un dato reconocido ("no estoy casado",
+# "10 mil al año", "entre 3000 y 5000"): si quedan sin explicar, decide el LLM
+NEGATION_WORDS = {"no", "nunca", "jamas", "tampoco", "ni"}
+PERIOD_WORDS = {
+    "ano", "anos", "anual", "anuales", "anualmente", "semana", "semanas", "semanal",
+    "semanales", "dia", "dias", "diario", "diaria", "hora", "horas", "quincena", "quincenal",
+}
+RANGE_WORDS = {"entre", "hasta", "depende", "variable", "varia"}
+MODIFIER_WORDS = NEGATION_WORDS | PERIOD_WORDS | RANGE_WORDS
+
+AFFIRMATIVE_RE = re.compile(r"^(si|sí|ambos|los dos|ambos viven|si, ambos|si ambos)\b")
+NEGATIVE_RE = re.compile(r"^(no|ninguno|ninguna|ya no|fallecieron|ambos fallecieron)\b")
+
+
+def normalize(text: str) -> str:
+    """Minúsculas y sin tildes, para patrones y gazetteers"""
+    text = unicodedata.normalize("NFD", text.lower())
+    return "".join(c for c in text if unicodedata.category(c) != "Mn").strip()
+
+
+def parse_amount(raw: str) -> Optional[float]:
+    """'13,000' / '13.000' / '4500.50' / '5 mil' / '5k' → float"""
+    raw = raw.strip().lower()
+    multiplier = 1
+    if raw.endswith("k"):
+        raw, multiplier = raw[:-1], 1000
+    if re.fullmatch(r"\d{1,3}([.,]\d{3})+", raw):
+        raw = re.sub(r"[.,]", "", raw)
+    else:
+        raw = raw.replace(",", ".")
+    try:
+        return float(raw) * multiplier
+    except ValueError:
+        return None
+
+
+def _compile_terms(terms: List[Tuple[str, Optional[str]]]) -> List[Tuple[re.Pattern, Optional[str]]]:
+    return [(re.compile(rf"\b(?:{pattern})\b"), value) for pattern, value in terms]
+
+
+class ExtractionResult:
+    """Campos extraídos con su confianza y si hace falta escalar al LLM"""
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.confidence: Dict[str, float] = {}
+        self.expected: List[str] = []
+        self.residual_words: List[str] = []
+        self.modifiers: List[str] = []
+
+    def add(self, field: str, value: Any, confidence: float):
+        if confidence > self.confidence.get(field, 0.0):
+            self.fields[field] = value
+            self.confidence[field] = confidence
+
+    @property
+    def score(self) -> float:
+        """Confianza global: la menor entre los campos esperados y los extraídos"""
+        if not self.fields:
+            return 0.0
+        scores = [self.confidence.get(f, 0.0) for f in self.expected] + list(self.confidence.values())
+        return min(scores)
+
+    @property
+    def needs_llm(self) -> bool:
+        return (
+            bool(self.modifiers)
+            or self.score < config.EXTRACTOR_MIN_CONFIDENCE
+            or len(self.residual_words) > config.EXTRACTOR_MAX_RESIDUAL_WORDS
+        )
+
+
+class ProfileExtractor:
+    """
+    Extractor rápido de campos del perfil con patrones precompilados y
+    gazetteers. Cada campo lleva una confianza; si es baja, el llamador
+    escala al LLM.
+    """
+
+    AGE_RE = re.compile(r"\b(\d{1,3})\s*anos?\b(?!\s+de\s+(?:experiencia|casad|trabajo))")
+    EXPERIENCE_RE = re.compile(r"\b(\d{1,2})\s*anos?\s+de\s+(?:experiencia|trabajo)\b")
+    CHILDREN_RE = re.compile(r"\b(\d{1,2}|" + "|".join(NUMBER_WORDS) + r")\s+(?:hij[oa]s?|nin[oa]s)\b")
+    NO_CHILDREN_RE = re.compile(r"\b(?:no tengo hijos|sin hijos|ningun hijo|no tengo ninos|no,? no tengo)\b")
+    CURRENCY_RE = re.compile(r"(?:s/\.?|pen|soles?)\s*(\d[\d.,]*k?)|(\d[\d.,]*k?)\s*(mil\b)?\s*(?:soles|pen|s/)")
+    THOUSANDS_RE = re.compile(r"\b(\d+(?:[.,]\d+)?)\s*mil\b")
+    AMOUNT_RANGE_RE = re.compile(r"\b(\d[\d.,]*k?)\s*(mil\b)?\s*(?:-|a|y|o|hasta)\s*(?:s/\.?\s*)?(\d[\d.,]*k?)\s*(mil\b)?")
+    WEIGHT_RE = re.compile(r"\b(\d{2,3}(?:[.,]\d+)?)\s*(?:kg|kilos?|kilogramos?)\b")
+    HEIGHT_M_RE = re.compile(r"\b([12][.,]\d{1,2})\s*(?:m|mts?|metros?)?\b")
+    HEIGHT_CM_RE = re.compile(r"\b(1\d{2}|2[0-2]\d)\s*(?:cm|centimetros?)\b")
+    BARE_NUMBER_RE = re.compile(r"^\D*?(\d[\d.,]*k?)\D*$")
+    SEX_LETTER_RE = re.compile(r"(?:^|[\s,;/])([mf])(?:$|[\s,;./])")
+    OCCUPATION_PREFIX_RE = re.compile(r"\b(?:soy|trabajo como|me desempeno como|me dedico a(?: la| el)?)\s+([a-z ]{3,40}?)(?:[,.;]|\by\b|$)")
+
+    def __init__(self):
+        self.question_fields = {
+            field: re.compile(r"\b(?:" + "|".join(words) + ")")
+            for field, words in QUESTION_FIELDS.items()
+        }
+        self.sexo_terms = _compile_terms(SEXO_TERMS)
+        self.estado_civil_terms = _compile_terms(ESTADO_CIVIL_TERMS)
+        self.enfermedad_terms = _compile_terms(ENFERMEDAD_TERMS)
+        self.alimentacion_terms = _compile_terms(ALIMENTACION_TERMS)
+        self.ocupacion_terms = _compile_terms(OCUPACION_TERMS)
+
+    def expected_fields(self, question: str) -> List[str]:
+        question = normalize(question)
+        return [field for field, pattern in self.question_fields.items() if pattern.search(question)]
+
+    def extract(self, question: str, answer: str) -> ExtractionResult:
+        result = ExtractionResult()
+        result.expected = self.expected_fields(question)
+        text = normalize(answer)
+        spans: List[Tuple[int, int]] = []
+
+        def found(match: re.Match, group: int = 0):
+            spans.append(match.span(group))
+
+        expected = set(result.expected)
+
+        # Edad y años de experiencia
+        for m in self.EXPERIENCE_RE.finditer(text):
+            result.add("anos_experiencia", int(m.group(1)), 0.95)
+            found(m)
+        for m in self.AGE_RE.finditer(text):
+            age = int(m.group(1))
+            # Sin pregunta de edad, solo "tengo N años" (no "desde hace N años")
+            if 10 <= age <= 110 and ("edad" in expected or text[:m.start()].endswith("tengo ")):
+                result.add("edad", age, 0.95 if "edad" in expected else 0.85)
+                found(m)
+
+        # Hijos
+        m = self.NO_CHILDREN_RE.search(text)
+        if m:
+            result.add("numero_hijos", 0, 0.95)
+            found(m)
+        for m in self.CHILDREN_RE.finditer(text):
+            raw = m.group(1)
+            result.add("numero_hijos", int(raw) if raw.isdigit() else NUMBER_WORDS[raw], 0.95)
+            found(m)
+
+        # Ingresos (con moneda o "mil")
+        amounts, confidence = [], 0.95 if "ingreso_mensual" in expected else 0.85
+        for m in self.CURRENCY_RE.finditer(text):
+            raw = m.group(1) or m.group(2)
+            amount = parse_amount(raw)
+            if amount is not None:
+                amounts.append(amount * 1000 if m.group(3) else amount)
+                found(m)
+        if "ingreso_mensual" in expected and not amounts:
+            for m in self.THOUSANDS_RE.finditer(text):
+                amounts.append(parse_amount(m.group(1)) * 1000)
+                found(m)
+            confidence = 0.9
+        if amounts:
+            # "3000-5000 soles", "entre 3 y 5 mil": el "mil" final vale para ambos extremos
+            for m in self.AMOUNT_RANGE_RE.finditer(text):
+                low, high = parse_amount(m.group(1)), parse_amount(m.group(3))
+                if low is not None and high is not None:
+                    thousands = 1000 if m.group(4) else 1
+                    amounts += [low * (1000 if m.group(2) else thousands), high * thousands]
+                    found(m)
+            amounts = sorted(set(amounts))
+            if len(amounts) > 1:
+                # Rango o varios montos: punto medio con confianza baja, lo resuelve el LLM
+                result.add("ingreso_mensual", (amounts[0] + amounts[-1]) / 2, 0.5)
+            else:
+                result.add("ingreso_mensual", amounts[0], confidence)
+
+        # Peso y altura
+        for m in self.WEIGHT_RE.finditer(text):
+            result.add("peso", parse_amount(m.group(1)), 0.95)
+            found(m)
+        for m in self.HEIGHT_CM_RE.finditer(text):
+            result.add("altura", float(m.group(1)), 0.95)
+            found(m)
+        if "altura" not in result.fields:
+            for m in self.HEIGHT_M_RE.finditer(text):
+                # "1.75" solo es altura si se pregunta por ella o lleva unidad
+                has_unit = m.group(0).strip() != m.group(1)
+                if "altura" in expected or has_unit:
+                    result.add("altura", round(parse_amount(m.group(1)) * 100, 1), 0.9 if has_unit else 0.85)
+                    found(m)
+
+        # Gazetteers
+        for pattern, value in self.sexo_terms:
+            for m in pattern.finditer(text):
+                result.add("sexo", value, 0.95)
+                found(m)
+        if "sexo" in expected and "sexo" not in result.fields:
+            # "M"/"F" solo como token aislado, nunca dentro de una palabra
+            m = self.SEX_LETTER_RE.search(text)
+            if m:
+                result.add("sexo", "masculino" if m.group(1) == "m" else "femenino", 0.8)
+                found(m, 1)
+
+        for pattern, value in self.estado_civil_terms:
+            for m in pattern.finditer(text):
+                result.add("estado_civil", value, 0.95)
+                found(m)
+
+        diseases = []
+        for pattern, value in self.enfermedad_terms:
+            for m in pattern.finditer(text):
+                diseases.append(value)
+                found(m)
+        if diseases:
+            result.add("enfermedades", sorted(set(diseases)), 0.9)
+        elif "enfermedades" in expected and NEGATIVE_RE.search(text):
+            result.add("enfermedades", [], 0.9)
+            found(NEGATIVE_RE.search(text))
+
+        foods = []
+        for pattern, value in self.alimentacion_terms:
+            for m in pattern.finditer(text):
+                foods.append(value)
+                found(m)
+        if foods:
+            result.add("preferencias_alimentacion", sorted(set(foods)), 0.9)
+
+        for pattern, _ in self.ocupacion_terms:
+            m = pattern.search(text)
+            if m:
+                result.add("ocupacion", m.group(0), 0.85 if "ocupacion" in expected else 0.8)
+                found(m)
+                break
+        if "ocupacion" in expected and "ocupacion" not in result.fields:
+            m = self.OCCUPATION_PREFIX_RE.search(text)
+            if m:
+                # Ocupación fuera del gazetteer: dato útil pero de baja confianza
+                result.add("ocupacion", m.group(1).strip(), 0.6)
+                found(m)
+
+        # Padres vivos (respuesta sí/no a la pregunta)
+        if "padres_vivos" in expected:
+            if AFFIRMATIVE_RE.search(text):
+                result.add("padres_vivos", True, 0.85)
+                found(AFFIRMATIVE_RE.search(text))
+            elif NEGATIVE_RE.search(text):
+                result.add("padres_vivos", False, 0.85)
+                found(NEGATIVE_RE.search(text))
+
+        # Número suelto como respuesta directa a una pregunta de un solo campo
+        numeric = [f for f in result.expected if f in ("edad", "numero_hijos", "ingreso_mensual", "peso")]
+        if len(numeric) == 1 and numeric[0] not in result.fields:
+            m = self.BARE_NUMBER_RE.match(text)
+            value = parse_amount(m.group(1)) if m else None
+            if value is not None:
+                field = numeric[0]
+                if field in ("edad", "numero_hijos"):
+                    value = int(value)
+                result.add(field, value, 0.85)
+                found(m, 1)
+
+        result.residual_words = self._residual(text, spans)
+        result.modifiers = [w for w in result.residual_words if w in MODIFIER_WORDS]
+        return result
+
+    def _residual(self, text: str, spans: List[Tuple[int, int]]) -> List[str]:
+        """Palabras no explicadas por ningún patrón (posible contexto adicional)"""
+        chars = list(text)
+        for start, end in spans:
+            for i in range(start, end):
+                chars[i] = " "
+        words = re.findall(r"[a-zñ]+", "".join(chars))
+        return [w for w in words if w not in STOPWORDS and len(w) > 1]
+
+# Instancia global
+profile_extractor = ProfileExtractor()
@@ -1,27 +1,35 @@
 # questionnaire.py
-from langchain_google_vertexai import ChatVertexAI
 from langchain.prompts import ChatPromptTemplate
 from config import config
+from llm_router import model_router
 from storage import storage
 from models import UserProfile
-from typing import Optional, Dict, Any
+from profile_extractor import profile_extractor, ExtractionResult
+from typing import Optional, Dict, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor, Future
+import copy
+
+# Campos cuya respuesta cambia la siguiente pregunta (casado → hijos, hijos → edades,
+# ocupación → ingresos): con ellos no sirve una pregunta generada antes de la respuesta
+FOLLOW_UP_FIELDS = {"estado_civil", "numero_hijos", "ocupacion", "enfermedades"}
 
 class AdaptiveQuestionnaire:
     """Cuestionario adaptativo que usa el LLM para hacer preguntas inteligentes"""
     
     def __init__(self):
-        self.llm = ChatVertexAI(
-            model_name=config.VERTEX_AI_MODEL,
-            project=config.GOOGLE_CLOUD_PROJECT,
-            location=config.GOOGLE_CLOUD_REGION,
-            temperature=0.3,  # Más bajo para preguntas consistentes
-            max_output_tokens=2000
-        )
+        # Modelo rápido: preguntas y extracción no necesitan el modelo grande
+        self.llm = model_router.get("questionnaire_question")
+        self.extraction_llm = model_router.get("questionnaire_extraction")
         self.profile_data: Dict[str, Any] = {}
+        # Extracción y generación de preguntas en paralelo / especulativas
+        self.pool = ThreadPoolExecutor(max_workers=config.QUESTIONNAIRE_WORKERS,
+                                       thread_name_prefix="questionnaire")
     
-    def generate_next_question(self, previous_answers: Dict[str, Any]) -> Optional[str]:
+    def generate_next_question(self, previous_answers: Dict[str, Any],
+                               pending_question: Optional[str] = None) -> Optional[str]:
         """
-        Genera la siguiente pregunta basada en respuestas previas
+        Genera la siguiente pregunta basada en respuestas previas.
+        pending_question: pregunta ya mostrada y aún sin respuesta (modo especulativo)
         """
         prompt = ChatPromptTemplate.from_messages([
             ("system", """Eres un asistente que hace un cuestionario para conocer al usuario.
@@ -83,6 +91,12 @@ class AdaptiveQuestionnaire:
             
             answered = "\n".join(answered_parts)
         
+        if pending_question:
+            answered += (
+                "\n\nPREGUNTA EN CURSO (el usuario aún no responde): " + pending_question +
+                "\nNO la repitas: genera la pregunta que seguiría después de ella."
+            )
+        
         try:
             response = self.llm.invoke(prompt.format(answered_fields=answered))
             question = response.content.strip()
@@ -96,10 +110,82 @@ class AdaptiveQuestionnaire:
             print(f"Error generando pregunta: {e}")
             return None
     
-    def process_answer(self, question: str, answer: str, previous_answers: Dict[str, Any]) -> Dict[str, Any]:
+    def prefetch_next_question(self, previous_answers: Dict[str, Any],
+                               pending_question: str) -> Optional[Future]:
+        """Genera en segundo plano la pregunta candidata mientras el usuario escribe"""
+        if not config.QUESTIONNAIRE_PREFETCH:
+            return None
+        return self.pool.submit(self.generate_next_question,
+                                copy.deepcopy(previous_answers), pending_question)
+    
+    def answer_and_advance(self, question: str, answer: str, previous_answers: Dict[str, Any],
+                           speculative: Optional[Future] = None) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        Procesa la respuesta y obtiene la siguiente pregunta.
+
+        Si el extractor rápido resuelve la respuesta, se extrae en el acto y la
+        pregunta especulativa se usa solo si la respuesta no trae datos que pidan
+        seguimiento; si no, recién ahí se genera la pregunta con la respuesta.
+        Si la respuesta necesita el LLM, extracción y generación corren a la vez.
+        """
+        provisional = copy.deepcopy(previous_answers)
+        provisional.setdefault("respuestas_originales", []).append({
+            "pregunta": question,
+            "respuesta": answer
+        })
+
+        fast = profile_extractor.extract(question, answer)
+        if config.EXTRACTOR_FAST_PATH and not fast.needs_llm:
+            answers = self.process_answer(question, answer, copy.deepcopy(previous_answers), fast)
+            if speculative is not None and speculative.done():
+                candidate = self._speculative_result(speculative)
+                if self._is_valid_candidate(candidate, question, previous_answers, answers):
+                    return answers, candidate
+            return answers, self.generate_next_question(provisional)
+
+        extraction = self.pool.submit(self.process_answer, question, answer,
+                                      copy.deepcopy(previous_answers), fast)
+        generation = self.pool.submit(self.generate_next_question, provisional)
+        return extraction.result(), generation.result()
+
+    def _speculative_result(self, speculative: Future) -> Optional[str]:
+        try:
+            return speculative.result()
+        except Exception as e:
+            print(f"Error en pregunta especulativa: {e}")
+            return None
+    
+    def _is_valid_candidate(self, candidate: Optional[str], question: str,
+                            previous_answers: Dict[str, Any], answers: Dict[str, Any]) -> bool:
+        """
+        La candidata no repite la pregunta, no pide campos que la respuesta ya
+        trajo y la respuesta no abre un tema de seguimiento (FOLLOW_UP_FIELDS)
+        """
+        if not candidate or candidate.strip() == question.strip():
+            return False
+        new_fields = {key for key in answers if key not in previous_answers}
+        if new_fields & FOLLOW_UP_FIELDS:
+            return False
+        return not new_fields.intersection(profile_extractor.expected_fields(candidate))
+    
+    def process_answer(self, question: str, answer: str, previous_answers: Dict[str, Any],
+                       fast: Optional[ExtractionResult] = None) -> Dict[str, Any]:
         """
-        Procesa la respuesta y extrae campos estructurados usando el LLM
+        Procesa la respuesta y extrae campos estructurados.
+        Primero con el extractor rápido (fast, si ya se calculó); solo si la
+        confianza es baja, con el LLM
         """
+        fast = fast or profile_extractor.extract(question, answer)
+        if config.EXTRACTOR_FAST_PATH and not fast.needs_llm:
+            previous_answers.update(fast.fields)
+            if "respuestas_originales" not in previous_answers:
+                previous_answers["respuestas_originales"] = []
+            previous_answers["respuestas_originales"].append({
+                "pregunta": question,
+                "respuesta": answer
+            })
+            return previous_answers
+        
         prompt = ChatPromptTemplate.from_messages([
             ("system", """Eres un asistente que procesa respuestas de un cuestionario.
     Dada una pregunta y respuesta, extrae los campos estructurados relevantes.
@@ -145,7 +231,7 @@ class AdaptiveQuestionnaire:
         ])
         
         try:
-            response = self.llm.invoke(prompt.format(question=question, answer=answer))
+            response = self.extraction_llm.invoke(prompt.format(question=question, answer=answer))
             extracted = response.content.strip()
             
             # Debug: mostrar respuesta del LLM
@@ -194,6 +280,8 @@ class AdaptiveQuestionnaire:
         except json.JSONDecodeError as e:
             print(f"Error parseando JSON: {e}")
             print(f"Contenido recibido: {extracted}")
+            # No reutilizar desde caché una respuesta que no se pudo parsear
+            self.extraction_llm.evict(prompt.format(question=question, answer=answer))
             # Si falla JSON, intentar extraer manualmente
             manual_extract = self._manual_extract(question, answer)
             if manual_extract:
@@ -226,49 +314,9 @@ class AdaptiveQuestionnaire:
     
     def _manual_extract(self, question: str, answer: str) -> Dict[str, Any]:
         """
-        Extracción manual como fallback si el LLM falla
+        Extracción sin LLM como fallback si el LLM falla (aunque la confianza sea baja)
         """
-        import re
-        result = {}
-        
-        answer_lower = answer.lower()
-        question_lower = question.lower()
-        
-        # Edad
-        if "edad" in question_lower:
-            edad_match = re.search(r'\b(\d{1,3})\b', answer)
-            if edad_match:
-                result["edad"] = int(edad_match.group(1))
-        
-        # Sexo
-        if "sexo" in question_lower or "género" in question_lower:
-            if any(word in answer_lower for word in ["masculino", "hombre", "m", "male"]):
-                result["sexo"] = "masculino"
-            elif any(word in answer_lower for word in ["femenino", "mujer", "f", "female"]):
-                result["sexo"] = "femenino"
-        
-        # Estado civil
-        if "estado civil" in question_lower or "casado" in question_lower:
-            if any(word in answer_lower for word in ["casado", "casada"]):
-                result["estado_civil"] = "casado"
-            elif any(word in answer_lower for word in ["soltero", "soltera"]):
-                result["estado_civil"] = "soltero"
-            elif any(word in answer_lower for word in ["divorciado", "divorciada"]):
-                result["estado_civil"] = "divorciado"
-        
-        # Hijos
-        if "hijos" in question_lower or "niños" in question_lower:
-            hijos_match = re.search(r'\b(\d+)\b', answer)
-            if hijos_match:
-                result["numero_hijos"] = int(hijos_match.group(1))
-        
-        # Ingresos
-        if "ingreso" in question_lower or "salario" in question_lower or "sueldo" in question_lower:
-            ingreso_match = re.search(r'\b(\d+[\d,]*\.?\d*)\b', answer.replace(',', ''))
-            if ingreso_match:
-                result["ingreso_mensual"] = float(ingreso_match.group(1).replace(',', ''))
-        
-        return result
+        return profile_extractor.extract(question, answer).fields
     
     def save_to_profile(self, answers: Dict[str, Any]):
         """
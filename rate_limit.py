@@ -0,0 +1,326 @@
+# rate_limit.py
+from contextvars import ContextVar
+from contextlib import contextmanager
+from config import config
+from typing import Dict, Any, Optional
+from collections import OrderedDict, deque
+import math
+import threading
+import time
+
+# Sesión que origina las llamadas (para repartir turnos entre sesiones)
+active_session: ContextVar[str] = ContextVar("active_session", default="default")
+
+
+class RateLimitTimeout(RuntimeError):
+    """La cuota del backend no alcanzó dentro del tiempo máximo de espera"""
+
+    def __init__(self, backend: str, waited: float):
+        super().__init__(f"Rate limit de {backend}: sin cuota disponible tras esperar {waited:.1f}s")
+        self.backend = backend
+        self.waited = waited
+
+
+class AdmissionRejected(RuntimeError):
+    """El sistema está saturado: la espera estimada supera el máximo"""
+
+    def __init__(self, projected_wait: float):
+        super().__init__(f"Sistema saturado: espera estimada de {projected_wait:.0f}s")
+        self.projected_wait = projected_wait
+
+
+class TokenBucket:
+    """Token bucket con recarga continua; per_minute <= 0 significa sin límite"""
+
+    def __init__(self, per_minute: float, burst: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def _refill(self, now: float):
+        if not self.unlimited:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """Segundos hasta poder consumir `amount` (acotado a la capacidad)"""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        deficit = min(amount, self.capacity) - self.level
+        return max(0.0, deficit / self.rate)
+
+    def consume(self, amount: float, now: float):
+        if not self.unlimited:
+            self._refill(now)
+            # Puede quedar negativo (ajuste con el uso real): se paga con espera
+            self.level -= amount
+
+    def drain(self, now: float):
+        if not self.unlimited:
+            self._refill(now)
+            self.level = min(self.level, 0.0)
+
+
+class FairQueue:
+    """Turnos round-robin entre sesiones: una sesión con muchas llamadas no acapara el backend"""
+
+    def __init__(self):
+        self._sessions: "OrderedDict[str, deque]" = OrderedDict()
+
+    def push(self, session: str, ticket: object):
+        self._sessions.setdefault(session, deque()).append(ticket)
+
+    def head(self) -> Optional[object]:
+        for tickets in self._sessions.values():
+            return tickets[0]
+        return None
+
+    def pop_head(self):
+        """Saca el ticket atendido y pasa su sesión al final de la ronda"""
+        session, tickets = next(iter(self._sessions.items()))
+        tickets.popleft()
+        del self._sessions[session]
+        if tickets:
+            self._sessions[session] = tickets
+
+    def remove(self, session: str, ticket: object) -> bool:
+        tickets = self._sessions.get(session)
+        if not tickets or ticket not in tickets:
+            return False
+        tickets.remove(ticket)
+        if not tickets:
+            del self._sessions[session]
+        return True
+
+    def __len__(self) -> int:
+        return sum(len(tickets) for tickets in self._sessions.values())
+
+    def sessions(self) -> int:
+        return len(self._sessions)
+
+
+class BackendLimiter:
+    """
+    Límite de un backend (requests/min y tokens/min) con cola justa entre
+    sesiones. Tras un error de cuota el backend entra en enfriamiento y las
+    llamadas esperan en lugar de fallar.
+    """
+
+    def __init__(self, name: str, requests_per_minute: float, tokens_per_minute: float = 0):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.queue = FairQueue()
+        self.cooldown_until = 0.0
+        self._queued_tokens = 0.0
+        self._cond = threading.Condition()
+        self._waits = deque(maxlen=200)
+        self.counters = {"granted": 0, "timeouts": 0, "quota_errors": 0}
+
+    def _time_until(self, tokens: float, now: float) -> float:
+        return max(self.cooldown_until - now,
+                   self.requests.time_until(1, now),
+                   self.tokens.time_until(tokens, now))
+
+    def acquire(self, tokens: float = 0, timeout: float = None) -> float:
+        """Espera turno y cuota; devuelve los segundos esperados"""
+        timeout = config.RATE_LIMIT_MAX_WAIT if timeout is None else timeout
+        session = active_session.get()
+        ticket = object()
+        start = time.monotonic()
+        with self._cond:
+            self.queue.push(session, ticket)
+            self._queued_tokens += tokens
+            try:
+                while True:
+                    now = time.monotonic()
+                    # Solo el primero de la ronda puede consumir; el resto espera su turno
+                    wait = self._time_until(tokens, now) if self.queue.head() is ticket else None
+                    if wait is not None and wait <= 0:
+                        self.requests.consume(1, now)
+                        self.tokens.consume(tokens, now)
+                        self.queue.pop_head()
+                        self._queued_tokens -= tokens
+                        self.counters["granted"] += 1
+                        waited = now - start
+                        self._waits.append(waited)
+                        self._cond.notify_all()
+                        return waited
+
+                    remaining = timeout - (now - start)
+                    if remaining <= 0:
+                        self.counters["timeouts"] += 1
+                        raise RateLimitTimeout(self.name, now - start)
+                    self._cond.wait(min(wait if wait is not None else remaining, remaining))
+            except BaseException:
+                if self.queue.remove(session, ticket):
+                    self._queued_tokens -= tokens
+                    self._cond.notify_all()
+                raise
+
+    def adjust_tokens(self, delta: float):
+        """Corrige la estimación de tokens con el uso real de la respuesta"""
+        if delta:
+            with self._cond:
+                self.tokens.consume(delta, time.monotonic())
+
+    def penalize(self, seconds: float = None):
+        """Error de cuota del backend: enfriamiento y bucket de requests vacío"""
+        now = time.monotonic()
+        with self._cond:
+            self.counters["quota_errors"] += 1
+            self.cooldown_until = max(self.cooldown_until, now + (seconds or config.RATE_LIMIT_QUOTA_COOLDOWN))
+            self.requests.drain(now)
+            self._cond.notify_all()
+
+    def retry_after(self) -> float:
+        """Segundos que faltan del enfriamiento por cuota"""
+        return max(0.0, self.cooldown_until - time.monotonic())
+
+    def projected_wait(self, tokens: float = 0) -> float:
+        """Espera estimada para una llamada nueva que se encole ahora"""
+        now = time.monotonic()
+        with self._cond:
+            ahead = len(self.queue)
+            wait = max(self.cooldown_until - now, 0.0)
+            if not self.requests.unlimited:
+                self.requests._refill(now)
+                wait = max(wait, (ahead + 1 - self.requests.level) / self.requests.rate)
+            if not self.tokens.unlimited:
+                self.tokens._refill(now)
+                wait = max(wait, (self._queued_tokens + tokens - self.tokens.level) / self.tokens.rate)
+            return max(0.0, wait)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            waits = sorted(self._waits)
+            snapshot = {
+                "queue_depth": len(self.queue),
+                "waiting_sessions": self.queue.sessions(),
+                **self.counters,
+                "avg_wait_s": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "p95_wait_s": round(waits[int(round(0.95 * (len(waits) - 1)))], 3) if waits else 0.0,
+                "cooldown_s": round(max(0.0, self.cooldown_until - time.monotonic()), 1),
+            }
+        snapshot["projected_wait_s"] = round(self.projected_wait(), 1)
+        return snapshot
+
+
+class RateLimiter:
+    """Limitadores por backend ("vertex:<modelo>", "tavily"), creados al primer uso"""
+
+    def __init__(self):
+        self._backends: Dict[str, BackendLimiter] = {}
+        self._lock = threading.Lock()
+
+    def backend(self, name: str) -> BackendLimiter:
+        with self._lock:
+            if name not in self._backends:
+                kind = name.split(":", 1)[0]
+                rpm, tpm = config.RATE_LIMITS.get(kind, (0, 0))
+                self._backends[name] = BackendLimiter(name, rpm, tpm)
+            return self._backends[name]
+
+    def retry_after(self) -> float:
+        """Enfriamiento por cuota más largo entre los backends"""
+        with self._lock:
+            backends = list(self._backends.values())
+        return max((b.retry_after() for b in backends), default=0.0)
+
+    def projected_wait(self) -> float:
+        """Espera del backend más congestionado"""
+        with self._lock:
+            backends = list(self._backends.values())
+        return max((b.projected_wait() for b in backends), default=0.0)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            backends = dict(self._backends)
+        return {name: backend.snapshot() for name, backend in sorted(backends.items())}
+
+
+class AdmissionController:
+    """
+    Control de admisión de análisis completos: hasta ADMISSION_MAX_CONCURRENT
+    en curso, el resto espera en cola; si la espera estimada (cola de análisis
+    + congestión de los backends) supera ADMISSION_MAX_WAIT se rechaza, y
+    también si la espera real en cola llega a ese máximo.
+    """
+
+    def __init__(self, limiter: RateLimiter, max_concurrent: int = None, max_wait: float = None):
+        self.limiter = limiter
+        self.max_concurrent = max_concurrent or config.ADMISSION_MAX_CONCURRENT
+        self.max_wait = config.ADMISSION_MAX_WAIT if max_wait is None else max_wait
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._durations = deque([config.ADMISSION_DEFAULT_SECONDS], maxlen=50)
+        self._waits = deque(maxlen=200)
+        self._cond = threading.Condition()
+
+    def _avg_duration(self) -> float:
+        return sum(self._durations) / len(self._durations)
+
+    def projected_wait(self) -> float:
+        with self._cond:
+            free = self.max_concurrent - self.active
+            rounds = 0 if free > self.waiting else math.ceil((self.waiting - free + 1) / self.max_concurrent)
+            slot_wait = rounds * self._avg_duration()
+        return slot_wait + self.limiter.projected_wait()
+
+    @contextmanager
+    def admit(self):
+        """Reserva un lugar para un análisis (espera en cola o AdmissionRejected)"""
+        projected = self.projected_wait()
+        if projected > self.max_wait:
+            with self._cond:
+                self.rejected += 1
+            raise AdmissionRejected(projected)
+
+        start = time.monotonic()
+        with self._cond:
+            self.waiting += 1
+            try:
+                # Un análisis colgado no debe retener la cola más allá de max_wait
+                while self.active >= self.max_concurrent:
+                    remaining = self.max_wait - (time.monotonic() - start)
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise AdmissionRejected(time.monotonic() - start)
+                    self._cond.wait(timeout=remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            self._waits.append(time.monotonic() - start)
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.active -= 1
+                self._durations.append(time.monotonic() - started)
+                self._cond.notify()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            waits = list(self._waits)
+            snapshot = {
+                "active": self.active,
+                "queued": self.waiting,
+                "rejected": self.rejected,
+                "avg_wait_s": round(sum(waits) / len(waits), 2) if waits else 0.0,
+                "avg_duration_s": round(self._avg_duration(), 1),
+            }
+        snapshot["projected_wait_s"] = round(self.projected_wait(), 1)
+        return snapshot
+
+# Instancias globales
+rate_limiter = RateLimiter()
+admission = AdmissionController(rate_limiter)
@@ -0,0 +1,131 @@
+# result_store.py
+from config import config
+from models import result_to_dict, result_from_dict
+from cache_backend import cache_backend
+from typing import Dict, Any, Optional
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import json
+import threading
+import time
+import zlib
+
+
+class ResultHandle:
+    """Referencia liviana a un resultado: lo único que guarda st.session_state"""
+
+    __slots__ = ("key", "question", "decision_type")
+
+    def __init__(self, key: str, question: str = "", decision_type: Optional[str] = None):
+        self.key = key
+        self.question = question
+        self.decision_type = decision_type
+
+    def __repr__(self) -> str:
+        return f"ResultHandle({self.key[:12]}, {self.question!r})"
+
+
+class ResultStore:
+    """
+    Resultados de análisis comprimidos (zlib) en disco, direccionados por el
+    hash de su contenido, con un LRU en memoria de los más usados.
+
+    Las sesiones solo guardan el ResultHandle; el análisis y el árbol se
+    materializan al mostrarlos y se comparten entre sesiones.
+    """
+
+    def __init__(self, directory: Path = None, lru_size: int = None):
+        self.dir = Path(directory or config.RESULT_STORE_DIR)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.lru_size = lru_size or config.RESULT_LRU_SIZE
+        self._lru: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    def _path(self, key: str) -> Path:
+        return self.dir / key[:2] / f"{key}.json.z"
+
+    def put(self, result: Optional[Dict[str, Any]]) -> Optional[ResultHandle]:
+        """Guarda el resultado (si no existía) y devuelve su handle"""
+        if not result:
+            return None
+        raw = json.dumps(result_to_dict(result), ensure_ascii=False, sort_keys=True,
+                         default=str).encode("utf-8")
+        key = hashlib.sha256(raw).hexdigest()
+        path = self._path(key)
+
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            try:
+                tmp_path.write_bytes(zlib.compress(raw, config.RESULT_COMPRESSION_LEVEL))
+                tmp_path.replace(path)
+            except OSError as e:
+                print(f"Error guardando resultado: {e}")
+        else:
+            path.touch()
+
+        # Otras instancias (sin este disco) también pueden materializarlo
+        if cache_backend is not None and cache_backend.shared:
+            cache_backend.set("results", key, json.loads(raw), ttl=config.RESULT_TTL_HOURS * 3600)
+
+        self._remember(key, result)
+
+        self._puts += 1
+        if self._puts % 50 == 0:
+            self.prune()
+
+        return ResultHandle(key, result.get("question", "")[:200], result.get("decision_type"))
+
+    def get(self, handle: Optional[ResultHandle]) -> Optional[Dict[str, Any]]:
+        """Materializa el resultado (LRU en memoria o disco); None si ya no existe"""
+        if handle is None:
+            return None
+        with self._lock:
+            if handle.key in self._lru:
+                self._lru.move_to_end(handle.key)
+                return self._lru[handle.key]
+
+        try:
+            raw = zlib.decompress(self._path(handle.key).read_bytes())
+            result = result_from_dict(json.loads(raw))
+        except (OSError, zlib.error, ValueError) as e:
+            shared = None
+            if cache_backend is not None and cache_backend.shared:
+                shared = cache_backend.get("results", handle.key)
+            if shared is None:
+                print(f"Resultado no disponible ({handle.key[:12]}): {e}")
+                return None
+            result = result_from_dict(shared)
+
+        self._remember(handle.key, result)
+        return result
+
+    def _remember(self, key: str, result: Dict[str, Any]):
+        with self._lock:
+            self._lru[key] = result
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def prune(self):
+        """Borra del disco los resultados no usados en RESULT_TTL_HOURS"""
+        limit = time.time() - config.RESULT_TTL_HOURS * 3600
+        for path in self.dir.glob("*/*.json.z"):
+            try:
+                if path.stat().st_mtime < limit:
+                    path.unlink()
+            except OSError:
+                continue
+
+    def stats(self) -> Dict[str, Any]:
+        files = list(self.dir.glob("*/*.json.z"))
+        return {
+            "hot": len(self._lru),
+            "stored": len(files),
+            "size_kb": round(sum(f.stat().st_size for f in files) / 1024, 1),
+        }
+
+# Instancia global
+result_store = ResultStore()
@@ -0,0 +1,200 @@
+# safe_math.py
+from config import config
+from functools import lru_cache
+from typing import Callable, List, Tuple, Union
+import ast
+import math
+import operator
+
+Number = Union[int, float]
+
+
+class CalculationError(ValueError):
+    """Expresión no permitida o fuera de los límites de cálculo"""
+
+
+class _Budget:
+    """Contador de pasos de una evaluación"""
+
+    __slots__ = ("steps", "max_steps")
+
+    def __init__(self, max_steps: int):
+        self.steps = 0
+        self.max_steps = max_steps
+
+    def tick(self, n: int = 1):
+        self.steps += n
+        if self.steps > self.max_steps:
+            raise CalculationError(f"la expresión supera {self.max_steps} pasos de evaluación")
+
+
+def _check(value):
+    """Rechaza resultados que no son números reales o están fuera de la magnitud permitida"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise CalculationError(f"el resultado no es un número real: {type(value).__name__}")
+    if abs(value) > config.CALC_MAX_MAGNITUDE:
+        raise CalculationError("resultado demasiado grande")
+    return value
+
+
+def _round(value: Number, ndigits: Number = None) -> Number:
+    """round con decimales acotados (round(5, -10**7) tarda segundos)"""
+    if ndigits is None:
+        return round(value)
+    if isinstance(ndigits, bool) or not isinstance(ndigits, int) or abs(ndigits) > 15:
+        raise CalculationError("round admite entre -15 y 15 decimales")
+    return round(value, ndigits)
+
+
+def _power(base: Number, exponent: Number) -> Number:
+    """Potencia acotada: se valida antes de calcular (9**9**9 nunca se evalúa)"""
+    if abs(exponent) > config.CALC_MAX_EXPONENT:
+        raise CalculationError(f"exponente mayor a {config.CALC_MAX_EXPONENT}")
+    if abs(base) > 1 and exponent > 0:
+        if exponent * math.log10(abs(base)) > math.log10(config.CALC_MAX_MAGNITUDE):
+            raise CalculationError("resultado demasiado grande")
+    return base ** exponent
+
+
+BIN_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: _power,
+    # El LLM suele escribir ^ como potencia, nunca como XOR
+    ast.BitXor: _power,
+}
+
+UNARY_OPS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+FUNCTIONS = {
+    'abs': abs, 'round': _round, 'min': min, 'max': max,
+    'sum': sum, 'pow': _power, 'sqrt': math.sqrt,
+    'sin': math.sin, 'cos': math.cos, 'tan': math.tan,
+    'log': math.log, 'exp': math.exp,
+}
+
+CONSTANTS = {'pi': math.pi, 'e': math.e}
+
+# Únicas funciones que reciben una secuencia como argumento directo
+SEQUENCE_FUNCTIONS = {'min', 'max', 'sum'}
+
+Compiled = Callable[[_Budget], Number]
+
+
+def _compile(node: ast.AST) -> Compiled:
+    """Convierte un nodo (de la lista blanca) en una función evaluable"""
+    if isinstance(node, ast.Expression):
+        return _compile(node.body)
+
+    if isinstance(node, ast.Constant):
+        value = node.value
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise CalculationError(f"valor no permitido: {value!r}")
+        _check(value)
+        return lambda budget: value
+
+    if isinstance(node, ast.Name):
+        if node.id not in CONSTANTS:
+            raise CalculationError(f"nombre no permitido: {node.id}")
+        value = CONSTANTS[node.id]
+        return lambda budget: value
+
+    if isinstance(node, ast.BinOp):
+        op = BIN_OPS.get(type(node.op))
+        if op is None:
+            raise CalculationError(f"operador no permitido: {type(node.op).__name__}")
+        left, right = _compile(node.left), _compile(node.right)
+
+        def binop(budget: _Budget):
+            budget.tick()
+            # Solo números: [0] * 10**9 construiría una lista enorme
+            return _check(op(_check(left(budget)), _check(right(budget))))
+        return binop
+
+    if isinstance(node, ast.UnaryOp):
+        op = UNARY_OPS.get(type(node.op))
+        if op is None:
+            raise CalculationError(f"operador no permitido: {type(node.op).__name__}")
+        operand = _compile(node.operand)
+
+        def unaryop(budget: _Budget):
+            budget.tick()
+            return op(_check(operand(budget)))
+        return unaryop
+
+    if isinstance(node, (ast.Tuple, ast.List)):
+        items = [_compile(item) for item in node.elts]
+
+        def sequence(budget: _Budget):
+            budget.tick(len(items))
+            return [_check(item(budget)) for item in items]
+        return sequence
+
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise CalculationError("función no permitida")
+        if node.keywords:
+            raise CalculationError("argumentos con nombre no permitidos")
+        func = FUNCTIONS[node.func.id]
+        accepts_sequence = node.func.id in SEQUENCE_FUNCTIONS
+        args = [_compile(arg) for arg in node.args]
+
+        def call(budget: _Budget):
+            budget.tick()
+            values = [arg(budget) for arg in args]
+            for value in values:
+                if not (accepts_sequence and isinstance(value, list)):
+                    _check(value)
+            return _check(func(*values))
+        return call
+
+    raise CalculationError(f"expresión no permitida: {type(node).__name__}")
+
+
+@lru_cache(maxsize=config.CALC_CACHE_SIZE)
+def compile_expression(expression: str) -> Compiled:
+    """Parsea y valida una expresión una sola vez (cacheada por texto)"""
+    if len(expression) > config.CALC_MAX_LENGTH:
+        raise CalculationError(f"expresión de más de {config.CALC_MAX_LENGTH} caracteres")
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except (SyntaxError, RecursionError, MemoryError) as e:
+        raise CalculationError(f"sintaxis inválida: {e}")
+    return _compile(tree)
+
+
+def evaluate(expression: str) -> Number:
+    """Evalúa una expresión con límites de exponente, magnitud y pasos"""
+    compiled = compile_expression(expression.strip())
+    try:
+        return _check(compiled(_Budget(config.CALC_MAX_STEPS)))
+    except (OverflowError, RecursionError) as e:
+        raise CalculationError(f"desbordamiento: {e}")
+
+
+def split_expressions(text: str) -> List[str]:
+    """Modo batch: varias expresiones separadas por ';' o saltos de línea"""
+    parts = [p.strip() for p in text.replace("\n", ";").split(";")]
+    return [p for p in parts if p]
+
+
+def evaluate_batch(text: str) -> List[Tuple[str, Union[Number, str]]]:
+    """Evalúa cada expresión por separado; un error no detiene a las demás"""
+    expressions = split_expressions(text)
+    if len(expressions) > config.CALC_MAX_BATCH:
+        raise CalculationError(f"máximo {config.CALC_MAX_BATCH} expresiones por llamada")
+
+    results = []
+    for expression in expressions:
+        try:
+            results.append((expression, evaluate(expression)))
+        except (CalculationError, ArithmeticError, ValueError, TypeError) as e:
+            results.append((expression, f"Error: {e}"))
+    return results
@@ -0,0 +1,170 @@
+# scratchpad.py
+from langchain_core.agents import AgentAction
+from config import config
+from typing import List, Tuple, Dict, Any, Optional, Set
+import re
+
+# Bloques de fuente tal como los formatean web_search y local_search:
+# "1. Título\n   contenido...\n   URL: https://..."
+SOURCE_BLOCK_RE = re.compile(r'^\s*(\d+)\.\s+(.*?)\n(.*?)^\s*URL:\s*(\S*)\s*$',
+                             re.MULTILINE | re.DOTALL)
+SUMMARY_RE = re.compile(r'RESUMEN:\s*(.*?)(?:\n\s*FUENTES:|\Z)', re.DOTALL)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación rápida de tokens (~4 caracteres por token)"""
+    return len(text) // 4 + 1
+
+
+class ScratchpadManager:
+    """
+    Construye el agent_scratchpad respetando un presupuesto de tokens.
+
+    Los pasos recientes se muestran completos; los antiguos se compactan
+    (resumen recortado + títulos de fuentes) y las fuentes repetidas se
+    citan una sola vez. Los pasos originales no se modifican, así que
+    intermediate_steps sigue teniendo las observaciones completas.
+    """
+
+    def __init__(self, max_tokens: int = None, keep_recent: int = None,
+                 compact_chars: int = None):
+        self.max_tokens = max_tokens or config.SCRATCHPAD_MAX_TOKENS
+        self.keep_recent = keep_recent if keep_recent is not None else config.SCRATCHPAD_KEEP_RECENT
+        self.compact_chars = compact_chars or config.SCRATCHPAD_COMPACT_CHARS
+
+    def format(self, steps: List[Tuple[AgentAction, str]],
+               observation_prefix: str = "Observation: ",
+               llm_prefix: str = "Thought: ") -> str:
+        """Equivalente a format_log_to_str, pero acotado por presupuesto"""
+        if not steps:
+            return ""
+
+        rendered = self._render_steps(steps)
+
+        # Niveles de compactación progresiva para los pasos antiguos:
+        # 0 = deduplicado, 1 = compacto, 2 = mínimo, 3 = omitido
+        total = len(steps)
+        first_recent = max(0, total - self.keep_recent)
+        levels = [0 if i >= first_recent else 1 for i in range(total)]
+
+        text = self._join(steps, rendered, levels, observation_prefix, llm_prefix)
+        for level in (2, 3):
+            if estimate_tokens(text) <= self.max_tokens:
+                break
+            # Degradar desde el paso más antiguo hasta caber en el presupuesto
+            for i in range(first_recent):
+                levels[i] = level
+                text = self._join(steps, rendered, levels, observation_prefix, llm_prefix)
+                if estimate_tokens(text) <= self.max_tokens:
+                    break
+
+        # Último recurso: compactar también los recientes salvo el último
+        if estimate_tokens(text) > self.max_tokens:
+            for i in range(first_recent, total - 1):
+                levels[i] = 1
+            text = self._join(steps, rendered, levels, observation_prefix, llm_prefix)
+
+        return text
+
+    def _join(self, steps, rendered, levels, observation_prefix, llm_prefix) -> str:
+        thoughts = ""
+        for (action, _), versions, level in zip(steps, rendered, levels):
+            thoughts += action.log
+            thoughts += f"\n{observation_prefix}{versions[level]}\n{llm_prefix}"
+        return thoughts
+
+    def _render_steps(self, steps: List[Tuple[AgentAction, str]]) -> List[List[str]]:
+        """Devuelve, por cada paso, sus versiones [deduplicada, compacta, mínima, omitida]"""
+        seen_urls: Set[str] = set()
+        rendered = []
+
+        for action, observation in steps:
+            obs_str = str(observation)
+            tool = getattr(action, 'tool', '')
+
+            if tool in ('web_search', 'local_search'):
+                parsed = self._parse_search(obs_str)
+            else:
+                parsed = None
+
+            if parsed:
+                full, compact = self._render_search(parsed, seen_urls)
+            elif tool in ('web_search', 'local_search'):
+                # Formato no reconocido (error, salida antigua en caché): tal cual, acotada al presupuesto
+                full = self._truncate(obs_str, self.max_tokens * 4)
+                compact = self._truncate(obs_str, self.compact_chars)
+            else:
+                full = obs_str
+                compact = self._truncate(obs_str, self.compact_chars)
+
+            minimal = self._truncate(compact.split("\n")[0], 150)
+            omitted = "[observación anterior omitida por espacio]"
+            rendered.append([full, compact, minimal, omitted])
+
+        return rendered
+
+    def _parse_search(self, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Separa el encabezado, el resumen y las fuentes de una observación de
+        búsqueda; None si no se reconoce ninguna fuente (se usa tal cual)
+        """
+        if "FUENTES:" not in text:
+            return None
+
+        summary_match = SUMMARY_RE.search(text)
+        header = re.split(r'RESUMEN:|FUENTES:', text, maxsplit=1)[0].strip()
+        sources_text = text.split("FUENTES:", 1)[1]
+        sources = []
+        for match in SOURCE_BLOCK_RE.finditer(sources_text):
+            sources.append({
+                'title': match.group(2).strip(),
+                'content': match.group(3).rstrip(),
+                'url': match.group(4).strip()
+            })
+        if not sources:
+            return None
+
+        return {
+            'header': header,
+            'summary': summary_match.group(1).strip() if summary_match else "",
+            'sources': sources
+        }
+
+    def _render_search(self, parsed: Dict[str, Any], seen_urls: Set[str]) -> Tuple[str, str]:
+        """Genera la versión completa (sin fuentes repetidas) y la compacta"""
+        full_parts = []
+        compact_parts = []
+
+        # Encabezado (ej. "(Índice local: fuentes descargadas hace N h)")
+        if parsed['header']:
+            full_parts.append(parsed['header'])
+            compact_parts.append(parsed['header'])
+
+        if parsed['summary']:
+            full_parts.append(f"RESUMEN: {parsed['summary']}\n")
+            compact_parts.append(f"RESUMEN: {self._truncate(parsed['summary'], self.compact_chars)}")
+
+        full_parts.append("FUENTES:")
+        compact_titles = []
+        for i, source in enumerate(parsed['sources'], 1):
+            url = source['url']
+            if url and url in seen_urls:
+                full_parts.append(f"\n{i}. {source['title']} (fuente ya citada)")
+                continue
+            if url:
+                seen_urls.add(url)
+            full_parts.append(f"\n{i}. {source['title']}")
+            full_parts.append(source['content'])
+            full_parts.append(f"   URL: {url}")
+            compact_titles.append(source['title'])
+
+        if compact_titles:
+            compact_parts.append("FUENTES: " + "; ".join(compact_titles))
+
+        return "\n".join(full_parts), "\n".join(compact_parts)
+
+    def _truncate(self, text: str, max_chars: int) -> str:
+        text = text.strip()
+        if len(text) <= max_chars:
+            return text
+        return text[:max_chars].rstrip() + "..."
@@ -0,0 +1,272 @@
+# search_cache.py
+from config import config
+from local_index import tokenize
+from rate_limit import rate_limiter, active_session
+from cache_backend import cache_backend
+from typing import Dict, Any, List, Optional, Callable
+from pathlib import Path
+import sqlite3
+import threading
+import time
+
+
+def query_key(query: str) -> str:
+    """Misma consulta con otras palabras vacías, tildes o plurales → misma clave"""
+    return " ".join(tokenize(query)) or query.strip().lower()
+
+
+class SearchCache:
+    """
+    Caché con TTL de las salidas de web_search y frecuencia de cada consulta
+    (contador con decaimiento exponencial, vida media WARMER_HALF_LIFE_HOURS).
+    """
+
+    def __init__(self, path: Path = None, ttl_hours: float = None):
+        self.path = Path(path or config.SEARCH_CACHE_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = (ttl_hours or config.SEARCH_CACHE_TTL_HOURS) * 3600
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS search_cache (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                output TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS search_queries (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                score REAL NOT NULL,
+                last_seen REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_search_queries_score ON search_queries(score DESC);
+        """)
+        self._conn.commit()
+        self.counters = {"hits": 0, "misses": 0, "refreshed": 0}
+        # key → (consulta, conteo, puntaje, última vez) aún no escritos
+        self._pending: Dict[str, tuple] = {}
+
+    def _decay(self, elapsed: float) -> float:
+        return 0.5 ** (elapsed / (config.WARMER_HALF_LIFE_HOURS * 3600))
+
+    def record(self, query: str):
+        """
+        Cuenta una consulta de usuario (para decidir qué calentar). Se acumula en
+        memoria y se escribe en SQLite con flush() (warmer o cada 200 consultas distintas).
+        """
+        key, now = query_key(query), time.time()
+        with self._lock:
+            pending = self._pending.get(key)
+            score = 1.0 + (pending[2] * self._decay(now - pending[3]) if pending else 0.0)
+            self._pending[key] = (query, (pending[1] if pending else 0) + 1, score, now)
+            should_flush = len(self._pending) >= 200
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """Escribe los contadores pendientes en una sola transacción"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            for key, (query, count, score, last_seen) in pending.items():
+                row = self._conn.execute("SELECT score, last_seen FROM search_queries WHERE key = ?",
+                                         (key,)).fetchone()
+                if row:
+                    score += row["score"] * self._decay(last_seen - row["last_seen"])
+                self._conn.execute(
+                    "INSERT INTO search_queries (key, query, count, score, last_seen) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET query = excluded.query, count = count + excluded.count, "
+                    "score = excluded.score, last_seen = excluded.last_seen",
+                    (key, query, count, score, last_seen)
+                )
+            self._conn.commit()
+
+    def get(self, query: str) -> Optional[str]:
+        """Salida vigente de la búsqueda (y registra la consulta)"""
+        self.record(query)
+        # Un backend en memoria no aporta nada delante de SQLite: solo se consulta si es compartido
+        if cache_backend is not None and cache_backend.shared:
+            shared = cache_backend.get("search", query_key(query))
+            if shared is not None and shared["expires_at"] > time.time():
+                with self._lock:
+                    self.counters["hits"] += 1
+                return shared["output"]
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT output FROM search_cache WHERE key = ? AND expires_at > ?",
+                (query_key(query), time.time())
+            ).fetchone()
+            self.counters["hits" if row else "misses"] += 1
+        return row["output"] if row else None
+
+    def put(self, query: str, output: str, fetched_at: float = None, share: bool = True):
+        now = fetched_at or time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, query, output, fetched_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (query_key(query), query, output, now, now + self.ttl)
+            )
+            self._conn.commit()
+        if share and cache_backend is not None and cache_backend.shared:
+            cache_backend.set("search", query_key(query),
+                              {"query": query, "output": output, "fetched_at": now,
+                               "expires_at": now + self.ttl}, ttl=self.ttl)
+
+    def adopt_shared(self, rows: List[Dict[str, Any]], horizon: float) -> List[Dict[str, Any]]:
+        """
+        Copia a la caché local las búsquedas que otra instancia ya refrescó
+        (una sola lectura multi-clave) y devuelve las que siguen pendientes.
+        """
+        if cache_backend is None or not cache_backend.shared or not rows:
+            return rows
+        shared = cache_backend.mget("search", [row["key"] for row in rows])
+        pending = []
+        for row in rows:
+            entry = shared.get(row["key"])
+            if entry and entry["expires_at"] > horizon:
+                self.put(entry["query"], entry["output"], entry["fetched_at"], share=False)
+            else:
+                pending.append(row)
+        return pending
+
+    def invalidate(self):
+        """Descarta todas las salidas guardadas (ej. tras cambiar su formato), también en otras instancias"""
+        with self._lock:
+            self._conn.execute("DELETE FROM search_cache")
+            self._conn.commit()
+        if cache_backend is not None:
+            cache_backend.invalidate("search")
+
+    def hot(self, limit: int) -> List[Dict[str, Any]]:
+        """Consultas más frecuentes (puntaje con decaimiento al momento actual)"""
+        self.flush()
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT q.key, q.query, q.count, q.score, q.last_seen, c.expires_at "
+                "FROM search_queries q LEFT JOIN search_cache c ON c.key = q.key "
+                "ORDER BY q.score DESC LIMIT ?",
+                (limit * 4,)
+            ).fetchall()
+        hot = [dict(row, score=row["score"] * self._decay(now - row["last_seen"])) for row in rows]
+        hot.sort(key=lambda row: row["score"], reverse=True)
+        return hot[:limit]
+
+    def due_for_refresh(self, limit: int = None) -> List[Dict[str, Any]]:
+        """Top-N consultas cuya entrada no existe o vence dentro de WARMER_REFRESH_AHEAD_HOURS"""
+        horizon = time.time() + config.WARMER_REFRESH_AHEAD_HOURS * 3600
+        return [
+            row for row in self.hot(limit or config.WARMER_TOP_N)
+            if row["score"] >= config.WARMER_MIN_SCORE
+            and (row["expires_at"] is None or row["expires_at"] <= horizon)
+        ]
+
+    def prune(self):
+        """Borra entradas vencidas y consultas que ya no son frecuentes"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM search_cache WHERE expires_at <= ?", (now,))
+            self._conn.execute(
+                "DELETE FROM search_queries WHERE last_seen < ?",
+                (now - 10 * config.WARMER_HALF_LIFE_HOURS * 3600,)
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute(
+                "SELECT COUNT(*) FROM search_cache WHERE expires_at > ?", (time.time(),)
+            ).fetchone()[0]
+            counters = dict(self.counters)
+        total = counters["hits"] + counters["misses"]
+        return {**counters, "entries": entries,
+                "hit_rate": round(counters["hits"] / total, 3) if total else None}
+
+
+class CacheWarmer:
+    """
+    Hilo que refresca las búsquedas más frecuentes antes de que venzan.
+
+    Cada WARMER_INTERVAL_SECONDS toma las consultas que vencen pronto y las
+    repite espaciadas (máximo WARMER_MAX_RPM por minuto), como una sesión
+    más en la cola justa de Tavily; si el backend está congestionado el ciclo
+    se corta para no competir con los usuarios. refresh devuelve cuántos
+    datos del fact store se agregaron/renovaron, o None si la búsqueda falló.
+    """
+
+    def __init__(self, cache: SearchCache, refresh: Callable[[str], Optional[Dict[str, int]]]):
+        self.cache = cache
+        self.refresh = refresh
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_cycle: Dict[str, Any] = {}
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="search-cache-warmer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        active_session.set("warmer")
+        while not self._stop.wait(config.WARMER_INTERVAL_SECONDS):
+            try:
+                self.run_cycle()
+            except Exception as e:
+                print(f"Error en el warmer de búsquedas: {e}")
+
+    def run_cycle(self) -> Dict[str, Any]:
+        """Un ciclo de refresco; devuelve qué se refrescó"""
+        started = time.time()
+        due = self.cache.due_for_refresh()
+        # Con caché compartida, lo que ya refrescó otra instancia no se repite
+        due = self.cache.adopt_shared(due, time.time() + config.WARMER_REFRESH_AHEAD_HOURS * 3600)
+        due = due[:config.WARMER_MAX_PER_CYCLE]
+        spacing = 60.0 / max(config.WARMER_MAX_RPM, 0.1)
+        tavily = rate_limiter.backend("tavily")
+        refreshed, failed, skipped = 0, 0, 0
+        facts = {"added": 0, "refreshed": 0}
+
+        for i, row in enumerate(due):
+            if i and self._stop.wait(spacing):
+                break
+            # Hora punta: la cuota es para los usuarios
+            if tavily.projected_wait() > 0:
+                skipped = len(due) - i
+                break
+            outcome = self.refresh(row["query"])
+            if outcome is None:
+                failed += 1
+            else:
+                refreshed += 1
+                for name in facts:
+                    facts[name] += outcome.get(name, 0)
+
+        self.cache.counters["refreshed"] += refreshed
+        self.cache.prune()
+        self.last_cycle = {
+            "at": started, "due": len(due), "refreshed": refreshed,
+            "failed": failed, "skipped": skipped, "facts": facts,
+            "seconds": round(time.time() - started, 1),
+        }
+        return self.last_cycle
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "last_cycle": self.last_cycle,
+            "hot": [(row["query"], round(row["score"], 2)) for row in self.cache.hot(5)],
+        }
+
+# Instancia global
+search_cache = SearchCache()
@@ -0,0 +1,119 @@
+# search_profiles.py
+from contextvars import ContextVar
+from config import config
+from fact_store import detect_metric
+from local_index import tokenize
+from typing import Dict, Any, Optional
+from collections import deque
+import re
+import threading
+import unicodedata
+
+# Perfiles de búsqueda de Tavily. credits: costo por búsqueda (basic = 1, advanced = 2)
+PROFILES: Dict[str, Dict[str, Any]] = {
+    # Dato puntual (salario, precio, tasa): la respuesta de Tavily y pocas fuentes bastan
+    "fact": {"search_depth": "basic", "max_results": 3, "include_answer": True, "credits": 1},
+    # Investigación (comparaciones, tendencias, riesgos): fuentes más completas
+    "research": {"search_depth": "advanced", "max_results": 5, "include_answer": True, "credits": 2},
+}
+
+# Señales de que la consulta necesita investigación y no un dato puntual (texto sin tildes)
+COMPLEX_RE = re.compile(
+    r"\b(?:vs|versus|compar\w*|ventaja\w*|desventaja\w*|pros|contras|riesgo\w*|tendencia\w*|"
+    r"impacto\w*|futuro|proyeccion\w*|perspectiva\w*|alternativa\w*|mejor\w*|conviene|"
+    r"por que|como afecta|experiencia\w*|opinion\w*|regulacion\w*|requisito\w*)\b"
+)
+
+
+def choose_profile(query: str) -> str:
+    """fact para búsquedas de un dato concreto y corto; research para el resto"""
+    if not config.SEARCH_ADAPTIVE:
+        return "research"
+    text = unicodedata.normalize("NFD", query.lower())
+    text = "".join(c for c in text if unicodedata.category(c) != "Mn")
+    if COMPLEX_RE.search(text):
+        return "research"
+    if detect_metric(query) in ("salario", "precio", "alquiler", "tasa", "inflacion") \
+            and len(tokenize(query)) <= config.SEARCH_FACT_MAX_TERMS:
+        return "fact"
+    return "research"
+
+
+class SearchBudget:
+    """
+    Presupuesto de búsquedas en internet de un análisis (todos sus intentos).
+    Las respuestas desde caché o índice local no lo consumen.
+    """
+
+    def __init__(self, max_searches: int = None, max_credits: int = None):
+        self.max_searches = max_searches if max_searches is not None else config.SEARCH_BUDGET_MAX_SEARCHES
+        self.max_credits = max_credits if max_credits is not None else config.SEARCH_BUDGET_MAX_CREDITS
+        self.searches = 0
+        self.credits = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, profile: str) -> Optional[str]:
+        """
+        Reserva una búsqueda y devuelve el perfil a usar (se degrada a fact si
+        no alcanzan los créditos) o None si el presupuesto se agotó.
+        """
+        with self._lock:
+            if self.searches >= self.max_searches:
+                return None
+            remaining = self.max_credits - self.credits
+            if PROFILES[profile]["credits"] > remaining:
+                profile = "fact"
+            if PROFILES[profile]["credits"] > remaining:
+                return None
+            self.searches += 1
+            self.credits += PROFILES[profile]["credits"]
+            return profile
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"searches": self.searches, "max_searches": self.max_searches,
+                    "credits": self.credits, "max_credits": self.max_credits}
+
+
+class SearchStats:
+    """Latencia, créditos y errores por perfil de búsqueda"""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, deque] = {name: deque(maxlen=window) for name in PROFILES}
+        self._counters = {name: {"searches": 0, "credits": 0, "errors": 0} for name in PROFILES}
+        self.budget_exhausted = 0
+
+    def record(self, profile: str, latency: float, ok: bool = True):
+        with self._lock:
+            counters = self._counters[profile]
+            counters["searches"] += 1
+            counters["credits"] += PROFILES[profile]["credits"]
+            if ok:
+                self._latencies[profile].append(latency)
+            else:
+                counters["errors"] += 1
+
+    def count_exhausted(self):
+        with self._lock:
+            self.budget_exhausted += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            result = {}
+            for name in PROFILES:
+                samples = sorted(self._latencies[name])
+                result[name] = {
+                    **self._counters[name],
+                    "avg_s": round(sum(samples) / len(samples), 2) if samples else None,
+                    "p95_s": round(samples[int(round(0.95 * (len(samples) - 1)))], 2) if samples else None,
+                }
+            result["budget_exhausted"] = self.budget_exhausted
+            return result
+
+
+# Presupuesto de búsquedas del análisis en curso (None = sin límite, ej. el warmer)
+active_search_budget: ContextVar[Optional[SearchBudget]] = ContextVar("active_search_budget", default=None)
+
+# Instancia global
+search_stats = SearchStats()
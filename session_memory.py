@@ -0,0 +1,76 @@
+# session_memory.py
+from config import config
+from typing import Dict, Any, List
+from collections import deque
+import re
+import threading
+
+
+def summarize(text: str, max_chars: int) -> str:
+    """Resumen extractivo: primeras oraciones del texto hasta max_chars"""
+    text = re.sub(r"[*#>`_]+", "", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    sentences = re.split(r"(?<=[.!?])\s+", text)
+    summary = ""
+    for sentence in sentences:
+        if len(summary) + len(sentence) + 1 > max_chars:
+            break
+        summary = f"{summary} {sentence}".strip()
+    return summary or text[:max_chars]
+
+
+class SessionMemory:
+    """
+    Memoria de una sesión con tamaño acotado: los últimos análisis completos
+    (resumidos) y un resumen acumulado de los anteriores, recortado a un
+    máximo de caracteres.
+    """
+
+    def __init__(self, max_recent: int = None, summary_chars: int = None):
+        self.max_recent = max_recent or config.SESSION_MEMORY_RECENT
+        self.summary_chars = summary_chars or config.SESSION_MEMORY_SUMMARY_CHARS
+        self.recent: deque = deque()
+        self.summary = ""
+        self._lock = threading.Lock()
+
+    def add(self, question: str, analysis: str, decision_type: str = None):
+        entry = {
+            "question": question[:300],
+            "decision_type": decision_type,
+            "summary": summarize(analysis, config.SESSION_MEMORY_ENTRY_CHARS),
+        }
+        with self._lock:
+            self.recent.append(entry)
+            while len(self.recent) > self.max_recent:
+                self._fold(self.recent.popleft())
+
+    def _fold(self, entry: Dict[str, Any]):
+        """Pasa una entrada antigua al resumen, descartando lo más viejo si no cabe"""
+        line = f"- {entry['question']} → {summarize(entry['summary'], 200)}"
+        summary = f"{self.summary}\n{line}".strip()
+        if len(summary) > self.summary_chars:
+            lines = summary.split("\n")
+            while lines and len("\n".join(lines)) > self.summary_chars:
+                lines.pop(0)
+            summary = "\n".join(lines)
+        self.summary = summary
+
+    def context(self) -> str:
+        """Texto listo para incluir en un prompt de seguimiento"""
+        with self._lock:
+            parts = []
+            if self.summary:
+                parts.append(f"DECISIONES ANTERIORES (resumen):\n{self.summary}")
+            if self.recent:
+                parts.append("DECISIONES RECIENTES:")
+                parts.extend(f"- [{e['decision_type']}] {e['question']}: {e['summary']}" for e in self.recent)
+            return "\n".join(parts)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self.recent)
+
+    def clear(self):
+        with self._lock:
+            self.recent.clear()
+            self.summary = ""
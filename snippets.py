@@ -0,0 +1,98 @@
+# snippets.py
+from config import config
+from fact_store import QUANTITY_RE, detect_metric
+from local_index import tokenize
+from scratchpad import estimate_tokens
+from typing import List
+from collections import Counter
+import math
+import re
+import unicodedata
+
+# Fin de oración (sin cortar "5.000" ni "S/. 3,500") o salto de línea
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?;])\s+(?=[^a-z0-9])|\n+")
+# Restos de markdown/HTML que Tavily deja en el contenido
+NOISE_RE = re.compile(r"[#*|>`_]{2,}|\[\s*\]|!\[[^\]]*\]\([^)]*\)")
+
+
+def split_sentences(text: str) -> List[str]:
+    """Oraciones de un texto en una sola línea, sin las demasiado cortas"""
+    sentences = []
+    for raw in SENTENCE_SPLIT_RE.split(text or ""):
+        sentence = " ".join(NOISE_RE.sub(" ", raw).split())
+        if len(sentence) >= 20:
+            sentences.append(sentence)
+    return sentences
+
+
+def _has_quantity(sentence: str) -> bool:
+    """Cifra con moneda, unidad o multiplicador (un año suelto no cuenta)"""
+    folded = unicodedata.normalize("NFD", sentence.lower())
+    folded = "".join(c for c in folded if unicodedata.category(c) != "Mn")
+    return any(
+        (m.group("currency") or "").strip() or m.group("unit") or m.group("multiplier")
+        for m in QUANTITY_RE.finditer(folded)
+    )
+
+
+def extract_snippets(contents: List[str], query: str, max_tokens: int = None,
+                     k1: float = 1.2, b: float = 0.75) -> List[str]:
+    """
+    Pasajes más relevantes de cada contenido para la consulta.
+
+    Cada oración se puntúa con BM25 contra la consulta (el IDF se calcula
+    sobre las oraciones de todos los contenidos) más SNIPPET_NUMBER_WEIGHT si
+    trae una cifra con unidad. Se eligen las mejores hasta max_tokens por
+    contenido y se devuelven en su orden original, unidas por " … ".
+    Sin coincidencias se usa el inicio del texto, como antes.
+    """
+    max_tokens = max_tokens or config.SNIPPET_MAX_TOKENS
+    query_terms = set(tokenize(query))
+    wants_figure = detect_metric(query) is not None
+
+    per_content = [split_sentences(content) for content in contents]
+    sentence_terms = [[Counter(tokenize(s)) for s in sentences] for sentences in per_content]
+    all_terms = [terms for group in sentence_terms for terms in group]
+    total = len(all_terms) or 1
+    avg_length = sum(sum(t.values()) for t in all_terms) / total or 1.0
+    doc_freq = Counter(term for terms in all_terms for term in terms if term in query_terms)
+    idf = {term: math.log(1 + (total - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    snippets = []
+    for content, sentences, terms_list in zip(contents, per_content, sentence_terms):
+        scored = []
+        for position, (sentence, terms) in enumerate(zip(sentences, terms_list)):
+            length = sum(terms.values()) or 1
+            score = sum(
+                idf[term] * terms[term] * (k1 + 1) / (terms[term] + k1 * (1 - b + b * length / avg_length))
+                for term in query_terms if term in terms
+            )
+            if score > 0 and _has_quantity(sentence):
+                score += config.SNIPPET_NUMBER_WEIGHT * (1.5 if wants_figure else 1.0)
+            if score > 0:
+                scored.append((score, position, sentence))
+
+        if not scored:
+            snippets.append(_truncate(" ".join((content or "").split()), max_tokens))
+            continue
+
+        chosen, used = [], 0
+        for score, position, sentence in sorted(scored, key=lambda s: (-s[0], s[1])):
+            cost = estimate_tokens(sentence)
+            if used + cost > max_tokens:
+                # La mejor oración siempre entra, recortada si hace falta
+                if not chosen:
+                    chosen.append((position, _truncate(sentence, max_tokens)))
+                continue
+            chosen.append((position, sentence))
+            used += cost
+        snippets.append(" … ".join(sentence for _, sentence in sorted(chosen)))
+    return snippets
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars].rsplit(" ", 1)[0]
+    return f"{cut}..."
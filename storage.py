@@ -3,6 +3,7 @@ import json
 from datetime import datetime
 from models import UserProfile
 from config import config
+from cache_backend import cache_backend
 from google.cloud import storage as gcs
 import os
 
@@ -24,6 +25,11 @@ class StorageManager:
             self.bucket = self.client.bucket(self.bucket_name)
             self.blob = self.bucket.blob(self.file_name)
     
+    @staticmethod
+    def _shared_cache() -> bool:
+        """Solo una caché compartida: una en memoria quedaría desactualizada en otras instancias"""
+        return cache_backend is not None and cache_backend.shared
+    
     def profile_exists(self) -> bool:
         """Verifica si existe un perfil completo"""
         try:
@@ -63,13 +69,17 @@ class StorageManager:
             return UserProfile()
     
     def _load_cloud(self) -> UserProfile:
-        """Carga desde Cloud Storage"""
+        """Carga desde Cloud Storage (o desde la caché compartida)"""
         try:
-            if not self.blob.exists():
-                return UserProfile()
-            
-            content = self.blob.download_as_text()
-            data = json.loads(content)
+            data = cache_backend.get("profiles", self.file_name) if self._shared_cache() else None
+            if data is None:
+                if not self.blob.exists():
+                    return UserProfile()
+                
+                content = self.blob.download_as_text()
+                data = json.loads(content)
+                if self._shared_cache():
+                    cache_backend.set("profiles", self.file_name, data)
             
             if 'created_at' in data:
                 data['created_at'] = datetime.fromisoformat(data['created_at'])
@@ -104,6 +114,8 @@ class StorageManager:
         try:
             content = json.dumps(data, indent=2, ensure_ascii=False)
             self.blob.upload_from_string(content, content_type='application/json')
+            if self._shared_cache():
+                cache_backend.set("profiles", self.file_name, data)
         except Exception as e:
             print(f"Error guardando en Cloud Storage: {e}")
     
@@ -1,9 +1,29 @@
 # tools.py - Versión refactorizada con decorador @tool
 from langchain_core.tools import tool
-from typing import List
-import math
+from typing import List, Dict, Optional
 from tavily import TavilyClient
 from config import config
+from safe_math import evaluate, evaluate_batch, split_expressions
+from financial import run_operation
+from decision_eval import evaluate_options, format_evaluation
+from errors import classify_error
+from rate_limit import rate_limiter, RateLimitTimeout
+from circuit_breaker import guard_tool, circuit_breakers, BREAKER_OPEN_MARKER
+from local_index import local_index
+from fact_store import fact_store
+from search_cache import search_cache
+from snippets import extract_snippets
+from search_profiles import PROFILES, choose_profile, active_search_budget, search_stats
+from deadline import call_timeout
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+import contextvars
+import json
+import sqlite3
+import time
+
+# Llamadas a Tavily en hilos propios para poder abandonarlas al agotarse el deadline
+# (el cliente no acepta timeout por llamada)
+_search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tavily")
 
 @tool
 def web_search(query: str) -> str:
@@ -15,16 +35,87 @@ def web_search(query: str) -> str:
     Returns:
         Información relevante encontrada en internet
     """
+    cached = search_cache.get(query)
+    if cached is not None:
+        return cached
+
+    output = _fetch_search(query)
+    if not output.startswith(NOT_CACHEABLE):
+        search_cache.put(query, output)
+    return output
+
+def refresh_search(query: str) -> Optional[Dict[str, int]]:
+    """
+    Repite una búsqueda ignorando la caché (warmer); respeta el circuit breaker.
+    Devuelve los datos agregados/renovados en el fact store, o None si la
+    búsqueda falló o no se pudo indexar (el índice y los datos no se renovaron).
+    """
+    breaker = circuit_breakers.get("web_search")
+    if not breaker.allow():
+        return None
+    indexed: Dict[str, int] = {}
+    output = _fetch_search(query, indexed)
+    if output.startswith(NOT_CACHEABLE):
+        breaker.record_failure(output)
+        return None
+    breaker.record_success()
+    search_cache.put(query, output)
+    if not indexed:
+        print(f"Warmer: '{query}' se refrescó pero no se pudo indexar")
+        return None
+    return indexed
+
+def _fetch_search(query: str, indexed: Optional[Dict[str, int]] = None) -> str:
+    """
+    Búsqueda real en Tavily: indexa fuentes y datos y devuelve el texto formateado.
+    indexed recibe cuántos datos se agregaron/renovaron en el fact store.
+    """
+    # Perfil según la consulta: basic para datos puntuales, advanced para investigar
+    profile = choose_profile(query)
+    budget = active_search_budget.get()
+    if budget is not None:
+        profile = budget.reserve(profile)
+        if profile is None:
+            search_stats.count_exhausted()
+            return (f"{BUDGET_EXHAUSTED} para este análisis. "
+                    "No busques más en internet: usa local_search o continúa con la información que ya tienes.")
+    settings = PROFILES[profile]
+
+    limiter = rate_limiter.backend("tavily")
+    started = None
     try:
+        limiter.acquire()
         client = TavilyClient(api_key=config.TAVILY_API_KEY)
 
-        # Realizar búsqueda con Tavily
-        response = client.search(
+        # Realizar búsqueda con Tavily, sin esperar más que lo que queda para investigar
+        timeout = call_timeout(config.SEARCH_REQUEST_TIMEOUT, research=True)
+        started = time.time()
+        future = _search_pool.submit(
+            contextvars.copy_context().run, client.search,
             query=query,
-            search_depth="advanced",  # "basic" o "advanced"
-            max_results=5,
-            include_answer=True  # Tavily genera un resumen
+            search_depth=settings["search_depth"],
+            max_results=settings["max_results"],
+            include_answer=settings["include_answer"]  # Tavily genera un resumen
         )
+        try:
+            response = future.result(timeout=timeout)
+        except FuturesTimeout:
+            search_stats.record(profile, time.time() - started, ok=False)
+            if timeout >= config.SEARCH_REQUEST_TIMEOUT:
+                # Tavily lento sin deadline de por medio: cuenta para el circuit breaker
+                return f"Error en búsqueda web: sin respuesta tras {timeout:.0f}s"
+            return (f"{SEARCH_TIMED_OUT} tras {timeout:.0f}s. "
+                    "Continúa el análisis con la información que ya tienes.")
+        search_stats.record(profile, time.time() - started)
+
+        # Guardar las fuentes en el índice local y sus datos en el fact store
+        try:
+            local_index.add_search(query, response)
+            facts = fact_store.add_search(query, response)
+            if indexed is not None:
+                indexed.update(facts)
+        except sqlite3.Error as e:
+            print(f"Error indexando resultados de búsqueda: {e}")
 
         # Formatear respuesta
         result_parts = []
@@ -35,43 +126,121 @@ def web_search(query: str) -> str:
 
         # Agregar resultados detallados
         result_parts.append("FUENTES:")
-        for i, result in enumerate(response.get('results', [])[:3], 1):
+        results = response.get('results', [])[:3]
+        # Las oraciones más relevantes de cada fuente, no solo su inicio
+        snippets = extract_snippets([r.get('content') or '' for r in results], query)
+        for i, (result, snippet) in enumerate(zip(results, snippets), 1):
             title = result.get('title', 'Sin título')
-            content = result.get('content', 'Sin contenido')
             url = result.get('url', '')
 
             result_parts.append(f"\n{i}. {title}")
-            result_parts.append(f"   {content[:200]}...")
+            result_parts.append(f"   {snippet or 'Sin contenido'}")
             result_parts.append(f"   URL: {url}")
 
         return "\n".join(result_parts)
 
     except Exception as e:
+        if started is not None:
+            search_stats.record(profile, time.time() - started, ok=False)
+        if isinstance(e, RateLimitTimeout) or classify_error(e) == "quota":
+            if not isinstance(e, RateLimitTimeout):
+                limiter.penalize()
+            # Mensaje explícito para que el agente no gaste iteraciones reintentando
+            return ("Búsqueda web no disponible por límite de cuota. No repitas la búsqueda: "
+                    "continúa el análisis con la información que ya tienes.")
         return f"Error en búsqueda web: {str(e)}"
 
+def _format_local_results(results: List[dict], query: str, partial: bool = False) -> str:
+    """Mismo formato que web_search (RESUMEN / FUENTES) para el scratchpad y la síntesis"""
+    newest = max(r["fetched_at"] for r in results)
+    hours = (time.time() - newest) / 3600
+    header = f"(Índice local: fuentes descargadas hace {hours:.0f} h"
+    header += ", cobertura parcial y búsqueda en internet no disponible)" if partial else ")"
+    result_parts = [header]
+
+    answers = [r for r in results if r["url"].startswith("answer:")]
+    sources = [r for r in results if not r["url"].startswith("answer:")]
+    if answers:
+        result_parts.append(f"RESUMEN: {answers[0]['content']}\n")
+
+    result_parts.append("FUENTES:")
+    snippets = extract_snippets([r["content"] for r in sources[:3]], query)
+    for i, (result, snippet) in enumerate(zip(sources[:3], snippets), 1):
+        result_parts.append(f"\n{i}. {result['title']}")
+        result_parts.append(f"   {snippet}")
+        result_parts.append(f"   URL: {result['url']}")
+    return "\n".join(result_parts)
+
+def _format_facts(facts: List) -> str:
+    """Datos del fact store en el formato de web_search"""
+    hours = (time.time() - max(f.observed_at for f in facts)) / 3600
+    result_parts = [f"(Datos guardados de búsquedas recientes, hace {hours:.0f} h)"]
+    result_parts.append("RESUMEN: " + "; ".join(
+        f"{f.entity}: {f.formatted_value()}" for f in facts) + "\n")
+    result_parts.append("FUENTES:")
+    # Una fuente por frase (varios datos pueden salir de la misma)
+    unique = list({(f.source_url, f.snippet): f for f in reversed(facts)}.values())[::-1]
+    for i, fact in enumerate(unique[:5], 1):
+        result_parts.append(f"\n{i}. {fact.metric.capitalize()} {fact.entity}")
+        result_parts.append(f"   {fact.snippet[:200]}")
+        result_parts.append(f"   URL: {fact.source_url}")
+    return "\n".join(result_parts)
+
+@tool
+def local_search(query: str) -> str:
+    """Busca primero en las fuentes ya descargadas (índice local, instantáneo) y solo si no hay suficiente información local busca en internet. Úsala como primera opción para precios, salarios, costos y datos del mercado peruano. Input: consulta clara en lenguaje natural.
+
+    Args:
+        query: Consulta de búsqueda en lenguaje natural
+
+    Returns:
+        Información relevante (del índice local o de internet)
+    """
+    results = []
+    try:
+        # Primero datos concretos ya vistos (salarios, precios, tasas...)
+        facts = fact_store.lookup(query)
+        if len(facts) >= config.FACT_MIN_MATCHES:
+            search_cache.record(query)
+            return _format_facts(facts)
+
+        results = local_index.search(query, limit=config.LOCAL_SEARCH_RESULTS)
+        sources = [r for r in results if not r["url"].startswith("answer:")]
+        if (len(sources) >= config.LOCAL_SEARCH_MIN_RESULTS
+                and local_index.coverage(query, results) >= config.LOCAL_SEARCH_MIN_COVERAGE):
+            search_cache.record(query)
+            return _format_local_results(results, query)
+    except sqlite3.Error as e:
+        print(f"Error en índice local: {e}")
+
+    # Recall local bajo: búsqueda en internet (queda indexada para la próxima vez)
+    output = guarded_web_search.invoke({"query": query})
+    failed = output.startswith(NOT_CACHEABLE) or output.startswith(BREAKER_OPEN_MARKER)
+    if failed and results:
+        return _format_local_results(results, query, partial=True)
+    return output
+
 @tool
 def calculator(expression: str) -> str:
-    """Calcula expresiones matemáticas. Soporta operaciones básicas (+, -, *, /), potencias (pow), raíz cuadrada (sqrt), y funciones trigonométricas. Input: expresión matemática válida.
+    """Calcula expresiones matemáticas. Soporta operaciones básicas (+, -, *, /), potencias (** o pow), raíz cuadrada (sqrt), min, max, sum, log y funciones trigonométricas. Para varios cálculos en una sola llamada sepáralos con punto y coma (;). Input: expresión matemática válida.
 
     Args:
-        expression: Expresión matemática a evaluar
+        expression: Expresión matemática a evaluar (o varias separadas por ';')
 
     Returns:
         Resultado del cálculo
     """
     try:
-        # Lista blanca de operaciones permitidas
-        allowed_names = {
-            'abs': abs, 'round': round, 'min': min, 'max': max,
-            'sum': sum, 'pow': pow, 'sqrt': math.sqrt,
-            'sin': math.sin, 'cos': math.cos, 'tan': math.tan,
-            'log': math.log, 'exp': math.exp, 'pi': math.pi,
-            'e': math.e
-        }
-
-        # Evaluar de forma segura
-        result = eval(expression, {"__builtins__": {}}, allowed_names)
-        return f"Resultado: {result}"
+        expressions = split_expressions(expression)
+        if not expressions:
+            return "Error en cálculo: expresión vacía"
+        if len(expressions) == 1:
+            return f"Resultado: {evaluate(expressions[0])}"
+
+        lines = ["Resultados:"]
+        for i, (expr, result) in enumerate(evaluate_batch(expression), 1):
+            lines.append(f"{i}. {expr} = {result}")
+        return "\n".join(lines)
     except Exception as e:
         return f"Error en cálculo: {str(e)}"
 
@@ -95,11 +264,83 @@ def probability_calculator(favorable_outcomes: int, total_outcomes: int) -> str:
     except Exception as e:
         return f"Error en cálculo de probabilidad: {str(e)}"
 
+@tool
+def financial_calculator(request: str) -> str:
+    """Calcula métricas financieras completas en UNA sola llamada: VAN, TIR, payback, cronograma de préstamo y proyección de ahorro. Input: JSON con "operation" y sus parámetros (o una lista de ellos). Tasas anuales como decimal o porcentaje. Operaciones:
+    {"operation": "investment", "rate": 0.12, "cashflows": [-50000, 15000, 18000, 20000]} (VAN + TIR + payback)
+    {"operation": "npv" | "irr" | "payback", "rate": 0.12, "cashflows": [...]}
+    {"operation": "amortization", "principal": 80000, "rate": 0.14, "months": 60}
+    {"operation": "projection", "initial": 5000, "monthly": 800, "rate": 0.06, "years": 10, "growth": 0.03}
+
+    Args:
+        request: JSON con la operación financiera o una lista de operaciones
+
+    Returns:
+        Resultados de cada operación
+    """
+    try:
+        payload = json.loads(request.strip().strip("`"))
+        operations = payload if isinstance(payload, list) else [payload]
+        if not operations:
+            return "Error en cálculo financiero: no se indicó ninguna operación"
+
+        results = []
+        for params in operations:
+            try:
+                results.append(run_operation(params))
+            except Exception as e:
+                results.append(f"Error en cálculo financiero: {str(e)}")
+        return "\n\n".join(results)
+    except json.JSONDecodeError as e:
+        return f"Error en cálculo financiero: el input debe ser JSON ({str(e)})"
+    except Exception as e:
+        return f"Error en cálculo financiero: {str(e)}"
+
+@tool
+def decision_evaluator(spec: str) -> str:
+    """Evalúa opciones con escenarios en UNA sola llamada: valor esperado, varianza y mejor opción por recurso. Input: JSON con "options" (cada una con "name" y "scenarios" con "probability" y "payoffs" por recurso) y opcionalmente "weights" por recurso para un puntaje combinado. Ejemplo:
+    {"options": [{"name": "Aceptar oferta", "scenarios": [{"probability": 70, "payoffs": {"dinero": 24000, "tiempo": -200}}, {"probability": 30, "payoffs": {"dinero": -6000}}]}, {"name": "Quedarme", "scenarios": [{"probability": 100, "payoffs": {"dinero": 8000}}]}], "weights": {"dinero": 1, "tiempo": 20}}
+    También acepta un árbol con "children" y costs/benefits por nodo.
+
+    Args:
+        spec: JSON con las opciones y escenarios (o el árbol de decisión)
+
+    Returns:
+        Valores esperados, desviación estándar y la mejor opción
+    """
+    try:
+        result = evaluate_options(json.loads(spec.strip().strip("`")))
+        return format_evaluation(result)
+    except json.JSONDecodeError as e:
+        return f"Error evaluando decisión: el input debe ser JSON ({str(e)})"
+    except Exception as e:
+        return f"Error evaluando decisión: {str(e)}"
+
+# Salidas que indican una falla del servicio (no un error del input) para el circuit breaker.
+# Las herramientas locales solo cuentan excepciones
+TOOL_FAILURE_MARKERS = {
+    "web_search": ("Error en búsqueda web", "Búsqueda web no disponible"),
+}
+
+# Presupuesto de búsquedas del análisis agotado: no es falla del servicio, pero no se cachea
+BUDGET_EXHAUSTED = "Presupuesto de búsquedas agotado"
+# Búsqueda abandonada por el deadline del análisis: tampoco es falla del servicio
+SEARCH_TIMED_OUT = "Búsqueda web cancelada por tiempo"
+NOT_CACHEABLE = TOOL_FAILURE_MARKERS["web_search"] + (BUDGET_EXHAUSTED, SEARCH_TIMED_OUT)
+# Observaciones de una llamada fallida: no se guardan en el checkpoint, se repiten al reanudar
+FAILED_OBSERVATION_MARKERS = ("Error en ", BREAKER_OPEN_MARKER) + NOT_CACHEABLE
+
+# web_search con su circuit breaker, también usada por local_search como respaldo
+guarded_web_search = guard_tool(web_search, TOOL_FAILURE_MARKERS["web_search"])
+
 def create_agent_tools() -> List:
     """
     Crea la lista de herramientas disponibles para el agente
 
     Returns:
-        Lista de herramientas decoradas con @tool
+        Lista de herramientas decoradas con @tool, cada una con su circuit breaker
     """
-    return [web_search, calculator, probability_calculator]
\ No newline at end of file
+    tools = [local_search, calculator, probability_calculator, financial_calculator,
+             decision_evaluator]
+    guarded = [guard_tool(t, TOOL_FAILURE_MARKERS.get(t.name, ())) for t in tools]
+    return guarded[:1] + [guarded_web_search] + guarded[1:]
\ No newline at end of file